@@ -7,4 +7,12 @@ app.config.from_object(Config)
 login = LoginManager(app)
 login.login_view = 'login'
 
-from app import routes, models
+from app.fragment_cache import FragmentCacheExtension, fragment_cache
+app.jinja_env.add_extension(FragmentCacheExtension)
+app.jinja_env.fragment_cache = fragment_cache
+
+from app import routes, models, commands
+
+if Config.DUE_LIST_ROLLOVER:
+    from app.due_lists import RolloverThread, due_lists
+    RolloverThread(models.storage, due_lists).start()
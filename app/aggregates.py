@@ -0,0 +1,79 @@
+"""
+Per-topic answer totals maintained alongside the cached cards
+"""
+
+# Card flag counted by each scoreboard column
+STAT_FLAGS = (('right', 'right'), ('wrong', 'wrong'), ('hints', 'hint_used'))
+
+
+def card_stats(card) -> tuple:
+    """
+    Args:
+        card (Card): The card.
+
+    Returns:
+        tuple: The card's right, wrong and hint counts.
+    """
+    return tuple(card.flag(flag) for column, flag in STAT_FLAGS)
+
+
+def topic_totals(cards) -> dict:
+    """
+    Add up the scoreboard columns per topic from scratch.
+
+    Args:
+        cards (list): Card objects.
+
+    Returns:
+        dict: ``{'right': .., 'wrong': .., 'hints': .., 'cards': ..}`` keyed by topic, in card order.
+    """
+    totals = {}
+    for card in cards:
+        stats = totals.setdefault(card.topic, {'right': 0, 'wrong': 0, 'hints': 0, 'cards': 0})
+        for (column, flag), value in zip(STAT_FLAGS, card_stats(card)):
+            stats[column] += value
+        stats['cards'] += 1
+    return totals
+
+
+class TopicStats:
+    """
+    topic_totals of one author's cards, kept up to date in O(1) per changed card.
+
+    The contribution of every card is remembered, so a changed card is subtracted
+    with its old topic and counts and added back with the new ones.
+    """
+    def __init__(self, cards) -> None:
+        self._totals = {}
+        self._contributions = {}
+        for card in cards:
+            self.add(card)
+
+    def _apply(self, topic, stats, sign) -> None:
+        totals = self._totals.setdefault(topic, {'right': 0, 'wrong': 0, 'hints': 0, 'cards': 0})
+        for (column, flag), value in zip(STAT_FLAGS, stats):
+            totals[column] += sign * value
+        totals['cards'] += sign
+        if not totals['cards']:
+            del self._totals[topic]
+
+    def add(self, card) -> None:
+        contribution = self._contributions[card.id] = (card.topic, card_stats(card))
+        self._apply(*contribution, 1)
+
+    def remove(self, card) -> None:
+        contribution = self._contributions.pop(card.id, None)
+        if contribution is not None:
+            self._apply(*contribution, -1)
+
+    def update(self, card) -> None:
+        if self._contributions.get(card.id) != (card.topic, card_stats(card)):
+            self.remove(card)
+            self.add(card)
+
+    def totals(self) -> dict:
+        """
+        Returns:
+            dict: A copy of the per-topic totals, as topic_totals.
+        """
+        return {topic: dict(totals) for topic, totals in self._totals.items()}
@@ -0,0 +1,212 @@
+"""
+Password verification on a bounded thread pool
+
+scrypt is deliberately expensive. Running it inline lets a burst of logins occupy
+every gunicorn worker, so hashing is handed to a small per-process executor instead:
+at most ``max_workers`` hashes run at once, at most ``max_pending`` wait, and
+anything beyond that is rejected immediately so the caller can answer 503.
+hashlib releases the GIL while hashing, so the pool also uses several cores.
+
+The per-process limits only bite when a process serves several requests at once
+(SERVING_MODE=threaded); a sync worker never has more than one login in flight.
+The hashes in flight across all workers are therefore also capped by a
+FileSemaphore, so a burst of logins leaves the other sync workers free.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from app.filelock import FileSemaphore
+from config import Config
+
+
+class AuthBusyError(Exception):
+    """
+    Raised when too many password hashes are already queued.
+    """
+
+
+def method_prefix(method) -> str:
+    """
+    Spell out a werkzeug hash method with the defaults werkzeug fills in, as it
+    appears before the first ``$`` of the hashes it generates.
+
+    Args:
+        method (str): A hash method, e.g. ``scrypt`` or ``pbkdf2:sha256``.
+
+    Returns:
+        str: The full method, e.g. ``scrypt:32768:8:1`` or ``pbkdf2:sha256:1000000``.
+
+    Raises:
+        ValueError: If the method is not scrypt or pbkdf2.
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        return ':'.join(['scrypt', *(args or ['32768', '8', '1'])])
+    if name == 'pbkdf2':
+        args = args or ['sha256']
+        if len(args) == 1:
+            args.append(str(DEFAULT_PBKDF2_ITERATIONS))
+        return ':'.join(['pbkdf2', *args])
+    raise ValueError(f"Invalid hash method '{method}'.")
+
+
+class PasswordHasher:
+    """
+    Bounded executor for password hashing and verification.
+
+    Attributes:
+        max_workers (int): Hashes computed in parallel.
+        max_pending (int): Hashes allowed to be running or queued at once in this process.
+        shared_slots (FileSemaphore): Caps the hashes running or queued across all
+            processes, None for no cap.
+        timeout (float): Seconds to wait for a result before giving up.
+        method (str): werkzeug hash method new hashes are generated with.
+    """
+    def __init__(self, max_workers=2, max_pending=8, timeout=10.0, method='scrypt', shared_slots=None) -> None:
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.shared_slots = shared_slots
+        self.timeout = timeout
+        self.method = method
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._method_prefix = method_prefix(method)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Threads do not survive fork, so each gunicorn worker builds its own pool
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='password-hash')
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, fn, *args):
+        """
+        Queue a hashing job.
+
+        Args:
+            fn (callable): The function to run.
+            *args: Its arguments.
+
+        Returns:
+            Future: The pending result.
+
+        Raises:
+            AuthBusyError: If ``max_pending`` jobs are already running or queued in this
+                process, or every shared slot is taken.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise AuthBusyError('Too many sign-ins in progress')
+        shared_slot = None
+        try:
+            if self.shared_slots is not None:
+                shared_slot = self.shared_slots.try_acquire()
+                if shared_slot is None:
+                    raise AuthBusyError('Too many sign-ins in progress')
+            future = self._get_executor().submit(self._job, shared_slot, fn, *args)
+        except BaseException:
+            self._release(shared_slot)
+            raise
+        # Jobs that never run (executor shut down) hand their slots back here
+        future.add_done_callback(lambda done: done.cancelled() and self._release(shared_slot))
+        return future
+
+    def _job(self, shared_slot, fn, *args):
+        # Released before the result is set, so the waiting caller can submit again at once
+        try:
+            return fn(*args)
+        finally:
+            self._release(shared_slot)
+
+    def _release(self, shared_slot) -> None:
+        if shared_slot is not None:
+            self.shared_slots.release(shared_slot)
+        self._slots.release()
+
+    def run(self, fn, *args):
+        """
+        Run a hashing job on the pool and wait for its result.
+
+        Raises:
+            AuthBusyError: If the pool is saturated or the result takes longer than ``timeout``.
+        """
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise AuthBusyError('Password check timed out')
+
+    def verify(self, password_hash, password) -> bool:
+        return self.run(check_password_hash, password_hash, password)
+
+    def hash(self, password) -> str:
+        return self.run(generate_password_hash, password, self.method)
+
+    def needs_rehash(self, password_hash) -> bool:
+        """
+        Check whether a stored hash was made with a different method or work factor
+        than the configured one, e.g. ``scrypt:16384:8:1`` vs ``scrypt:32768:8:1``.
+
+        Args:
+            password_hash (str): The stored hash.
+
+        Returns:
+            bool: True if the hash should be regenerated.
+        """
+        return password_hash.split('$', 1)[0] != self._method_prefix
+
+
+def authenticate(hasher, storage, username, password) -> tuple:
+    """
+    Check a username and password against the storage backend.
+
+    The user record is read once; verification runs on the hasher's pool. After a
+    successful login an outdated hash is transparently replaced in the background.
+
+    Args:
+        hasher (PasswordHasher): The bounded hashing executor.
+        storage (StorageBackend): Where users are stored.
+        username (str): The submitted username.
+        password (str): The submitted password.
+
+    Returns:
+        tuple: A status message ("Valid" on success) and the user record (None on failure).
+
+    Raises:
+        AuthBusyError: If the hashing pool is saturated.
+    """
+    record = storage.get_user(username)
+    if record is None:
+        return "Username Not Found Please Register", None
+    if not hasher.verify(record['password_hash'], password):
+        return "Entered Password is Wrong, Please Check", None
+    if hasher.needs_rehash(record['password_hash']):
+        try:
+            future = hasher.submit(generate_password_hash, password, hasher.method)
+        except AuthBusyError:
+            # Try again on a later login
+            return "Valid", record
+        future.add_done_callback(lambda done: _store_rehash(storage, username, record, done))
+    return "Valid", record
+
+
+def _store_rehash(storage, username, record, future) -> None:
+    if future.exception() is not None:
+        return
+    current = storage.get_user(username)
+    # Do not overwrite a password that was changed in the meantime
+    if current is not None and current['password_hash'] == record['password_hash']:
+        storage.save_user(username, dict(current, password_hash=future.result()))
+
+
+# Shared by every request handled by this worker process
+password_hasher = PasswordHasher(max_workers=Config.AUTH_HASH_WORKERS,
+                                 max_pending=Config.AUTH_MAX_PENDING,
+                                 timeout=Config.AUTH_TIMEOUT,
+                                 method=Config.AUTH_PASSWORD_METHOD,
+                                 shared_slots=FileSemaphore(Config.AUTH_SLOT_PATH, Config.AUTH_MAX_HASHING))
@@ -0,0 +1,343 @@
+"""
+Memory-mapped binary card snapshot
+
+An alternative to card_data.json for large decks. Records are stored grouped by
+author in a compact binary encoding, followed by an id -> offset table (sorted by
+id, binary searched in place) and an author -> record range table. The file is
+opened with ``mmap``, so every worker shares the same page cache and only decodes
+the records a request actually touches.
+
+Layout (little endian):
+    header      magic "FCRD", format version u16, record count u32,
+                id table offset u64, author table offset u64
+    records     id i64, flag count u16, then topic, question, answer, hint,
+                author_id, timestamp, next_review_date as strings, then
+                ``flag count`` times (name string, value i64)
+    id table    record count times (id i64, record offset u64), sorted by id
+    author table  author count u32, then per author
+                (author_id string, first record offset u64, end offset u64, card count u32)
+
+Strings are a u32 byte length followed by UTF-8; a length of 0xFFFFFFFF means None.
+"""
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+from app.oplog import OpLogStore, replay
+from app.repository import CardRepository
+
+MAGIC = b'FCRD'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHIQQ')
+RECORD_HEAD = struct.Struct('<qH')
+STRING_LENGTH = struct.Struct('<I')
+FLAG_VALUE = struct.Struct('<q')
+ID_ENTRY = struct.Struct('<qQ')
+AUTHOR_COUNT = struct.Struct('<I')
+AUTHOR_RANGE = struct.Struct('<QQI')
+NONE_LENGTH = 0xFFFFFFFF
+STRING_FIELDS = ('topic', 'question', 'answer', 'hint', 'author_id', 'timestamp', 'next_review_date')
+
+
+def _pack_string(value) -> bytes:
+    if value is None:
+        return STRING_LENGTH.pack(NONE_LENGTH)
+    data = str(value).encode('utf-8')
+    return STRING_LENGTH.pack(len(data)) + data
+
+
+def _unpack_string(buffer, offset) -> tuple:
+    length, = STRING_LENGTH.unpack_from(buffer, offset)
+    offset += STRING_LENGTH.size
+    if length == NONE_LENGTH:
+        return None, offset
+    return bytes(buffer[offset:offset + length]).decode('utf-8'), offset + length
+
+
+def encode_record(record) -> bytes:
+    """
+    Args:
+        record (dict): A card record as stored in card_data.json.
+
+    Returns:
+        bytes: The binary encoding of the record.
+    """
+    flags = record.get('flags') or {}
+    parts = [RECORD_HEAD.pack(record['id'], len(flags))]
+    parts.extend(_pack_string(record.get(name)) for name in STRING_FIELDS)
+    for name, value in flags.items():
+        parts.append(_pack_string(name))
+        parts.append(FLAG_VALUE.pack(value))
+    return b''.join(parts)
+
+
+def decode_record(buffer, offset) -> tuple:
+    """
+    Args:
+        buffer: The mapped snapshot.
+        offset (int): Start of the record.
+
+    Returns:
+        tuple: The card record as a dict and the offset of the next record.
+    """
+    card_id, flag_count = RECORD_HEAD.unpack_from(buffer, offset)
+    offset += RECORD_HEAD.size
+    record = {'id': card_id}
+    for name in STRING_FIELDS:
+        record[name], offset = _unpack_string(buffer, offset)
+    flags = {}
+    for _ in range(flag_count):
+        name, offset = _unpack_string(buffer, offset)
+        flags[name], = FLAG_VALUE.unpack_from(buffer, offset)
+        offset += FLAG_VALUE.size
+    record['flags'] = flags
+    return record, offset
+
+
+def write_binary_snapshot(path, records) -> None:
+    """
+    Atomically write card records as a binary snapshot.
+
+    Args:
+        path (str): Destination path.
+        records (list): Card records; their order within each author is preserved.
+    """
+    grouped = OrderedDict()
+    for record in records:
+        grouped.setdefault(record['author_id'], []).append(record)
+
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as file:
+            file.write(b'\0' * HEADER.size)
+            offset = HEADER.size
+            id_entries = []
+            author_ranges = []
+            for author_id, author_records in grouped.items():
+                start = offset
+                for record in author_records:
+                    data = encode_record(record)
+                    id_entries.append((record['id'], offset))
+                    file.write(data)
+                    offset += len(data)
+                author_ranges.append((author_id, start, offset, len(author_records)))
+
+            id_table_offset = offset
+            id_entries.sort()
+            file.write(b''.join(ID_ENTRY.pack(card_id, record_offset) for card_id, record_offset in id_entries))
+            author_table_offset = id_table_offset + ID_ENTRY.size * len(id_entries)
+            file.write(AUTHOR_COUNT.pack(len(author_ranges)))
+            for author_id, start, end, count in author_ranges:
+                file.write(_pack_string(author_id) + AUTHOR_RANGE.pack(start, end, count))
+
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(id_entries), id_table_offset, author_table_offset))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class BinarySnapshot:
+    """
+    Read-only, memory-mapped view of a binary card snapshot.
+
+    Attributes:
+        path (str): Path of the snapshot file.
+    """
+    def __init__(self, path) -> None:
+        """
+        Map the snapshot and load its (small) author table.
+
+        Args:
+            path (str): Path of the snapshot file.
+
+        Raises:
+            ValueError: If the file is not a binary card snapshot.
+        """
+        self.path = path
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count, self._id_table, author_table = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._map.close()
+            raise ValueError(f'{path} is not a binary card snapshot')
+        self._authors = OrderedDict()
+        author_count, = AUTHOR_COUNT.unpack_from(self._map, author_table)
+        offset = author_table + AUTHOR_COUNT.size
+        for _ in range(author_count):
+            author_id, offset = _unpack_string(self._map, offset)
+            self._authors[author_id] = AUTHOR_RANGE.unpack_from(self._map, offset)
+            offset += AUTHOR_RANGE.size
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _offset_of(self, card_id):
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            entry_id, offset = ID_ENTRY.unpack_from(self._map, self._id_table + middle * ID_ENTRY.size)
+            if entry_id < card_id:
+                low = middle + 1
+            elif entry_id > card_id:
+                high = middle
+            else:
+                return offset
+        return None
+
+    def get(self, card_id):
+        """
+        Args:
+            card_id (int): The unique identifier of the card.
+
+        Returns:
+            dict: The card record, None if the snapshot does not contain the id.
+        """
+        offset = self._offset_of(card_id)
+        if offset is None:
+            return None
+        return decode_record(self._map, offset)[0]
+
+    def author_of(self, card_id):
+        """
+        Args:
+            card_id (int): The unique identifier of the card.
+
+        Returns:
+            str: The author of the card, None if the snapshot does not contain the id.
+        """
+        record = self.get(card_id)
+        return record['author_id'] if record is not None else None
+
+    def author_counts(self) -> dict:
+        """
+        Returns:
+            dict: Number of cards keyed by author id.
+        """
+        return {author_id: count for author_id, (start, end, count) in self._authors.items()}
+
+    def records_for_author(self, author_id) -> list:
+        """
+        Decode only the records of one author.
+
+        Args:
+            author_id (str): The ID of the author.
+
+        Returns:
+            list: The author's card records in snapshot order.
+        """
+        if author_id not in self._authors:
+            return []
+        offset, end, count = self._authors[author_id]
+        records = []
+        while offset < end:
+            record, offset = decode_record(self._map, offset)
+            records.append(record)
+        return records
+
+    def records(self) -> list:
+        """
+        Returns:
+            list: Every card record in the snapshot.
+        """
+        return [record for author_id in self._authors for record in self.records_for_author(author_id)]
+
+
+class BinaryOpLogStore(OpLogStore):
+    """
+    OpLogStore whose snapshot is a binary card snapshot instead of JSON.
+    """
+    def read_snapshot(self) -> list:
+        try:
+            snapshot = BinarySnapshot(self.snapshot_path)
+        except FileNotFoundError:
+            return []
+        try:
+            return snapshot.records()
+        finally:
+            snapshot.close()
+
+    def write_snapshot_file(self, records) -> None:
+        write_binary_snapshot(self.snapshot_path, records)
+
+
+class _AuthorLookup:
+    """
+    Card id -> author id map backed by the snapshot's id table, with the
+    changes of the operation log layered on top.
+    """
+    def __init__(self, snapshot) -> None:
+        self._snapshot = snapshot
+        self._overlay = {}
+        self._deleted = set()
+
+    def get(self, card_id, default=None):
+        if card_id in self._overlay:
+            return self._overlay[card_id]
+        if card_id in self._deleted or self._snapshot is None:
+            return default
+        author_id = self._snapshot.author_of(card_id)
+        return default if author_id is None else author_id
+
+    def __setitem__(self, card_id, author_id) -> None:
+        self._deleted.discard(card_id)
+        self._overlay[card_id] = author_id
+
+    def __delitem__(self, card_id) -> None:
+        self._overlay.pop(card_id, None)
+        self._deleted.add(card_id)
+
+
+class MmapCardRepository(CardRepository):
+    """
+    CardRepository over a BinaryOpLogStore that never decodes the whole snapshot.
+
+    Opening the repository maps the snapshot and replays the log into the id and
+    author indexes only; an author's partition is decoded from the mapped file the
+    first time that author is requested.
+    """
+    def __init__(self, store, factory, max_cards=None) -> None:
+        super().__init__(store, factory, max_cards=max_cards)
+        self._snapshot = None
+        self._log_ops = []
+
+    def _clear(self) -> None:
+        super()._clear()
+        # Pages stay mapped until partitions built from them are gone; the map is
+        # closed by garbage collection rather than under a concurrent reader.
+        self._snapshot = None
+        self._log_ops = []
+
+    def _apply(self, op) -> None:
+        self._log_ops.append(op)
+        super()._apply(op)
+
+    def _open(self) -> None:
+        with self.store.file_lock.acquire(exclusive=False):
+            try:
+                self._snapshot = BinarySnapshot(self.store.snapshot_path)
+            except FileNotFoundError:
+                self._snapshot = None
+            ops, self._log_offset = self.store.read_log()
+        self._author_of = _AuthorLookup(self._snapshot)
+        self._authors = self._snapshot.author_counts() if self._snapshot is not None else {}
+        for op in ops:
+            self._apply(op)
+
+    def _load(self, wanted_author=None) -> None:
+        if self._author_of is None:
+            self._open()
+        if wanted_author is None or wanted_author in self._partitions:
+            return
+        records = self._snapshot.records_for_author(wanted_author) if self._snapshot is not None else []
+        records = [record for record in replay(records, self._log_ops) if record['author_id'] == wanted_author]
+        self._add_partition(wanted_author, records)
+        self._evict()
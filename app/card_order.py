@@ -0,0 +1,128 @@
+"""
+Per-author sort orders answering keyset-paginated card listings
+"""
+import bisect
+
+
+class CardOrder:
+    """
+    Cards of one author kept sorted by ``key(card)``, which ends with the card id.
+
+    A page is two bisections and a slice, so listing a page costs O(log n + page)
+    whatever its position. Edits re-key a single card.
+
+    Attributes:
+        by_topic (bool): Whether the key starts with the topic, so pages can be
+            restricted to one topic.
+        key_types (tuple): Type of each part of the key.
+    """
+    by_topic = False
+    key_types = ()
+
+    @staticmethod
+    def key(card) -> tuple:
+        raise NotImplementedError
+
+    def __init__(self, cards) -> None:
+        """
+        Build the index.
+
+        Args:
+            cards (list): The author's Card objects.
+        """
+        self._cards = {card.id: card for card in cards}
+        self._keys = {card.id: self.key(card) for card in cards}  # card id -> sort key
+        self._sorted = sorted(self._keys.values())
+
+    def add(self, card) -> None:
+        """
+        Args:
+            card (Card): A card new to the index.
+        """
+        self._cards[card.id] = card
+        key = self._keys[card.id] = self.key(card)
+        bisect.insort(self._sorted, key)
+
+    def remove(self, card) -> None:
+        """
+        Args:
+            card (Card): A card in the index.
+        """
+        self._cards.pop(card.id, None)
+        key = self._keys.pop(card.id, None)
+        if key is None:
+            return
+        position = bisect.bisect_left(self._sorted, key)
+        if position < len(self._sorted) and self._sorted[position] == key:
+            del self._sorted[position]
+
+    def update(self, card) -> None:
+        """
+        Args:
+            card (Card): A card in the index whose fields may have changed.
+        """
+        if self._keys.get(card.id) != self.key(card):
+            self.remove(card)
+            self.add(card)
+
+    def page(self, after=None, before=None, limit=None, topic=None) -> list:
+        """
+        Get the cards following ``after``, or the ones preceding ``before``.
+
+        Args:
+            after (tuple, optional): Only cards sorting after this key. Defaults to None.
+            before (tuple, optional): Only cards sorting before this key; the page then
+                ends right before it. Defaults to None.
+            limit (int, optional): Maximum number of cards. Defaults to None (all).
+            topic (str, optional): Only cards of this topic, for orders starting with
+                the topic. Defaults to None.
+
+        Returns:
+            list: Card objects in sort order.
+
+        Raises:
+            ValueError: If ``topic`` is given for an order not starting with the topic.
+        """
+        if topic is not None and not self.by_topic:
+            raise ValueError(f'{type(self).__name__} cannot be restricted to a topic')
+        low, high = 0, len(self._sorted)
+        if topic is not None:
+            low = bisect.bisect_left(self._sorted, (topic,))
+            high = bisect.bisect_right(self._sorted, (topic, float('inf')))
+        if after is not None:
+            low = max(low, bisect.bisect_right(self._sorted, tuple(after)))
+        if before is not None:
+            high = min(high, bisect.bisect_left(self._sorted, tuple(before)))
+        if limit is not None:
+            if before is not None:
+                low = max(low, high - limit)
+            else:
+                high = min(high, low + limit)
+        return [self._cards[key[-1]] for key in self._sorted[low:high]]
+
+
+class IdOrder(CardOrder):
+    """
+    Cards by id, i.e. in creation order.
+    """
+    key_types = (int,)
+
+    @staticmethod
+    def key(card) -> tuple:
+        return (card.id,)
+
+
+class TopicOrder(CardOrder):
+    """
+    Cards by topic, then id.
+    """
+    by_topic = True
+    key_types = (str, int)
+
+    @staticmethod
+    def key(card) -> tuple:
+        return (card.topic, card.id)
+
+
+# Orders a card listing can be paginated by
+CARD_ORDERS = {'id': IdOrder, 'topic': TopicOrder}
@@ -0,0 +1,204 @@
+"""
+Maintenance commands, run with ``flask <command>``
+"""
+import json
+import time
+import click
+from app import app
+from app.binary_snapshot import BinaryOpLogStore
+from app.deck_io import DeckFormatError, deck_format, export_deck, import_deck, text_lines
+from app.due_lists import due_lists, precompute_due_lists
+from app.engines import ENGINES
+from app.engines.pipeline import reschedule_decks
+from app.filelock import atomic_write_json
+from app.idsequence import IdSequence
+from app.aggregates import topic_totals
+from app.models import Card, storage
+from app.oplog import OpLogStore
+from app.storage import ShardedJsonBackend
+from config import Config
+
+
+@app.cli.command('compact-cards')
+def compact_cards():
+    """
+    Fold pending card writes into the storage backend's main file.
+    """
+    storage.compact()
+    click.echo('Card storage compacted')
+
+
+@app.cli.command('import-json')
+@click.option('--cards', 'cards_path', default='card_data.json', show_default=True, help='Card JSON file to import.')
+@click.option('--users', 'users_path', default='user_data.json', show_default=True, help='User JSON file to import.')
+def import_json(cards_path, users_path):
+    """
+    Replace the cards and users of the configured backend with the contents of JSON files.
+    """
+    # Replay card_data.json.log too, it holds the writes not yet compacted into the snapshot
+    cards = OpLogStore(cards_path).load()
+    with open(users_path, 'r') as file:
+        users = json.load(file)
+    storage.save_cards(cards)
+    storage.save_users(users)
+    click.echo(f'Imported {len(cards)} cards and {len(users)} users')
+
+
+@app.cli.command('export-json')
+@click.option('--cards', 'cards_path', default='card_data.json', show_default=True, help='Card JSON file to write.')
+@click.option('--users', 'users_path', default='user_data.json', show_default=True, help='User JSON file to write.')
+def export_json(cards_path, users_path):
+    """
+    Write the cards and users of the configured backend to JSON files.
+    """
+    cards = [card.to_record() for card in storage.load_cards()]
+    users = storage.load_users()
+    # Written as a JSON store: the snapshot is replaced atomically and its log emptied,
+    # so a store already at these paths does not replay its old log on top of the
+    # export, and its id sequence stays above the exported ids
+    OpLogStore(cards_path).write_snapshot(cards)
+    IdSequence(cards_path + '.seq').ensure_above(max((card['id'] for card in cards), default=0))
+    atomic_write_json(users_path, users)
+    click.echo(f'Exported {len(cards)} cards and {len(users)} users')
+
+
+@app.cli.command('shard-cards')
+@click.option('--source', default=Config.CARD_DATA_PATH, show_default=True, help='Card snapshot to split (its .log is replayed).')
+@click.option('--target', default=Config.CARD_SHARD_DIR, show_default=True, help='Directory for the per-author shards.')
+def shard_cards(source, target):
+    """
+    One-shot migration of a single card file into per-author shards for STORAGE_BACKEND=sharded.
+    """
+    records = OpLogStore(source).load()
+    shards = ShardedJsonBackend(lambda record: record, shard_dir=target, user_path=Config.USER_DATA_PATH)
+    shards.save_cards(records)
+    click.echo(f'Split {len(records)} cards into {len(shards.authors())} shards in {target}')
+
+
+@app.cli.command('cards-to-binary')
+@click.option('--source', default=Config.CARD_DATA_PATH, show_default=True, help='JSON card snapshot to convert (its .log is replayed).')
+@click.option('--target', default=Config.CARD_BINARY_PATH, show_default=True, help='Binary snapshot to write.')
+def cards_to_binary(source, target):
+    """
+    Convert a JSON card snapshot into the binary snapshot used by STORAGE_BACKEND=mmap.
+    """
+    records = OpLogStore(source).load()
+    BinaryOpLogStore(target).write_snapshot(records)
+    click.echo(f'Wrote {len(records)} cards to {target}')
+
+
+@app.cli.command('cards-to-json')
+@click.option('--source', default=Config.CARD_BINARY_PATH, show_default=True, help='Binary snapshot to convert (its .log is replayed).')
+@click.option('--target', default=Config.CARD_DATA_PATH, show_default=True, help='JSON card snapshot to write.')
+def cards_to_json(source, target):
+    """
+    Convert a binary card snapshot back into a JSON card snapshot.
+    """
+    records = BinaryOpLogStore(source).load()
+    OpLogStore(target).write_snapshot(records)
+    click.echo(f'Wrote {len(records)} cards to {target}')
+
+
+@app.cli.command('verify-stats')
+@click.option('--repair', is_flag=True, help='Rebuild the totals from the cards if they differ.')
+def verify_stats(repair):
+    """
+    Check the maintained per-topic answer totals against totals recomputed from every card.
+    """
+    cards_by_author = {}
+    for card in storage.load_cards():
+        cards_by_author.setdefault(card.author_id, []).append(card)
+    mismatches = 0
+    for author_id, cards in sorted(cards_by_author.items()):
+        expected = topic_totals(cards)
+        actual = storage.topic_stats(author_id)
+        for topic in sorted(set(expected) | set(actual)):
+            if expected.get(topic) != actual.get(topic):
+                mismatches += 1
+                click.echo(f'{author_id} / {topic}: stored {actual.get(topic)}, expected {expected.get(topic)}')
+    if mismatches and repair:
+        storage.rebuild_topic_stats()
+        click.echo(f'Rebuilt topic totals after {mismatches} mismatches')
+    elif mismatches:
+        raise click.ClickException(f'{mismatches} topic totals differ, run with --repair to rebuild them')
+    else:
+        click.echo(f'Topic totals of {len(cards_by_author)} authors are consistent')
+
+
+@app.cli.command('rebuild-search')
+def rebuild_search():
+    """
+    Rebuild the full-text search index from the stored cards.
+    """
+    storage.rebuild_search_index()
+    click.echo('Rebuilt the search index')
+
+
+@app.cli.command('reschedule')
+@click.option('--engine', type=click.Choice(sorted(ENGINES)), default=Config.SCHEDULER_ENGINE, show_default=True,
+              help='Scheduling engine to plan with.')
+@click.option('--chunk-size', default=10000, show_default=True, help='Cards planned per worker task.')
+@click.option('--workers', type=int, default=None, help='Worker processes (0 plans in this process). [default: CPU count]')
+@click.option('--dry-run', is_flag=True, help='Plan and report throughput without writing review dates.')
+def reschedule(engine, chunk_size, workers, dry_run):
+    """
+    Plan the next review date of every card with a scheduling engine and store it.
+    """
+    result = reschedule_decks(storage, engine, chunk_size=chunk_size, workers=workers, dry_run=dry_run)
+    rate = result['cards'] / result['seconds'] if result['seconds'] else 0
+    click.echo(f"{'Planned' if dry_run else 'Rescheduled'} {result['cards']} cards in {result['chunks']} chunks "
+               f"with {engine} in {result['seconds']:.2f}s ({rate:,.0f} cards/s)")
+
+
+@app.cli.command('precompute-due')
+@click.option('--day', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Review day. [default: today in UTC]')
+@click.option('--workers', type=int, default=None, help='Worker processes (0 picks in this process). [default: CPU count]')
+def precompute_due(day, workers):
+    """
+    Pick and store every user's due list for a day, e.g. from cron right after UTC midnight.
+    """
+    result = precompute_due_lists(storage, due_lists, day=day.date() if day else None, workers=workers)
+    click.echo(f"Stored the due lists of {result['authors']} users ({result['cards']} cards) "
+               f"in {result['seconds']:.2f}s")
+
+
+@app.cli.command('import-deck')
+@click.argument('deck', type=click.File('rb'))
+@click.option('--user', required=True, help='Username the cards are added for.')
+@click.option('--format', 'fmt', default=None, help='csv, jsonl or tsv. [default: the file extension]')
+@click.option('--topic', default='Imported', show_default=True, help='Topic of rows without one.')
+@click.option('--batch-size', default=Config.IMPORT_BATCH_SIZE, show_default=True, help='Cards added per write.')
+def import_deck_command(deck, user, fmt, topic, batch_size):
+    """
+    Add the cards of a CSV, JSON Lines or Anki-style TSV file (or - for stdin) to a user's deck.
+    """
+    try:
+        fmt = deck_format(fmt or deck.name)
+    except DeckFormatError as error:
+        raise click.UsageError(str(error))
+    start = time.perf_counter()
+    summary = import_deck(text_lines(deck), fmt, user, default_topic=topic, batch_size=batch_size)
+    seconds = time.perf_counter() - start
+    for error in summary['errors']:
+        click.echo(f"Line {error['line']}: {error['error']}", err=True)
+    rate = summary['imported'] / seconds if seconds else 0
+    click.echo(f"Imported {summary['imported']} cards for {user} in {seconds:.2f}s ({rate:,.0f} cards/s), "
+               f"rejected {summary['rejected']} rows")
+    if summary['error']:
+        raise click.ClickException(f"Stopped early: {summary['error']}")
+
+
+@app.cli.command('export-deck')
+@click.argument('deck', type=click.File('w'))
+@click.option('--user', required=True, help='Username whose cards are written.')
+@click.option('--format', 'fmt', default=None, help='csv, jsonl or tsv. [default: the file extension]')
+def export_deck_command(deck, user, fmt):
+    """
+    Write a user's deck as a CSV, JSON Lines or Anki-style TSV file (or - for stdout).
+    """
+    try:
+        fmt = deck_format(fmt or deck.name)
+    except DeckFormatError as error:
+        raise click.UsageError(str(error))
+    for chunk in export_deck(Card.iter_by_user(user, page_size=Config.EXPORT_PAGE_SIZE), fmt):
+        deck.write(chunk)
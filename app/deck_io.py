@@ -0,0 +1,240 @@
+"""
+Streaming import and export of decks as CSV, JSON Lines and Anki-style TSV
+
+Imports read the upload line by line, validate every row and add the valid cards
+in batches: each batch reserves its ids with one allocation and is written with
+one ``add_cards`` call, so a deck of any size costs a bounded amount of memory
+and one write per batch. Exports page through the deck by id and yield the file
+in chunks.
+
+Formats:
+    csv: A header row naming the columns, ``question`` and ``answer`` are
+        required, ``topic`` and ``hint`` optional; other columns are ignored.
+    jsonl: One JSON object per line with the same keys.
+    tsv: Anki's "Notes in Plain Text": question, answer, topic (Anki's tags
+        column) and hint separated by tabs, leading ``#`` lines are file headers
+        and ``<br>`` stands for a line break.
+"""
+import codecs
+import csv
+import io
+import json
+import re
+
+from app.models import Card
+
+# Columns of the CSV and TSV formats, in order
+DECK_FIELDS = ('topic', 'question', 'answer', 'hint')
+# Media type of each format
+DECK_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson', 'tsv': 'text/tab-separated-values'}
+# Longest field an imported card may have, in characters
+MAX_FIELD_CHARS = 10000
+# Hint of imported cards without one, as on the new card form
+DEFAULT_HINT = 'No hints available!'
+
+_TSV_HEADER = '#separator:tab\n#html:true\n'
+_LINE_BREAK = re.compile(r'<br\s*/?>', re.IGNORECASE)
+
+
+class DeckFormatError(ValueError):
+    """
+    Raised when a deck file cannot be read any further, e.g. a CSV file without a
+    header naming the required columns.
+    """
+
+
+def deck_format(name) -> str:
+    """
+    Args:
+        name (str): A format name or a file name ending with one.
+
+    Returns:
+        str: The format, one of DECK_FORMATS.
+
+    Raises:
+        DeckFormatError: If the format is unknown.
+    """
+    fmt = (name or '').rsplit('.', 1)[-1].lower()
+    if fmt == 'txt':
+        fmt = 'tsv'
+    if fmt not in DECK_FORMATS:
+        raise DeckFormatError(f"Unknown deck format {name!r}, expected one of {', '.join(DECK_FORMATS)}")
+    return fmt
+
+
+def text_lines(binary):
+    """
+    Args:
+        binary (iterable): A binary file or stream, e.g. an upload.
+
+    Returns:
+        iterator: Its lines decoded as UTF-8 (with or without a byte order mark).
+    """
+    return codecs.iterdecode(binary, 'utf-8-sig')
+
+
+def _read_csv(lines):
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None:
+        return
+    columns = [name.strip().lower() for name in reader.fieldnames]
+    if 'question' not in columns or 'answer' not in columns:
+        raise DeckFormatError('The CSV header must name the question and answer columns')
+    reader.fieldnames = columns
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _read_jsonl(lines):
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield line_number, DeckFormatError(f'Invalid JSON: {error}')
+            continue
+        yield line_number, row if isinstance(row, dict) else DeckFormatError('Expected a JSON object')
+
+
+def _read_tsv(lines):
+    offset = 0
+    lines = iter(lines)
+    for line in lines:
+        if not line.startswith('#'):
+            lines = _prepend(line, lines)
+            break
+        offset += 1
+    reader = csv.reader(lines, delimiter='\t')
+    for values in reader:
+        if not any(values):
+            continue
+        row = {name: _LINE_BREAK.sub('\n', value) for name, value in zip(('question', 'answer', 'topic', 'hint'), values)}
+        yield offset + reader.line_num, row
+
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
+
+
+_READERS = {'csv': _read_csv, 'jsonl': _read_jsonl, 'tsv': _read_tsv}
+
+
+def _card_fields(row, default_topic) -> dict:
+    """
+    Validate one row of a deck file.
+
+    Returns:
+        dict: The topic, question, answer and hint of the card.
+
+    Raises:
+        DeckFormatError: If a field is missing, not text or too long.
+    """
+    if isinstance(row, DeckFormatError):
+        raise row
+    fields = {}
+    for name in DECK_FIELDS:
+        value = row.get(name)
+        if value is None:
+            value = ''
+        if not isinstance(value, str):
+            raise DeckFormatError(f'{name} must be text')
+        if len(value) > MAX_FIELD_CHARS:
+            raise DeckFormatError(f'{name} is longer than {MAX_FIELD_CHARS} characters')
+        fields[name] = value.strip()
+    for name in ('question', 'answer'):
+        if not fields[name]:
+            raise DeckFormatError(f'{name} is missing')
+    fields['topic'] = fields['topic'] or default_topic
+    fields['hint'] = fields['hint'] or DEFAULT_HINT
+    return fields
+
+
+def import_deck(lines, fmt, author_id, default_topic='Imported', batch_size=1000, max_errors=100) -> dict:
+    """
+    Add the cards of a deck file to an author's deck, one batch at a time.
+
+    Invalid rows are skipped and reported. A file that cannot be read any further
+    stops the import; the batches added before stay.
+
+    Args:
+        lines (iterable): The text lines of the file, see text_lines.
+        fmt (str): The format, one of DECK_FORMATS.
+        author_id (str): The author of the new cards.
+        default_topic (str, optional): Topic of rows without one. Defaults to 'Imported'.
+        batch_size (int, optional): Cards added per write. Defaults to 1000.
+        max_errors (int, optional): Most rejected rows reported. Defaults to 100.
+
+    Returns:
+        dict: ``imported`` and ``rejected`` row counts, ``errors`` as ``{'line', 'error'}``
+        dicts, and ``error``, the reason the import stopped early or None.
+    """
+    summary = {'imported': 0, 'rejected': 0, 'errors': [], 'error': None}
+    batch = []
+
+    def flush():
+        ids = Card.allocate_ids(len(batch))
+        Card.add_cards([Card(id=card_id, author_id=author_id, **fields) for card_id, fields in zip(ids, batch)])
+        summary['imported'] += len(batch)
+        batch.clear()
+
+    with Card.bulk_insert(author_id):
+        try:
+            for line_number, row in _READERS[fmt](lines):
+                try:
+                    batch.append(_card_fields(row, default_topic))
+                except DeckFormatError as error:
+                    summary['rejected'] += 1
+                    if len(summary['errors']) < max_errors:
+                        summary['errors'].append({'line': line_number, 'error': str(error)})
+                    continue
+                if len(batch) >= batch_size:
+                    flush()
+        except (DeckFormatError, UnicodeDecodeError, csv.Error) as error:
+            summary['error'] = str(error)
+        if batch:
+            flush()
+    return summary
+
+
+def export_deck(cards, fmt, chunk_cards=500):
+    """
+    Write cards in a deck format, chunk by chunk.
+
+    Args:
+        cards (iterable): The Card objects, e.g. Card.iter_by_user.
+        fmt (str): The format, one of DECK_FORMATS.
+        chunk_cards (int, optional): Cards per yielded chunk. Defaults to 500.
+
+    Yields:
+        str: The file, a chunk at a time.
+    """
+    buffer = io.StringIO()
+    if fmt == 'jsonl':
+        def write(card):
+            buffer.write(json.dumps({name: getattr(card, name) for name in DECK_FIELDS}) + '\n')
+    elif fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(DECK_FIELDS)
+
+        def write(card):
+            writer.writerow([getattr(card, name) for name in DECK_FIELDS])
+    else:
+        buffer.write(_TSV_HEADER)
+        writer = csv.writer(buffer, delimiter='\t', lineterminator='\n')
+
+        def write(card):
+            writer.writerow([(getattr(card, name) or '').replace('\r\n', '<br>').replace('\n', '<br>')
+                             for name in ('question', 'answer', 'topic', 'hint')])
+
+    count = 0
+    for card in cards:
+        write(card)
+        count += 1
+        if count % chunk_cards == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,134 @@
+"""
+Per-author review index answering Scheduler.pick_card without scanning the deck
+"""
+import bisect
+import datetime
+
+from app.scheduler import Scheduler, _review_date
+
+
+class DueIndex:
+    """
+    Cards of one author kept sorted by ``(next_review_date, id)`` plus one list per
+    Leitner box sorted by ``(timestamp, id)``.
+
+    Queries bisect into the sorted lists and touch only the cards they return.
+    Answers and edits re-key a single card. The picks are those of
+    Scheduler.pick_card, except that cards due at the same time are ordered by id
+    instead of deck order.
+
+    Attributes:
+        scheduler (Scheduler): Supplies the scoring and box thresholds.
+    """
+    def __init__(self, cards, scheduler=None) -> None:
+        """
+        Build the index.
+
+        Args:
+            cards (list): The author's Card objects.
+            scheduler (Scheduler, optional): Scoring rules. Defaults to a Scheduler with the default boxes.
+        """
+        self.scheduler = scheduler or Scheduler([])
+        self._cards = {}
+        self._keys = {}  # card id -> (due key or None, box, box key)
+        self._due = []
+        self._boxes = [[] for _ in range(self.scheduler.box_count)]
+        for card in cards:
+            self._cards[card.id] = card
+            self._keys[card.id] = self._key(card)
+        self._due = sorted(due_key for due_key, box, box_key in self._keys.values() if due_key is not None)
+        for due_key, box, box_key in self._keys.values():
+            self._boxes[box].append(box_key)
+        for box_keys in self._boxes:
+            box_keys.sort()
+
+    def _key(self, card) -> tuple:
+        review_date = _review_date(card.next_review_date)
+        due_key = (review_date, card.id) if review_date is not None else None
+        return due_key, self.scheduler.determine_box(card), (card.timestamp or '', card.id)
+
+    @staticmethod
+    def _remove(keys, key) -> None:
+        position = bisect.bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            del keys[position]
+
+    def add(self, card) -> None:
+        """
+        Args:
+            card (Card): A card new to the index.
+        """
+        self._cards[card.id] = card
+        due_key, box, box_key = self._keys[card.id] = self._key(card)
+        if due_key is not None:
+            bisect.insort(self._due, due_key)
+        bisect.insort(self._boxes[box], box_key)
+
+    def remove(self, card) -> None:
+        """
+        Args:
+            card (Card): A card in the index.
+        """
+        self._cards.pop(card.id, None)
+        keys = self._keys.pop(card.id, None)
+        if keys is None:
+            return
+        due_key, box, box_key = keys
+        if due_key is not None:
+            self._remove(self._due, due_key)
+        self._remove(self._boxes[box], box_key)
+
+    def update(self, card) -> None:
+        """
+        Re-key a card after its flags, review date or timestamp changed.
+
+        Args:
+            card (Card): A card in the index.
+        """
+        if self._keys.get(card.id) != self._key(card):
+            self.remove(card)
+            self.add(card)
+
+    def _due_end(self, today) -> int:
+        # Every review date on ``today`` or earlier sorts before the next midnight
+        midnight = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time())
+        return bisect.bisect_left(self._due, (midnight,))
+
+    def due_count(self, today=None) -> int:
+        """
+        Args:
+            today (date, optional): The review day. Defaults to today in UTC.
+
+        Returns:
+            int: Number of cards with a review date on ``today`` or earlier.
+        """
+        return self._due_end(today or datetime.datetime.now(datetime.timezone.utc).date())
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def __iter__(self):
+        return iter(self._cards.values())
+
+    def pick(self, today=None, offset=0, limit=None) -> tuple:
+        """
+        The cards Scheduler.pick_card would return: those due by ``today`` ordered by
+        review date, or, if none is due, the least-scored box ordered by timestamp.
+
+        Args:
+            today (date, optional): The review day. Defaults to today in UTC.
+            offset (int, optional): Number of picked cards to skip. Defaults to 0.
+            limit (int, optional): Maximum number of cards to return. Defaults to None (all).
+
+        Returns:
+            tuple: The requested slice of picked Card objects and the total number of picked cards.
+        """
+        today = today or datetime.datetime.now(datetime.timezone.utc).date()
+        due_end = self._due_end(today)
+        if due_end:
+            keys, total = self._due, due_end
+        else:
+            keys = self._boxes[self.scheduler.box_count - 1]
+            total = len(keys)
+        end = total if limit is None else min(total, offset + limit)
+        return [self._cards[key[-1]] for key in keys[offset:end]], total
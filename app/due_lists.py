@@ -0,0 +1,214 @@
+"""
+Review queues precomputed at the start of each UTC day
+
+Without them, the first game of the day pays for loading, scoring and sorting the
+user's whole deck. A rollover job (``flask precompute-due`` or the in-process
+RolloverThread) picks the queue of every author for the new day and stores it as a
+list of card ids together with the author's version token
+(StorageBackend.author_version). start_game serves a stored list only while the
+token still matches; after any change to the author's cards it picks the queue
+itself again.
+"""
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.filelock import FileLock, atomic_write_json
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def _today():
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+class DueListStore:
+    """
+    The due lists of one day in a JSON file shared by every worker process.
+
+    Layout: ``{"day": "2024-06-10", "lists": {"jan": ["<version>", [3, 1, 2]], ...}}``
+
+    The file is replaced atomically and re-read by a worker only when it changed.
+
+    Attributes:
+        path (str): Path of the JSON file.
+        file_lock (FileLock): Serializes the rollover jobs of several workers.
+    """
+    def __init__(self, path) -> None:
+        self.path = path
+        self.file_lock = FileLock(path + '.lock')
+        self._lock = threading.Lock()
+        self._stat = None
+        self._day = None
+        self._lists = {}
+
+    def _refresh(self) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._stat, self._day, self._lists = None, None, {}
+            return
+        key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if key == self._stat:
+            return
+        try:
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._stat, self._day, self._lists = None, None, {}
+            return
+        self._stat, self._day, self._lists = key, datetime.date.fromisoformat(data['day']), data['lists']
+
+    def day(self):
+        """
+        Returns:
+            date: The day the stored lists were picked for, None if there are none.
+        """
+        with self._lock:
+            self._refresh()
+            return self._day
+
+    def get(self, author_id, day, version):
+        """
+        Look up an author's precomputed due list.
+
+        Args:
+            author_id (str): The ID of the author.
+            day (date): The review day.
+            version (str): The author's current version token.
+
+        Returns:
+            list: Card ids in review order, None if no list for that day and version is stored.
+        """
+        with self._lock:
+            self._refresh()
+            if self._day != day:
+                return None
+            entry = self._lists.get(author_id)
+        if entry is None or entry[0] != version:
+            return None
+        return list(entry[1])
+
+    def write(self, day, lists) -> None:
+        """
+        Replace the stored lists.
+
+        Args:
+            day (date): The review day the lists were picked for.
+            lists (dict): ``[version, card ids]`` keyed by author id.
+        """
+        atomic_write_json(self.path, {'day': day.isoformat(), 'lists': lists})
+
+
+def _pick_due(storage, author_ids, day) -> dict:
+    lists = {}
+    for author_id in author_ids:
+        # Read the version first: a write in between leaves the list stale, never wrong
+        version = storage.author_version(author_id)
+        cards, total = storage.pick_for_review(author_id, today=day)
+        lists[author_id] = [version, [card.id for card in cards]]
+    return lists
+
+
+_worker_storage = None
+
+
+def _init_worker(storage) -> None:
+    global _worker_storage
+    _worker_storage = storage
+
+
+def _pick_due_in_worker(author_ids, day) -> dict:
+    return _pick_due(_worker_storage, author_ids, day)
+
+
+def precompute_due_lists(storage, store, day=None, workers=None, authors_per_task=50) -> dict:
+    """
+    Pick and store the due list of every author with cards.
+
+    Pool processes are forked, so they inherit the storage backend together with
+    its warm caches instead of reopening it.
+
+    Args:
+        storage (StorageBackend): Where the cards live.
+        store (DueListStore): Where the lists are stored.
+        day (date, optional): The review day. Defaults to today in UTC.
+        workers (int, optional): Pool processes, 0 to pick in this process. Defaults to the CPU count.
+        authors_per_task (int, optional): Authors picked per pool task. Defaults to 50.
+
+    Returns:
+        dict: Number of ``authors`` and listed ``cards`` and the elapsed ``seconds``.
+    """
+    day = day or _today()
+    started = time.perf_counter()
+    authors = storage.card_authors()
+    batches = [authors[start:start + authors_per_task] for start in range(0, len(authors), authors_per_task)]
+    lists = {}
+    if workers == 0:
+        for batch in batches:
+            lists.update(_pick_due(storage, batch, day))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                 initializer=_init_worker, initargs=(storage,)) as executor:
+            for batch_lists in executor.map(_pick_due_in_worker, batches, [day] * len(batches)):
+                lists.update(batch_lists)
+    store.write(day, lists)
+    return {'authors': len(lists), 'cards': sum(len(card_ids) for version, card_ids in lists.values()),
+            'seconds': time.perf_counter() - started}
+
+
+class RolloverThread(threading.Thread):
+    """
+    Daemon thread that precomputes the due lists shortly after every UTC midnight,
+    and once on start if the stored lists are not for today.
+
+    Every worker process may run one. The job holds the store's file lock and is
+    skipped when another worker already stored the day's lists. It picks in this
+    process: forking a worker that serves requests on other threads could copy a
+    held lock into the pool processes.
+
+    Attributes:
+        storage (StorageBackend): Where the cards live.
+        store (DueListStore): Where the lists are stored.
+        delay (float): Seconds after midnight the job runs at.
+    """
+    def __init__(self, storage, store, delay=60.0) -> None:
+        super().__init__(name='due-list-rollover', daemon=True)
+        self.storage = storage
+        self.store = store
+        self.delay = delay
+
+    def run_once(self, day) -> bool:
+        """
+        Args:
+            day (date): The review day.
+
+        Returns:
+            bool: True if this call stored the lists, False if they already were.
+        """
+        with self.store.file_lock.acquire():
+            if self.store.day() == day:
+                return False
+            precompute_due_lists(self.storage, self.store, day=day, workers=0)
+            return True
+
+    def run(self) -> None:
+        while True:
+            try:
+                self.run_once(_today())
+            except Exception:
+                logger.exception('Precomputing the due lists failed')
+            now = datetime.datetime.now(datetime.timezone.utc)
+            midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time(),
+                                                 tzinfo=datetime.timezone.utc)
+            time.sleep((midnight - now).total_seconds() + self.delay)
+
+
+# Shared by every request handled by this worker process
+due_lists = DueListStore(Config.DUE_LIST_PATH)
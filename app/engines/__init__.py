@@ -0,0 +1,35 @@
+"""
+Pluggable review scheduling engines, selected by ``Config.SCHEDULER_ENGINE``
+"""
+from app.engines.base import SchedulingEngine
+from app.engines.fsrs import FSRSEngine
+from app.engines.leitner import LeitnerEngine
+from app.engines.sm2 import SM2Engine
+from config import Config
+
+ENGINES = {
+    'leitner': LeitnerEngine,
+    'sm2': SM2Engine,
+    'fsrs': FSRSEngine,
+}
+
+
+def create_engine(name) -> SchedulingEngine:
+    """
+    Build the scheduling engine of the given name.
+
+    Args:
+        name (str): A key of ENGINES.
+
+    Returns:
+        SchedulingEngine: The engine with its default parameters.
+    """
+    try:
+        engine = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown SCHEDULER_ENGINE '{name}', expected one of {sorted(ENGINES)}")
+    return engine()
+
+
+# Shared by every request handled by this worker process
+review_engine = create_engine(Config.SCHEDULER_ENGINE)
@@ -0,0 +1,72 @@
+"""
+Interface shared by all scheduling engines
+"""
+import datetime
+
+import numpy as np
+
+from app.scheduler import DeckArrays
+
+
+class SchedulingEngine:
+    """
+    Turns the review counters of cards into the number of days until their next review.
+
+    Cards only keep answer totals (right, wrong, hint_used), not the order of the
+    answers, so every engine works from those totals in one vectorized pass.
+
+    Attributes:
+        name (str): Key of the engine in app.engines.ENGINES.
+        max_interval (int): Longest interval in days.
+    """
+    name = None
+
+    def __init__(self, max_interval=365) -> None:
+        self.max_interval = max_interval
+
+    def intervals(self, deck):
+        """
+        Args:
+            deck (DeckArrays): Review counters of the cards.
+
+        Returns:
+            ndarray: Days until the next review of every card.
+        """
+        raise NotImplementedError
+
+    def review_days(self, deck):
+        """
+        Args:
+            deck (DeckArrays): Review counters of the cards.
+
+        Returns:
+            ndarray: ``intervals`` rounded to whole days between 1 and ``max_interval``.
+        """
+        return np.clip(np.rint(self.intervals(deck)), 1, self.max_interval).astype(np.int64)
+
+    def next_review_dates(self, cards, now=None) -> list:
+        """
+        Args:
+            cards (list): Card objects.
+            now (datetime, optional): Time of the review. Defaults to the current UTC time.
+
+        Returns:
+            list: The next review date of every card as an ISO 8601 string, as stored with the card.
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        return review_dates(now, self.review_days(DeckArrays(cards)))
+
+
+def review_dates(now, days) -> list:
+    """
+    Args:
+        now (datetime): Time of the review.
+        days (ndarray): Whole days until the next review.
+
+    Returns:
+        list: ISO 8601 review dates, one per entry of ``days``.
+    """
+    # Few distinct intervals occur, so format each date once
+    dates = {}
+    return [dates.get(day) or dates.setdefault(day, (now + datetime.timedelta(days=day)).isoformat())
+            for day in days.tolist()]
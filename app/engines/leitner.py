@@ -0,0 +1,27 @@
+"""
+Leitner boxes, the scheduling the app started with
+"""
+import numpy as np
+
+from app.engines.base import SchedulingEngine
+from app.scheduler import BOX_INTERVALS, BOX_THRESHOLD
+
+
+class LeitnerEngine(SchedulingEngine):
+    """
+    The card's score picks a box and every box has a fixed review interval, as
+    Scheduler.calculate_next_review_date.
+
+    Attributes:
+        box_intervals (list): Review interval in days of every box.
+        box_threshold (list): Descending minimum score of every box.
+    """
+    name = 'leitner'
+
+    def __init__(self, box_intervals=None, box_threshold=None, max_interval=365) -> None:
+        super().__init__(max_interval=max_interval)
+        self.box_intervals = list(box_intervals or BOX_INTERVALS)
+        self.box_threshold = list(box_threshold or BOX_THRESHOLD)
+
+    def intervals(self, deck):
+        return np.asarray(self.box_intervals, dtype=np.float64)[deck.boxes(self.box_threshold)]
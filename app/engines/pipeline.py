@@ -0,0 +1,76 @@
+"""
+Offline rescheduling of every deck with a scheduling engine
+
+Decks are streamed author by author in chunks. Only the counter arrays of a chunk
+are sent to a process pool, which plans the intervals. The main process writes the
+review dates back through the storage backend, one bulk write per chunk.
+"""
+import datetime
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.engines import create_engine
+from app.engines.base import review_dates
+from app.scheduler import DeckArrays
+
+
+def _plan_chunk(engine_name, counters):
+    # Runs in a pool process: rebuild the deck from plain arrays and plan it
+    return create_engine(engine_name).review_days(DeckArrays.from_counters(*counters))
+
+
+def _chunks(storage, chunk_size):
+    for author_id in storage.card_authors():
+        cards = storage.cards_by_author(author_id)
+        for start in range(0, len(cards), chunk_size):
+            yield author_id, cards[start:start + chunk_size]
+
+
+def reschedule_decks(storage, engine_name, chunk_size=10000, workers=None, now=None, dry_run=False) -> dict:
+    """
+    Plan and store the next review date of every card.
+
+    Args:
+        storage (StorageBackend): Where the cards live.
+        engine_name (str): A key of app.engines.ENGINES.
+        chunk_size (int, optional): Cards planned per pool task. Defaults to 10000.
+        workers (int, optional): Pool processes, 0 to plan in this process. Defaults to the CPU count.
+        now (datetime, optional): Time the intervals start from. Defaults to the current UTC time.
+        dry_run (bool, optional): Plan without writing anything back. Defaults to False.
+
+    Returns:
+        dict: Number of ``cards`` and ``chunks`` and the elapsed ``seconds``.
+    """
+    create_engine(engine_name)  # fail early on unknown names
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    started = time.perf_counter()
+    cards_planned = chunks = 0
+    executor = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+    try:
+        pending = []
+        for author_id, cards in _chunks(storage, chunk_size):
+            counters = DeckArrays(cards).counters()
+            if executor is None:
+                pending.append((author_id, cards, _plan_chunk(engine_name, counters)))
+            else:
+                pending.append((author_id, cards, executor.submit(_plan_chunk, engine_name, counters)))
+            # Keep a bounded number of chunks in flight
+            if len(pending) > 2 * (workers or 4):
+                cards_planned += _write(storage, now, *pending.pop(0), dry_run)
+                chunks += 1
+        for entry in pending:
+            cards_planned += _write(storage, now, *entry, dry_run)
+            chunks += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return {'cards': cards_planned, 'chunks': chunks, 'seconds': time.perf_counter() - started}
+
+
+def _write(storage, now, author_id, cards, days, dry_run) -> int:
+    if hasattr(days, 'result'):
+        days = days.result()
+    if not dry_run:
+        dates = review_dates(now, days)
+        storage.set_review_dates(author_id, {card.id: date for card, date in zip(cards, dates)})
+    return len(cards)
@@ -0,0 +1,45 @@
+"""
+SuperMemo 2
+"""
+import numpy as np
+
+from app.engines.base import SchedulingEngine
+
+
+def easiness_delta(quality) -> float:
+    """
+    Args:
+        quality (int): SM-2 answer quality, 0 to 5.
+
+    Returns:
+        float: Change of the easiness factor after one answer of that quality.
+    """
+    return 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+
+
+class SM2Engine(SchedulingEngine):
+    """
+    SM-2 on answer totals.
+
+    Right answers count as quality 4, right answers after a hint as 3 and wrong
+    answers as 1. The easiness factor starts at 2.5, changes by the sum of the
+    answers' deltas and stays at least 1.3. Without the answer order, the run of
+    successful repetitions is taken as right minus wrong answers. After n
+    repetitions the interval is 1, 6, then 6 * EF^(n - 2) days.
+    """
+    name = 'sm2'
+
+    def __init__(self, initial_easiness=2.5, min_easiness=1.3, max_interval=365) -> None:
+        super().__init__(max_interval=max_interval)
+        self.initial_easiness = initial_easiness
+        self.min_easiness = min_easiness
+
+    def intervals(self, deck):
+        hinted = np.minimum(deck.hint_used, deck.right)
+        easiness = self.initial_easiness + (deck.right - hinted) * easiness_delta(4)
+        easiness += hinted * easiness_delta(3) + deck.wrong * easiness_delta(1)
+        easiness = np.maximum(easiness, self.min_easiness)
+        repetitions = np.maximum(deck.right - deck.wrong, 0)
+        # Cap the exponent, intervals beyond max_interval are clipped anyway
+        exponent = np.clip(repetitions - 2, 0, 64)
+        return np.where(repetitions <= 1, 1.0, np.where(repetitions == 2, 6.0, 6.0 * easiness ** exponent))
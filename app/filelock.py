@@ -0,0 +1,160 @@
+"""
+Cross-process file locking and atomic file replacement
+
+gunicorn runs several worker processes against the same data files, so every
+writer takes an exclusive ``flock`` on a sidecar lock file and replaces files via
+write-to-temp + ``os.replace``. The lock file also stores a monotonically increasing
+version counter that is bumped on every write.
+"""
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+
+class ConflictError(Exception):
+    """
+    Raised when an optimistic write finds that the data changed since it was read.
+    """
+
+
+class FileLock:
+    """
+    Re-entrant (within one process) shared/exclusive lock backed by ``flock``.
+
+    Attributes:
+        path (str): Path of the lock file.
+    """
+    def __init__(self, path) -> None:
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._fd = None
+        self._depth = 0
+
+    @contextmanager
+    def acquire(self, exclusive=True):
+        """
+        Hold the lock for the duration of a ``with`` block.
+
+        Nested acquisitions by the same thread reuse the outer lock; the outer
+        mode wins, so do not request an exclusive lock inside a shared one.
+
+        Args:
+            exclusive (bool, optional): Exclusive (writer) or shared (reader) lock. Defaults to True.
+
+        Yields:
+            int: File descriptor of the lock file.
+        """
+        with self._thread_lock:
+            if self._depth == 0:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._depth += 1
+            try:
+                yield self._fd
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                    os.close(self._fd)
+                    self._fd = None
+
+    def version(self) -> int:
+        """
+        Returns:
+            int: The version counter stored in the lock file, 0 if never written.
+        """
+        try:
+            with open(self.path, 'rb') as file:
+                return int(file.read() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def bump_version(self) -> int:
+        """
+        Increment the version counter. Must be called while holding the exclusive lock.
+
+        Returns:
+            int: The new version.
+        """
+        return self.set_version(self.version() + 1)
+
+    def set_version(self, version) -> int:
+        """
+        Overwrite the version counter. Must be called while holding the exclusive lock.
+
+        Args:
+            version (int): The new value.
+
+        Returns:
+            int: The new version.
+        """
+        data = str(version).encode()
+        os.pwrite(self._fd, data, 0)
+        os.ftruncate(self._fd, len(data))
+        return version
+
+
+class FileSemaphore:
+    """
+    Counting semaphore shared by every process using the same path, made of
+    ``slots`` lock files ``<path>.0``, ``<path>.1``, ... A slot is taken by holding an
+    exclusive ``flock`` on its file, so the slots of a crashed process are freed by
+    the kernel. Every acquisition opens its own descriptor, so threads of one process
+    count separately too.
+
+    Attributes:
+        path (str): Common prefix of the slot files.
+        slots (int): Holders allowed at once.
+    """
+    def __init__(self, path, slots) -> None:
+        self.path = path
+        self.slots = slots
+
+    def try_acquire(self):
+        """
+        Take a free slot without waiting.
+
+        Returns:
+            int: File descriptor holding the slot, to pass to ``release``; None if
+            every slot is taken.
+        """
+        for index in range(self.slots):
+            fd = os.open(f'{self.path}.{index}', os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def release(self, fd) -> None:
+        """
+        Args:
+            fd (int): The descriptor returned by ``try_acquire``.
+        """
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def atomic_write_json(path, data) -> None:
+    """
+    Write JSON to a temporary file, fsync it and rename it over ``path``.
+
+    Readers see either the old or the new file, never a partially written one.
+
+    Args:
+        path (str): Destination path.
+        data: JSON serializable data.
+    """
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'w') as file:
+            json.dump(data, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -3,6 +3,8 @@ from wtforms import StringField, PasswordField, BooleanField, SubmitField
 from wtforms.validators import ValidationError, DataRequired, Email, EqualTo
 from app.models import User
 
+USERNAME_TAKEN = 'Looks like that username is already being used.'
+
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -21,9 +23,8 @@ class RegistrationForm(FlaskForm):
     def validate_username(self, username):
         user = User.get_by_username(username.data)
         if user is not None:
-            raise ValidationError('Looks like that username is already being used.')
+            raise ValidationError(USERNAME_TAKEN)
 
     def validate_email(self, email):
-        users, message = User.load_users()
-        if any(user.email == email.data for user in users.values()):
+        if User.get_by_email(email.data) is not None:
             raise ValidationError('Please use a different email address.')
@@ -0,0 +1,116 @@
+"""
+Cache of rendered template fragments
+
+``{% cache key, ... %}...{% endcache %}`` renders its body once per key and serves
+the markup from memory afterwards. Keys must capture everything the body shows:
+a card's fragment is keyed by the card's id and displayed fields, a listing's by
+the user, the version of their deck and the page. Fragments are never invalidated,
+stale ones simply stop being asked for and fall out of the LRU.
+"""
+import threading
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from config import Config
+
+
+class FragmentCache:
+    """
+    Bounded, per-process LRU of rendered fragments.
+
+    Attributes:
+        max_chars (int): Total length of the cached markup before the least recently
+            used fragments are evicted.
+        hits (int): Fragments served from the cache.
+        misses (int): Fragments rendered.
+        evictions (int): Fragments evicted to stay within ``max_chars``.
+    """
+    def __init__(self, max_chars=8000000) -> None:
+        self.max_chars = max_chars
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._fragments = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        """
+        Get the fragment of a key, rendering and caching it on a miss.
+
+        Args:
+            key (tuple): Hashable key of everything the fragment depends on.
+            render (callable): Renders the fragment.
+
+        Returns:
+            Markup: The rendered fragment.
+        """
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                self.hits += 1
+                return fragment
+            self.misses += 1
+        # Rendering may nest other cached fragments, so it happens outside the lock
+        fragment = render()
+        with self._lock:
+            old = self._fragments.pop(key, None)
+            if old is not None:
+                self._chars -= len(old)
+            self._fragments[key] = fragment
+            self._chars += len(fragment)
+            while self._chars > self.max_chars and self._fragments:
+                evicted_key, evicted = self._fragments.popitem(last=False)
+                self._chars -= len(evicted)
+                self.evictions += 1
+        return fragment
+
+    def clear(self) -> None:
+        """
+        Drop every fragment, keeping the counters.
+        """
+        with self._lock:
+            self._fragments.clear()
+            self._chars = 0
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: The hits, misses, evictions, cached fragments and their total length.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'fragments': len(self._fragments), 'chars': self._chars}
+
+    def __len__(self) -> int:
+        return len(self._fragments)
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Jinja extension adding the ``{% cache %}`` tag on top of
+    ``environment.fragment_cache``. The template name and line are part of every
+    key, so equal keys in different places never share a fragment.
+    """
+    tags = {'cache'}
+
+    def __init__(self, environment) -> None:
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = parser.parse_tuple()
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        place = nodes.Const((parser.name, lineno))
+        return nodes.CallBlock(self.call_method('_cached', [place, key]), [], [], body).set_lineno(lineno)
+
+    def _cached(self, place, key, caller):
+        return self.environment.fragment_cache.get_or_render((place, key), caller)
+
+
+# Shared by every request handled by this worker process
+fragment_cache = FragmentCache(max_chars=Config.FRAGMENT_CACHE_MAX_CHARS)
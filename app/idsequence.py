@@ -0,0 +1,87 @@
+"""
+Persistent card id allocator shared by all worker processes
+"""
+import os
+import threading
+
+from app.filelock import FileLock
+
+
+class IdSequence:
+    """
+    Monotonic id sequence kept as a counter in a lock file.
+
+    Allocating ids takes the file lock, reads and rewrites one small counter, so a new
+    card no longer needs the maximum id of the whole deck. With ``block_size`` > 1 each
+    process reserves ids in blocks and hands them out from memory; ids then stay
+    unique but are no longer in creation order across workers.
+
+    Attributes:
+        path (str): Path of the counter file, which holds the last allocated id.
+        block_size (int): Ids reserved per process at once.
+    """
+    def __init__(self, path, seed=None, block_size=1) -> None:
+        """
+        Initialize an IdSequence.
+
+        Args:
+            path (str): Path of the counter file.
+            seed (callable, optional): Returns the highest id already in use; called once,
+                under the lock, while the counter file does not exist yet. Defaults to None.
+            block_size (int, optional): Ids reserved per process at once. Defaults to 1.
+        """
+        self.path = path
+        self.block_size = max(1, block_size)
+        self.file_lock = FileLock(path)
+        self._seed = seed
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._pid = os.getpid()
+
+    def _last_id(self) -> int:
+        last_id = self.file_lock.version()
+        if last_id == 0 and self._seed is not None:
+            last_id = self._seed() or 0
+        return last_id
+
+    def _reserve(self, count) -> int:
+        with self.file_lock.acquire():
+            first = self._last_id() + 1
+            self.file_lock.set_version(first + count - 1)
+        return first
+
+    def allocate(self, count=1) -> range:
+        """
+        Allocate consecutive, never reused card ids.
+
+        Args:
+            count (int, optional): Number of ids. Defaults to 1.
+
+        Returns:
+            range: The allocated ids.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # A block inherited through fork would be handed out twice
+                self._pid, self._next, self._end = os.getpid(), 0, 0
+            if count > self._end - self._next:
+                if count >= self.block_size:
+                    first = self._reserve(count)
+                    return range(first, first + count)
+                self._next = self._reserve(self.block_size)
+                self._end = self._next + self.block_size
+            first = self._next
+            self._next += count
+            return range(first, first + count)
+
+    def ensure_above(self, card_id) -> None:
+        """
+        Make sure ids up to ``card_id`` are never allocated, e.g. after an import.
+
+        Args:
+            card_id (int): The highest id in use.
+        """
+        with self.file_lock.acquire():
+            if self._last_id() < card_id:
+                self.file_lock.set_version(card_id)
@@ -1,8 +1,14 @@
 import json
+from collections import Counter
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from app import login
+from app.due_lists import due_lists
+from app.engines import review_engine
+from app.scheduler import DeckArrays
+from app.storage import create_storage
+from config import Config
 
 
 class User(UserMixin):
@@ -50,19 +56,33 @@ class User(UserMixin):
         """
         return check_password_hash(self.password_hash, password)
 
+    def save(self) -> None:
+        """
+        Insert or replace this user in the storage backend, leaving other users untouched.
+        """
+        storage.save_user(self.username, {'email': self.email, 'password_hash': self.password_hash})
+
+    def create(self) -> None:
+        """
+        Register this user in the storage backend.
+
+        Raises:
+            UsernameTakenError: If another user registered the username first.
+        """
+        storage.add_user(self.username, {'email': self.email, 'password_hash': self.password_hash})
+
     @staticmethod
     def load_users() -> tuple:
         """
-        Load users from the user_data.json file.
+        Load users from the configured storage backend.
 
         Returns:
             tuple: A dictionary of User objects and an error message (None if no error).
         """
         try:
-            with open('user_data.json', 'r') as file:
-                user_data = json.load(file)
-                users = {k: User(username=k, email=v['email'], password_hash=v['password_hash']) for k, v in user_data.items()}
-                return users, "Success - load users"
+            user_data = storage.load_users()
+            users = {k: User(username=k, email=v['email'], password_hash=v['password_hash']) for k, v in user_data.items()}
+            return users, "Success - load users"
         except FileNotFoundError:
             return {}, "Login details not found - please register to use the service"  # Add error message for no user found --> Currently the form doesn't do anything.
         except json.JSONDecodeError:
@@ -71,14 +91,13 @@ class User(UserMixin):
     @staticmethod
     def save_users(users) -> None:
         """
-        Save users to the user_data.json file.
+        Save users to the configured storage backend.
 
         Args:
             users (dict): A dictionary of User objects to be saved.
         """
-        with open('user_data.json', 'w') as file:
-            user_data = {k: {'email': v.email, 'password_hash': v.password_hash} for k, v in users.items()}
-            json.dump(user_data, file)
+        user_data = {k: {'email': v.email, 'password_hash': v.password_hash} for k, v in users.items()}
+        storage.save_users(user_data)
 
     @staticmethod
     def get_by_username(username):
@@ -91,8 +110,26 @@ class User(UserMixin):
         Returns:
             User: The User object if found, otherwise None.
         """
-        users, message = User.load_users()
-        return users.get(username)
+        record = storage.get_user(username)
+        if record is None:
+            return None
+        return User(username=username, email=record['email'], password_hash=record['password_hash'])
+
+    @staticmethod
+    def get_by_email(email):
+        """
+        Get a User object by email address.
+
+        Args:
+            email (str): The email address of the user to retrieve.
+
+        Returns:
+            User: The User object if found, otherwise None.
+        """
+        username = storage.get_username_by_email(email)
+        if username is None:
+            return None
+        return User.get_by_username(username)
 
 
 @login.user_loader
@@ -108,10 +145,27 @@ def load_user(username):
     return User.get_by_username(username)
 
 
+# Field order of a stored card record. Bump CARD_SCHEMA_VERSION whenever the record
+# layout changes and teach Card.from_record to upgrade the older records.
+CARD_SCHEMA_VERSION = 1
+CARD_FIELDS = ('id', 'topic', 'question', 'hint', 'answer', 'author_id', 'timestamp', 'flags', 'next_review_date')
+# Review counters with a dedicated slot; any other flag goes to a per-card overflow dict
+COUNTER_FLAGS = ('right', 'wrong', 'hint_used', 'show_answer')
+# Flags a study page may submit; right and wrong answers reschedule the card
+REVIEW_FLAGS = ('right', 'wrong', 'hint_used')
+
+
 class Card:
     """
     Card class for managing card information and operations.
+
+    Cards use ``__slots__`` and keep the review counters in fixed integer slots, so a
+    card has no instance ``__dict__`` and, unless it carries unusual flags, no flags
+    dict either. ``flags`` is still available as a dict built on access.
     """
+    __slots__ = ('id', 'topic', 'question', 'hint', 'answer', 'author_id', 'timestamp', 'next_review_date',
+                 'right', 'wrong', 'hint_used', 'show_answer', '_other_flags')
+
     def __init__(self,
                  id,
                  topic,
@@ -135,8 +189,6 @@ class Card:
             timestamp (str, optional): The timestamp when the card was created. Defaults to current time if not provided.
             flags (dict, optional): Any flags associated with the card. Defaults to an empty dictionary.
         """
-        if flags is None:
-            flags = {}
         self.id = id
         self.topic = topic
         self.question = question
@@ -147,39 +199,133 @@ class Card:
         self.flags = flags
         self.next_review_date = next_review_date
 
+    @property
+    def flags(self) -> dict:
+        """
+        The review flags that were ever set, as a new dict. Changing the dict does
+        not change the card; use ``add_flag`` or assign ``flags`` instead.
+        """
+        flags = {name: getattr(self, name) for name in COUNTER_FLAGS if getattr(self, name)}
+        if self._other_flags:
+            flags.update(self._other_flags)
+        return flags
+
+    @flags.setter
+    def flags(self, flags) -> None:
+        flags = dict(flags or {})
+        for name in COUNTER_FLAGS:
+            setattr(self, name, flags.pop(name, 0))
+        self._other_flags = flags or None
+
+    def flag(self, flag) -> int:
+        """
+        Args:
+            flag (str): The name of the flag.
+
+        Returns:
+            int: The flag's count, without building the ``flags`` dict.
+        """
+        if flag in COUNTER_FLAGS:
+            return getattr(self, flag)
+        return self._other_flags.get(flag, 0) if self._other_flags else 0
+
+    def add_flag(self, flag, delta=1) -> None:
+        """
+        Increment one review flag.
+
+        Args:
+            flag (str): The name of the flag, e.g. right, wrong or hint_used.
+            delta (int, optional): The increment. Defaults to 1.
+        """
+        if flag in COUNTER_FLAGS:
+            setattr(self, flag, getattr(self, flag) + delta)
+        else:
+            if self._other_flags is None:
+                self._other_flags = {}
+            self._other_flags[flag] = self._other_flags.get(flag, 0) + delta
+
+    def to_record(self) -> dict:
+        """
+        Serialize the card for storage.
+
+        Returns:
+            dict: The card record with the fields of CARD_FIELDS and its ``schema`` version.
+        """
+        record = {name: getattr(self, name) for name in CARD_FIELDS}
+        record['schema'] = CARD_SCHEMA_VERSION
+        return record
+
+    @staticmethod
+    def from_record(record):
+        """
+        Build a card from a stored record.
+
+        Args:
+            record (dict): A card record; a ``schema`` key, if present, names its schema version.
+
+        Returns:
+            Card: The Card object.
+
+        Raises:
+            ValueError: If the record was written by a newer schema version.
+        """
+        schema = record.get('schema', CARD_SCHEMA_VERSION)
+        if schema > CARD_SCHEMA_VERSION:
+            raise ValueError(f'Card {record.get("id")} has schema version {schema}, expected at most {CARD_SCHEMA_VERSION}')
+        return Card(**{name: record[name] for name in CARD_FIELDS if name in record})
+
     @staticmethod
     def load_cards():
         """
-        Load cards from the card_data.json file.
+        Load every card from the configured storage backend.
 
         Returns:
             list: A list of Card objects.
         """
         try:
-            with open('card_data.json', 'r') as file:
-                card_data = json.load(file)
-                cards = [Card(**card) for card in card_data]
-                return cards
-        except FileNotFoundError:
-            return []
+            return storage.load_cards()
         except json.JSONDecodeError:
             return []
 
     @staticmethod
-    def save_cards(cards):
+    def save_cards(cards, expected_version=None):
         """
-        Save cards to the card_data.json file.
+        Replace every card in the configured storage backend.
 
         Args:
             cards (list): A list of Card objects to be saved.
+            expected_version (int, optional): Only save if the deck is still at this version,
+                as returned by Card.deck_version() before loading the cards.
+
+        Raises:
+            ConflictError: If another worker wrote to the deck since ``expected_version``.
+        """
+        card_data = [card.to_record() for card in cards]
+        storage.save_cards(card_data, expected_version=expected_version)
+
+    @staticmethod
+    def deck_version():
+        """
+        Get the deck version, which increases with every card write from any worker.
+
+        Returns:
+            int: The current deck version.
         """
-        with open('card_data.json', 'w') as file:
-            # Prepares the card data to be stored in JSON format -- card.__dict__
-            # Converts data associated with attributes of a card object into a dict format to
-            # store in JSON
-            card_data = [card.__dict__ for card in cards]
-            # Writes the card into JSON
-            json.dump(card_data, file)
+        return storage.version()
+
+    @staticmethod
+    def user_deck_version(user_id):
+        """
+        Get a token that changes whenever one of an author's cards is added, edited,
+        deleted or answered.
+
+        Args:
+            user_id (str): The ID of the author.
+
+        Returns:
+            str: Opaque version token, compare for equality only.
+        """
+        return storage.author_version(user_id)
 
     @staticmethod
     def get_by_user_id(user_id):
@@ -192,49 +338,283 @@ class Card:
         Returns:
             list: A list of Card objects created by the specified author.
         """
-        cards = Card.load_cards()
-        return [card for card in cards if card.author_id == user_id]
+        return storage.cards_by_author(user_id)
 
     @staticmethod
-    def get_by_id(card_id):
+    def get_by_user_topic(user_id, topic):
+        """
+        Get a list of Card objects of an author for one topic.
+
+        Args:
+            user_id (str): The ID of the author to filter cards by.
+            topic (str): The exact topic to filter cards by.
+
+        Returns:
+            list: A list of Card objects created by the specified author for the topic.
+        """
+        return storage.cards_by_author_topic(user_id, topic)
+
+    @staticmethod
+    def page_by_user(user_id, order='id', topic=None, after=None, before=None, limit=None):
+        """
+        Get one keyset page of an author's cards.
+
+        Args:
+            user_id (str): The ID of the author.
+            order (str, optional): ``'id'`` or ``'topic'`` (topic, then id). Defaults to 'id'.
+            topic (str, optional): Only cards of this topic, ``'topic'`` order only. Defaults to None.
+            after (tuple, optional): Sort key of the card the page starts after. Defaults to None.
+            before (tuple, optional): Sort key of the card the page ends before. Defaults to None.
+            limit (int, optional): Maximum number of cards to return. Defaults to None (all).
+
+        Returns:
+            list: The page's Card objects in sort order.
+        """
+        return storage.cards_page(user_id, order=order, topic=topic, after=after, before=before, limit=limit)
+
+    @staticmethod
+    def iter_by_user(user_id, page_size=1000):
+        """
+        Iterate over an author's cards in id order, one keyset page at a time, so a
+        backend that keeps cards on disk never holds the whole deck in memory.
+
+        Args:
+            user_id (str): The ID of the author.
+            page_size (int, optional): Cards fetched per page. Defaults to 1000.
+
+        Yields:
+            Card: The author's cards by id.
+        """
+        after = None
+        while True:
+            cards = storage.cards_page(user_id, after=after, limit=page_size)
+            yield from cards
+            if len(cards) < page_size:
+                return
+            after = (cards[-1].id,)
+
+    @staticmethod
+    def search(user_id, query, limit=None):
+        """
+        Full-text search of an author's questions, answers and hints.
+
+        Args:
+            user_id (str): The ID of the author.
+            query (str): Words to search for, each one also matching as a prefix.
+            limit (int, optional): Maximum number of cards to return. Defaults to None (all).
+
+        Returns:
+            list: The matching Card objects, best first.
+        """
+        return storage.search_cards(user_id, query, limit=limit)
+
+    @staticmethod
+    def pick_for_review(user_id, offset=0, limit=None, topic=None):
+        """
+        Get the cards due for review of an author, as picked by the Scheduler.
+
+        Args:
+            user_id (str): The ID of the author.
+            offset (int, optional): Number of picked cards to skip. Defaults to 0.
+            limit (int, optional): Maximum number of cards to return. Defaults to None (all).
+            topic (str, optional): Only pick among the cards of this topic, in any case. Defaults to None.
+
+        Returns:
+            tuple: The requested Card objects and the total number of picked cards.
+        """
+        return storage.pick_for_review(user_id, offset=offset, limit=limit, topic=topic)
+
+    @staticmethod
+    def topic_counts(user_id):
+        """
+        Get the number of cards and of cards due today per topic of an author, with
+        topics differing only in case or spacing counted as one.
+
+        Args:
+            user_id (str): The ID of the author.
+
+        Returns:
+            dict: ``{'cards': .., 'due': ..}`` keyed by topic, sorted case-insensitively.
+        """
+        return storage.topic_counts(user_id)
+
+    @staticmethod
+    def review_queue(user_id):
+        """
+        Get the ids of an author's cards due for review today, in review order.
+
+        The day's precomputed due list is served while it matches the author's
+        cards; otherwise the cards are picked now.
+
+        Args:
+            user_id (str): The ID of the author.
+
+        Returns:
+            list: The ids of the picked cards.
+        """
+        today = datetime.now(timezone.utc).date()
+        card_ids = due_lists.get(user_id, today, storage.author_version(user_id))
+        if card_ids is None:
+            card_ids = [card.id for card in storage.pick_for_review(user_id)[0]]
+        return card_ids
+
+    @staticmethod
+    def topic_stats(user_id):
+        """
+        Get an author's right/wrong/hint totals per topic without touching each card.
+
+        Args:
+            user_id (str): The ID of the author.
+
+        Returns:
+            dict: ``{'right': .., 'wrong': .., 'hints': .., 'cards': ..}`` keyed by topic.
+        """
+        return storage.topic_stats(user_id)
+
+    @staticmethod
+    def get_by_id(card_id, author_id=None):
         """
         Get a Card object by its unique ID.
 
         Args:
             card_id (str): The unique identifier of the card.
+            author_id (str, optional): Only return the card if it belongs to this author.
 
         Returns:
             Card: The Card object if found, otherwise None.
         """
-        cards = Card.load_cards()
-        for card in cards:
-            if card.id == card_id:
-                return card
-        return None
+        return storage.card(card_id, author_id=author_id)
+
+    @staticmethod
+    def allocate_ids(count=1):
+        """
+        Reserve ids for new cards from the persistent id sequence.
+
+        Args:
+            count (int, optional): Number of ids, e.g. for a bulk insert. Defaults to 1.
+
+        Returns:
+            range: The reserved ids.
+        """
+        return storage.allocate_card_ids(count)
 
     @staticmethod
     def add_card(card):
         """
-        Add a new card to the card_data.json file.
+        Add a new card to the configured storage backend.
 
         Args:
             card (Card): The Card object to be added.
         """
-        cards = Card.load_cards()
-        cards.append(card)
-        Card.save_cards(cards)
+        storage.add_card(card.to_record())
+
+    @staticmethod
+    def add_cards(cards):
+        """
+        Add many new cards to the configured storage backend in one write.
+
+        Args:
+            cards (list): The Card objects to be added, with allocated ids.
+        """
+        storage.add_cards([card.to_record() for card in cards])
+
+    @staticmethod
+    def bulk_insert(user_id):
+        """
+        Group the add_cards calls of one bulk insert, see StorageBackend.bulk_insert.
+
+        Args:
+            user_id (str): The ID of the author the cards are added for.
+
+        Returns:
+            contextmanager: Wraps the inserts.
+        """
+        return storage.bulk_insert(user_id)
+
+    @staticmethod
+    def update_card(card_id, fields, author_id=None):
+        """
+        Update attributes of a card.
+
+        Args:
+            card_id (int): The unique identifier of the card to be edited.
+            fields (dict): The attributes to change, e.g. question or topic.
+            author_id (str, optional): The owner of the card, saves a lookup on sharded storage.
+        """
+        storage.update_card(card_id, fields, author_id=author_id)
+
+    @staticmethod
+    def record_answer(card_id, flag, author_id=None):
+        """
+        Increment one of the review flags (right, wrong, hint_used) of a card.
+
+        Args:
+            card_id (int): The unique identifier of the card that was answered.
+            flag (str): The name of the flag to increment.
+            author_id (str, optional): The owner of the card, saves a lookup on sharded storage.
+        """
+        storage.record_answer(card_id, flag, author_id=author_id)
+
+    @staticmethod
+    def schedule_review(card_id, author_id=None):
+        """
+        Store the card's next review date as planned by the configured scheduling engine.
+
+        Args:
+            card_id (int): The unique identifier of the card that was answered.
+            author_id (str, optional): The owner of the card, saves a lookup on sharded storage.
+        """
+        card = storage.card(card_id, author_id=author_id)
+        if card is not None:
+            review_date = review_engine.next_review_dates([card])[0]
+            storage.update_card(card_id, {'next_review_date': review_date}, author_id=author_id)
 
     @staticmethod
-    def delete_card(card_id):
+    def record_reviews(author_id, reviews):
         """
-        Delete a card from the card_data.json file by its unique ID.
+        Apply a batch of answers from the study page in one storage write.
+
+        Cards answered right or wrong get their next review date from the configured
+        scheduling engine, counted from their last answer in the batch.
+
+        Args:
+            author_id (str): The player, who owns the cards.
+            reviews (list): ``(card_id, flag, answered_at)`` tuples in answer order, ``answered_at`` an aware datetime.
+
+        Returns:
+            int: Number of answers applied; answers to unknown cards or cards of other authors are dropped.
+        """
+        cards = {}
+        flag_counts = Counter()
+        answered_at = {}
+        for card_id, flag, at in reviews:
+            if card_id not in cards:
+                cards[card_id] = storage.card(card_id, author_id=author_id)
+            if cards[card_id] is None:
+                continue
+            flag_counts[(card_id, flag)] += 1
+            if flag in ('right', 'wrong'):
+                answered_at[card_id] = max(at, answered_at.get(card_id, at))
+        scheduled = [cards[card_id] for card_id in answered_at]
+        counters = [[card.flag(name) + flag_counts[(card.id, name)] for card in scheduled]
+                    for name in ('right', 'wrong', 'hints', 'hint_used')]
+        days = review_engine.review_days(DeckArrays.from_counters(*counters)).tolist()
+        review_dates = {card.id: (answered_at[card.id] + timedelta(days=day)).isoformat()
+                        for card, day in zip(scheduled, days)}
+        storage.record_reviews(author_id, dict(flag_counts), review_dates)
+        return sum(flag_counts.values())
+
+    @staticmethod
+    def delete_card(card_id, author_id=None):
+        """
+        Delete a card by its unique ID.
 
         Args:
             card_id (str): The unique identifier of the card to be deleted.
+            author_id (str, optional): The owner of the card, saves a lookup on sharded storage.
         """
-        # Loads the existing cards
-        cards = Card.load_cards()
-        # Creates a new list of card except the card's matching the card_id that needs to be deleted
-        cards = [card for card in cards if card.id != card_id]
-        # Saves the updated list back - this excludes the selected id - in effect deleting the card
-        Card.save_cards(cards)
+        storage.delete_card(card_id, author_id=author_id)
+
+
+# Shared by every request handled by this worker process
+storage = create_storage(Config, card_factory=Card.from_record)
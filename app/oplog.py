@@ -0,0 +1,414 @@
+"""
+JSON card snapshot with an append-only operation log
+
+Every card mutation is appended to the log as one JSON line instead of rewriting
+the whole snapshot. Readers load the snapshot and replay the log tail; once the log
+grows past a threshold it is compacted into a fresh snapshot in the background.
+
+Several worker processes may share the files: writers hold an exclusive ``flock``
+on ``<snapshot>.lock``, readers a shared one, snapshots are replaced atomically and
+each write bumps the deck version kept in the lock file. Flag increments are logged
+as deltas, so concurrent answers from different workers merge without conflicts.
+
+Log records:
+    {"op": "add", "card": {...}}
+    {"op": "flag", "id": 1, "flag": "right", "delta": 1}
+    {"op": "edit", "id": 1, "fields": {"topic": "...", "question": "..."}}
+    {"op": "delete", "id": 1}
+    {"op": "schedule", "author_id": "jan", "dates": [[1, "2024-06-10T08:00:00+00:00"], ...]}
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from app.filelock import ConflictError, FileLock, atomic_write_json
+
+
+def apply_op(records, op) -> None:
+    """
+    Apply one log record to card records held as plain dicts.
+
+    Args:
+        records (OrderedDict): Card records keyed by card id, modified in place.
+        op (dict): The log record to apply.
+    """
+    kind = op['op']
+    if kind == 'add':
+        records[op['card']['id']] = dict(op['card'])
+        return
+    if kind == 'schedule':
+        for card_id, review_date in op['dates']:
+            record = records.get(card_id)
+            if record is not None and record['author_id'] == op['author_id']:
+                record['next_review_date'] = review_date
+        return
+    record = records.get(op['id'])
+    if record is None:
+        return
+    if kind == 'flag':
+        flags = record.setdefault('flags', {})
+        flags[op['flag']] = flags.get(op['flag'], 0) + op.get('delta', 1)
+    elif kind == 'edit':
+        record.update(op['fields'])
+    elif kind == 'delete':
+        del records[op['id']]
+
+
+def review_ops(author_id, flag_counts, review_dates, owned) -> list:
+    """
+    Log records of a batch of answers to an author's cards.
+
+    Args:
+        author_id (str): The owner of the cards.
+        flag_counts (dict): Flag increments keyed by ``(card id, flag)``.
+        review_dates (dict): New ISO 8601 review dates keyed by card id.
+        owned (callable): Tells whether a card id belongs to the author.
+
+    Returns:
+        list: One flag record per card and flag, then one schedule record.
+    """
+    ops = [{'op': 'flag', 'id': card_id, 'flag': flag, 'delta': count}
+           for (card_id, flag), count in flag_counts.items() if owned(card_id)]
+    if review_dates:
+        # Schedule records only ever touch the cards of their author
+        ops.append({'op': 'schedule', 'author_id': author_id, 'dates': list(review_dates.items())})
+    return ops
+
+
+def replay(snapshot, ops) -> list:
+    """
+    Replay log records on top of snapshot records.
+
+    Args:
+        snapshot (list): Card records as stored in the snapshot.
+        ops (list): Log records in append order.
+
+    Returns:
+        list: The resulting card records.
+    """
+    records = OrderedDict((record['id'], record) for record in snapshot)
+    for op in ops:
+        apply_op(records, op)
+    return list(records.values())
+
+
+class OpLogStore:
+    """
+    Card snapshot file plus an append-only, fsync-batched operation log.
+
+    Attributes:
+        snapshot_path (str): Path of the JSON snapshot.
+        log_path (str): Path of the JSON lines operation log.
+        file_lock (FileLock): Cross-process lock that also holds the deck version.
+        fsync_batch (int): Number of appended records after which the log is fsynced.
+        fsync_interval (float): Seconds after which pending records are fsynced anyway, by a
+            timer thread if no further append comes along.
+        compact_threshold (int): Log length that triggers a background compaction (0 = never).
+    """
+    def __init__(self, snapshot_path, log_path=None, fsync_batch=32, fsync_interval=1.0, compact_threshold=10000) -> None:
+        """
+        Initialize an OpLogStore.
+
+        Args:
+            snapshot_path (str): Path of the JSON snapshot.
+            log_path (str, optional): Path of the operation log. Defaults to ``<snapshot_path>.log``.
+            fsync_batch (int, optional): Records per fsync. Defaults to 32.
+            fsync_interval (float, optional): Maximum seconds between fsyncs. Defaults to 1.0.
+            compact_threshold (int, optional): Log length that triggers compaction. Defaults to 10000.
+        """
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path or snapshot_path + '.log'
+        self.file_lock = FileLock(snapshot_path + '.lock')
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.compact_threshold = compact_threshold
+        self._log_file = None
+        self._pending = 0
+        self._last_fsync = time.monotonic()
+        self._sync_timer = None
+        self._log_records = None
+        self._compact_guard = threading.Lock()
+        self._compacting = False
+        self._deferrals = 0
+
+    # Reading
+    # -------
+    def version(self) -> int:
+        """
+        Returns:
+            int: The deck version, incremented by every write from any process.
+        """
+        return self.file_lock.version()
+
+    def snapshot_version(self):
+        """
+        Identify the current snapshot file, changes whenever the snapshot is replaced.
+
+        Returns:
+            tuple: (mtime_ns, size, inode) of the snapshot, None if it does not exist.
+        """
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def log_size(self) -> int:
+        """
+        Returns:
+            int: Current size of the operation log in bytes.
+        """
+        try:
+            return os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            return 0
+
+    def read_snapshot(self) -> list:
+        """
+        Read the snapshot records.
+
+        Returns:
+            list: Card records, empty if the snapshot does not exist.
+
+        Raises:
+            json.JSONDecodeError: If the snapshot is corrupt.
+        """
+        try:
+            with open(self.snapshot_path, 'r') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return []
+
+    def read_log(self, offset=0) -> tuple:
+        """
+        Read complete log records starting at a byte offset.
+
+        A trailing partial line (a write in progress or torn by a crash) is left
+        for the next read.
+
+        Args:
+            offset (int, optional): Byte offset to start reading from. Defaults to 0.
+
+        Returns:
+            tuple: The list of log records and the offset just past the last complete record.
+        """
+        try:
+            with open(self.log_path, 'rb') as file:
+                file.seek(offset)
+                data = file.read()
+        except FileNotFoundError:
+            return [], offset
+        end = data.rfind(b'\n') + 1
+        ops = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        return ops, offset + end
+
+    def read_consistent(self) -> tuple:
+        """
+        Read the snapshot and the whole log under a shared lock, so no compaction
+        can happen in between.
+
+        Returns:
+            tuple: Snapshot records, log records and the log offset after the last record.
+        """
+        with self.file_lock.acquire(exclusive=False):
+            snapshot = self.read_snapshot()
+            ops, offset = self.read_log()
+        return snapshot, ops, offset
+
+    def load(self) -> list:
+        """
+        Load the snapshot and replay the log on top of it.
+
+        Returns:
+            list: The current card records.
+        """
+        snapshot, ops, offset = self.read_consistent()
+        self._log_records = len(ops)
+        return replay(snapshot, ops)
+
+    # Writing
+    # -------
+    def append(self, op) -> int:
+        """
+        Append a record to the operation log.
+
+        The record is flushed to the OS immediately so other processes see it, but
+        fsync is batched: it runs once ``fsync_batch`` records are pending, and at
+        most ``fsync_interval`` seconds after the first of them.
+
+        Args:
+            op (dict): The log record to append.
+
+        Returns:
+            int: The deck version after the write.
+        """
+        return self.append_many([op])
+
+    def append_many(self, ops) -> int:
+        """
+        Append several records to the operation log as one write with one version.
+
+        Args:
+            ops (list): The log records to append.
+
+        Returns:
+            int: The deck version after the write.
+        """
+        with self.file_lock.acquire():
+            version = self.file_lock.bump_version()
+            lines = ''.join(json.dumps(dict(op, v=version), separators=(',', ':')) + '\n' for op in ops)
+            if self._log_file is None:
+                self._log_file = open(self.log_path, 'a')
+            self._log_file.write(lines)
+            self._log_file.flush()
+            self._pending += 1
+            if self._pending >= self.fsync_batch or time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self.sync()
+            elif self._sync_timer is None:
+                # Sync the batch even if this worker goes quiet before it fills up
+                self._sync_timer = threading.Timer(self.fsync_interval, self._timed_sync)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+            if self._log_records is None:
+                self._log_records = len(self.read_log()[0])
+            else:
+                self._log_records += len(ops)
+        if self.compact_threshold and self._log_records >= self.compact_threshold:
+            self.compact_in_background()
+        return version
+
+    def sync(self) -> None:
+        """
+        Fsync every record appended so far.
+        """
+        with self.file_lock.acquire():
+            if self._log_file is not None and self._pending:
+                os.fsync(self._log_file.fileno())
+            self._pending = 0
+            self._last_fsync = time.monotonic()
+
+    def _timed_sync(self) -> None:
+        with self.file_lock.acquire():
+            self._sync_timer = None
+            self.sync()
+
+    def close(self) -> None:
+        """
+        Fsync and close this process's handle on the operation log.
+        """
+        with self.file_lock.acquire():
+            self._close_log()
+
+    def _close_log(self) -> None:
+        if self._log_file is not None:
+            self.sync()
+            self._log_file.close()
+            self._log_file = None
+
+    def write_snapshot_file(self, records) -> None:
+        """
+        Atomically write records in this store's snapshot format, without touching the log.
+
+        Args:
+            records (list): Card records to store.
+        """
+        atomic_write_json(self.snapshot_path, records)
+
+    def _replace_snapshot(self, records) -> None:
+        self.write_snapshot_file(records)
+        self._close_log()
+        # Truncate in place: other workers keep appending through their open handles
+        open(self.log_path, 'w').close()
+        self._log_records = 0
+
+    def write_snapshot(self, records, expected_version=None) -> int:
+        """
+        Atomically replace the snapshot with the given records and empty the log.
+
+        Args:
+            records (list): Card records to store.
+            expected_version (int, optional): Fail unless the deck is still at this version.
+
+        Returns:
+            int: The deck version after the write.
+
+        Raises:
+            ConflictError: If ``expected_version`` is given and another write happened since.
+        """
+        with self.file_lock.acquire():
+            if expected_version is not None and self.version() != expected_version:
+                raise ConflictError(f'Deck changed since version {expected_version}')
+            self._replace_snapshot(records)
+            return self.file_lock.bump_version()
+
+    def update(self, mutate, retries=5) -> int:
+        """
+        Optimistic read-modify-write of the whole deck.
+
+        The records are read and mutated without holding the lock; the write only
+        succeeds if nobody else wrote in the meantime, otherwise ``mutate`` is
+        re-applied to the fresh records. ``mutate`` must therefore express its change
+        relative to the records it is given (e.g. increment a flag, not set it).
+
+        Args:
+            mutate (callable): Modifies the list of card records in place.
+            retries (int, optional): Attempts before giving up. Defaults to 5.
+
+        Returns:
+            int: The deck version after the write.
+
+        Raises:
+            ConflictError: If every attempt lost the race.
+        """
+        for attempt in range(retries):
+            version = self.version()
+            records = self.load()
+            mutate(records)
+            try:
+                return self.write_snapshot(records, expected_version=version)
+            except ConflictError:
+                continue
+        raise ConflictError(f'Gave up after {retries} conflicting writes')
+
+    def compact(self) -> None:
+        """
+        Fold the operation log into a fresh snapshot. The deck version is unchanged.
+        """
+        try:
+            with self.file_lock.acquire():
+                snapshot = self.read_snapshot()
+                ops, offset = self.read_log()
+                self._replace_snapshot(replay(snapshot, ops))
+        finally:
+            self._compacting = False
+
+    def compact_in_background(self) -> None:
+        """
+        Start a compaction on a daemon thread unless one is already running.
+        """
+        with self._compact_guard:
+            if self._compacting or self._deferrals:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, name='card-log-compaction', daemon=True).start()
+
+    @contextmanager
+    def compaction_deferred(self):
+        """
+        Hold back background compactions of this process during a burst of writes,
+        e.g. an import, which would otherwise rewrite the growing snapshot again and
+        again while the writes wait for the lock. One starts afterwards if the log
+        is past the threshold.
+        """
+        with self._compact_guard:
+            self._deferrals += 1
+        try:
+            yield
+        finally:
+            with self._compact_guard:
+                self._deferrals -= 1
+            if self.compact_threshold and (self._log_records or 0) >= self.compact_threshold:
+                self.compact_in_background()
@@ -0,0 +1,483 @@
+"""
+Process-level card repository that keeps indexed card partitions in memory
+"""
+import json
+import threading
+from collections import OrderedDict
+
+from app.aggregates import TopicStats
+from app.card_order import CARD_ORDERS
+from app.due_index import DueIndex
+from app.search_index import SearchIndex
+from app.topic_index import TopicIndex
+from app.oplog import replay
+
+# New log records past which the derived indexes of the cached partitions are
+# dropped and rebuilt on demand instead of being updated record by record, e.g.
+# after an import, where every insert into a sorted index would shift the list
+LOG_TAIL_REINDEX = 1000
+
+
+def _op_author(op, author_of):
+    """
+    Owner of the card a log record touches, None if unknown.
+    """
+    if op['op'] == 'add':
+        return op['card']['author_id']
+    if op['op'] == 'schedule':
+        return op['author_id']
+    return author_of.get(op['id'])
+
+
+class _AuthorPartition:
+    """
+    All cards of one author together with the (author_id, topic) secondary index.
+
+    The DueIndex, TopicStats, TopicIndex, CardOrder and SearchIndex indexes of the author are built the first
+    time they are needed and then kept up to date by every add, remove and change.
+    """
+    def __init__(self, cards) -> None:
+        self.cards = cards
+        self.by_id = {card.id: card for card in cards}
+        self.by_topic = {}
+        for card in cards:
+            self.by_topic.setdefault(card.topic, []).append(card)
+        self._derived = {}  # index class -> index built from self.cards
+
+    def _index(self, index_class):
+        index = self._derived.get(index_class)
+        if index is None:
+            index = self._derived[index_class] = index_class(self.cards)
+        return index
+
+    @property
+    def due(self) -> DueIndex:
+        return self._index(DueIndex)
+
+    @property
+    def stats(self) -> TopicStats:
+        return self._index(TopicStats)
+
+    @property
+    def topics(self) -> TopicIndex:
+        return self._index(TopicIndex)
+
+    def order(self, name):
+        return self._index(CARD_ORDERS[name])
+
+    @property
+    def search(self) -> SearchIndex:
+        return self._index(SearchIndex)
+
+    def add(self, card) -> None:
+        self.cards.append(card)
+        self.by_id[card.id] = card
+        self.by_topic.setdefault(card.topic, []).append(card)
+        for index in self._derived.values():
+            index.add(card)
+
+    def remove(self, card) -> None:
+        self.cards.remove(card)
+        del self.by_id[card.id]
+        self._unlink_topic(card)
+        for index in self._derived.values():
+            index.remove(card)
+
+    def drop_derived(self) -> None:
+        self._derived.clear()
+
+    def changed(self, card) -> None:
+        for index in self._derived.values():
+            index.update(card)
+
+    def retopic(self, card, topic) -> None:
+        self._unlink_topic(card)
+        card.topic = topic
+        # Keep file order inside the topic index
+        self.by_topic[topic] = [c for c in self.cards if c.topic == topic]
+
+    def _unlink_topic(self, card) -> None:
+        topic_cards = self.by_topic.get(card.topic, [])
+        if card in topic_cards:
+            topic_cards.remove(card)
+        if not topic_cards:
+            self.by_topic.pop(card.topic, None)
+
+
+class CardRepository:
+    """
+    Indexed, in-memory view of a card store.
+
+    The store's snapshot is parsed once and kept as per-author partitions. A partition
+    holds a primary index by card id and a secondary index by topic. Every read checks
+    the snapshot version and consumes only the new tail of the operation log, so
+    lookups cost O(result) instead of O(corpus), and writes by other processes are
+    picked up incrementally.
+
+    Attributes:
+        store (OpLogStore): The snapshot and operation log to read from.
+        max_cards (int): Memory budget in cards, ``None`` for unbounded. When the
+            budget is exceeded the least recently used author partitions are evicted.
+    """
+    def __init__(self, store, factory, max_cards=None) -> None:
+        """
+        Initialize a CardRepository.
+
+        Args:
+            store (OpLogStore): The snapshot and operation log to read from.
+            factory (callable): Builds a card object from one JSON record.
+            max_cards (int, optional): Memory budget in cards. Defaults to None (unbounded).
+        """
+        self.store = store
+        self.factory = factory
+        self.max_cards = max_cards
+        self._lock = threading.RLock()
+        self._version = None
+        self._log_offset = 0
+        self._author_of = None  # primary index: card id -> author id (whole corpus)
+        self._authors = {}  # author id -> number of cards
+        self._partitions = OrderedDict()  # author id -> _AuthorPartition, in LRU order
+        self._cached_cards = 0
+        self._author_versions = {}  # author id -> deck version of the last log record touching the author
+
+    def _check_version(self) -> None:
+        version = self.store.snapshot_version()
+        if version != self._version:
+            self._clear()
+            self._version = version
+            return
+        if self._author_of is None:
+            return
+        log_size = self.store.log_size()
+        if log_size < self._log_offset:
+            # The log was compacted or truncated under us
+            self._clear()
+            self._version = version
+        elif log_size > self._log_offset:
+            # A compaction between the checks above and the read could have emptied
+            # the log and new appends grown it past our offset, which would then
+            # point into the middle of a record: check again while no writer can run
+            with self.store.file_lock.acquire(exclusive=False):
+                if self.store.snapshot_version() != version or self.store.log_size() < self._log_offset:
+                    self._clear()
+                    self._version = self.store.snapshot_version()
+                    return
+                ops, self._log_offset = self.store.read_log(self._log_offset)
+            if len(ops) > LOG_TAIL_REINDEX:
+                for partition in self._partitions.values():
+                    partition.drop_derived()
+            for op in ops:
+                self._apply(op)
+
+    def _clear(self) -> None:
+        self._version = None
+        self._log_offset = 0
+        self._author_of = None
+        self._authors = {}
+        self._partitions.clear()
+        self._cached_cards = 0
+        self._author_versions = {}
+
+    def _load(self, wanted_author=None) -> None:
+        """
+        Parse the snapshot, replay the log and rebuild the primary index and as many
+        author partitions as the memory budget allows, starting with ``wanted_author``.
+        """
+        try:
+            snapshot, ops, self._log_offset = self.store.read_consistent()
+        except json.JSONDecodeError:
+            # Corrupt snapshot, try again on the next read
+            self._clear()
+            self._author_of = {}
+            return
+        if ops:
+            # Owners of the cards the log touches, including the cards it deletes
+            owners = {record['id']: record['author_id'] for record in snapshot}
+            for op in ops:
+                self._note_version(op, _op_author(op, owners))
+                if op['op'] == 'add':
+                    owners[op['card']['id']] = op['card']['author_id']
+        grouped = OrderedDict()
+        author_of = {}
+        for record in replay(snapshot, ops):
+            author_of[record['id']] = record['author_id']
+            grouped.setdefault(record['author_id'], []).append(record)
+        self._author_of = author_of
+        self._authors = {author_id: len(records) for author_id, records in grouped.items()}
+
+        # Writers may have appended since the cached partitions were last brought up to
+        # date, and the log offset now points past those records: rebuild the cached
+        # partitions first, in their LRU order, then fill the rest of the budget
+        cached = [author_id for author_id in self._partitions if author_id != wanted_author]
+        self._partitions.clear()
+        self._cached_cards = 0
+        if wanted_author is not None:
+            self._add_partition(wanted_author, grouped.pop(wanted_author, []))
+        for author_id in cached + list(grouped):
+            author_records = grouped.pop(author_id, None)
+            if author_records is None:
+                continue
+            if self.max_cards is not None and self._cached_cards + len(author_records) > self.max_cards:
+                continue
+            self._add_partition(author_id, author_records)
+        if wanted_author in self._partitions:
+            self._partitions.move_to_end(wanted_author)
+        self._evict()
+
+    def _add_partition(self, author_id, records) -> None:
+        partition = _AuthorPartition([self.factory(record) for record in records])
+        old = self._partitions.pop(author_id, None)
+        if old is not None:
+            self._cached_cards -= len(old.cards)
+        self._partitions[author_id] = partition
+        self._cached_cards += len(partition.cards)
+
+    def _evict(self) -> None:
+        if self.max_cards is None:
+            return
+        # Never evict the most recently used partition, even if it alone exceeds the budget
+        while self._cached_cards > self.max_cards and len(self._partitions) > 1:
+            author_id, partition = self._partitions.popitem(last=False)
+            self._cached_cards -= len(partition.cards)
+
+    def _apply(self, op) -> None:
+        """
+        Apply one log record to the cached indexes.
+        """
+        self._note_version(op, _op_author(op, self._author_of))
+        kind = op['op']
+        if kind == 'add':
+            record = op['card']
+            author_id = record['author_id']
+            self._author_of[record['id']] = author_id
+            self._authors[author_id] = self._authors.get(author_id, 0) + 1
+            partition = self._partitions.get(author_id)
+            if partition is not None:
+                partition.add(self.factory(dict(record)))
+                self._cached_cards += 1
+            return
+        if kind == 'schedule':
+            partition = self._partitions.get(op['author_id'])
+            if partition is not None:
+                for card_id, review_date in op['dates']:
+                    card = partition.by_id.get(card_id)
+                    if card is not None:
+                        card.next_review_date = review_date
+                        partition.changed(card)
+            return
+        author_id = self._author_of.get(op['id'])
+        partition = self._partitions.get(author_id)
+        card = partition.by_id.get(op['id']) if partition is not None else None
+        if kind == 'delete':
+            if author_id is not None:
+                del self._author_of[op['id']]
+                self._authors[author_id] -= 1
+                if not self._authors[author_id]:
+                    del self._authors[author_id]
+            if card is not None:
+                partition.remove(card)
+                self._cached_cards -= 1
+        elif card is None:
+            return
+        elif kind == 'flag':
+            card.add_flag(op['flag'], op.get('delta', 1))
+            partition.changed(card)
+        elif kind == 'edit':
+            fields = dict(op['fields'])
+            topic = fields.pop('topic', card.topic)
+            for name, value in fields.items():
+                setattr(card, name, value)
+            if topic != card.topic:
+                partition.retopic(card, topic)
+            partition.changed(card)
+
+    def _note_version(self, op, author_id) -> None:
+        if author_id is not None and 'v' in op:
+            self._author_versions[author_id] = op['v']
+
+    def _partition(self, author_id) -> _AuthorPartition:
+        self._check_version()
+        partition = self._partitions.get(author_id)
+        if partition is None:
+            if self._author_of is not None and author_id not in self._authors:
+                return _AuthorPartition([])
+            self._load(author_id)
+            partition = self._partitions.get(author_id, _AuthorPartition([]))
+        else:
+            self._partitions.move_to_end(author_id)
+        return partition
+
+    def get_by_author(self, author_id) -> list:
+        """
+        Get all cards of an author, in file order.
+
+        Args:
+            author_id (str): The ID of the author.
+
+        Returns:
+            list: The author's Card objects.
+        """
+        with self._lock:
+            return list(self._partition(author_id).cards)
+
+    def get_by_author_topic(self, author_id, topic) -> list:
+        """
+        Get the cards of an author for one topic, in file order.
+
+        Args:
+            author_id (str): The ID of the author.
+            topic (str): The exact topic to filter by.
+
+        Returns:
+            list: The matching Card objects.
+        """
+        with self._lock:
+            return list(self._partition(author_id).by_topic.get(topic, []))
+
+    def pick_for_review(self, author_id, offset=0, limit=None, today=None, topic=None) -> tuple:
+        """
+        Get the cards Scheduler.pick_card would pick for an author, from the
+        partition's due index (or the topic's, in the topic index) instead of a scan.
+
+        Args:
+            author_id (str): The ID of the author.
+            offset (int, optional): Number of picked cards to skip. Defaults to 0.
+            limit (int, optional): Maximum number of cards to return. Defaults to None (all).
+            today (date, optional): The review day. Defaults to today in UTC.
+            topic (str, optional): Only pick among the cards of this topic, in any case
+                or spacing. Defaults to None.
+
+        Returns:
+            tuple: The requested Card objects and the total number of picked cards.
+        """
+        with self._lock:
+            partition = self._partition(author_id)
+            if topic is not None:
+                return partition.topics.pick(topic, today=today, offset=offset, limit=limit)
+            return partition.due.pick(today=today, offset=offset, limit=limit)
+
+    def topic_counts(self, author_id, today=None) -> dict:
+        """
+        Get the author's card and due counts per topic from the partition's topic index.
+
+        Args:
+            author_id (str): The ID of the author.
+            today (date, optional): The review day of the due counts. Defaults to today in UTC.
+
+        Returns:
+            dict: ``{'cards': .., 'due': ..}`` keyed by topic, as TopicIndex.counts.
+        """
+        with self._lock:
+            return self._partition(author_id).topics.counts(today=today)
+
+    def cards_page(self, author_id, order='id', topic=None, after=None, before=None, limit=None) -> list:
+        """
+        Get one keyset page of an author's cards from the partition's sorted index.
+
+        Args:
+            author_id (str): The ID of the author.
+            order (str, optional): A key of app.card_order.CARD_ORDERS. Defaults to 'id'.
+            topic (str, optional): Only cards of this topic, ``'topic'`` order only. Defaults to None.
+            after (tuple, optional): Sort key the page starts after. Defaults to None.
+            before (tuple, optional): Sort key the page ends before. Defaults to None.
+            limit (int, optional): Maximum number of cards to return. Defaults to None (all).
+
+        Returns:
+            list: The page's Card objects in sort order.
+        """
+        with self._lock:
+            return self._partition(author_id).order(order).page(after=after, before=before, limit=limit, topic=topic)
+
+    def search(self, author_id, query, limit=None) -> list:
+        """
+        Get an author's cards matching a full-text query from the partition's inverted index.
+
+        Args:
+            author_id (str): The ID of the author.
+            query (str): Words to search for in questions, answers and hints.
+            limit (int, optional): Maximum number of cards to return. Defaults to None (all).
+
+        Returns:
+            list: The matching Card objects, best first.
+        """
+        with self._lock:
+            return self._partition(author_id).search.search(query, limit=limit)
+
+    def author_version(self, author_id) -> str:
+        """
+        Get a token that changes whenever one of the author's cards changes.
+
+        It combines the identity of the snapshot with the version of the last log
+        record that touched the author, so every process reading the store computes
+        the same token. Replacing the snapshot, compaction included, changes the
+        token of every author.
+
+        Args:
+            author_id (str): The ID of the author.
+
+        Returns:
+            str: Opaque version token, compare for equality only.
+        """
+        with self._lock:
+            self._check_version()
+            if self._author_of is None:
+                self._load()
+            snapshot = '-'.join(str(part) for part in self._version) if self._version else '0'
+            return f'{snapshot}.{self._author_versions.get(author_id, 0)}'
+
+    def topic_stats(self, author_id) -> dict:
+        """
+        Get the author's answer totals per topic, maintained incrementally.
+
+        Args:
+            author_id (str): The ID of the author.
+
+        Returns:
+            dict: Totals keyed by topic, as app.aggregates.topic_totals.
+        """
+        with self._lock:
+            return self._partition(author_id).stats.totals()
+
+    def get(self, card_id):
+        """
+        Get a card by its unique ID.
+
+        Args:
+            card_id (int): The unique identifier of the card.
+
+        Returns:
+            Card: The Card object if found, otherwise None.
+        """
+        with self._lock:
+            self._check_version()
+            if self._author_of is None:
+                self._load()
+            author_id = self._author_of.get(card_id)
+            if author_id is None:
+                return None
+            return self._partition(author_id).by_id.get(card_id)
+
+    def authors(self) -> list:
+        """
+        Returns:
+            list: IDs of every author with at least one card, sorted.
+        """
+        with self._lock:
+            self._check_version()
+            if self._author_of is None:
+                self._load()
+            return sorted(self._authors)
+
+    def invalidate(self) -> None:
+        """
+        Drop every cached partition, forcing the next read to reparse the store.
+        """
+        with self._lock:
+            self._clear()
+
+    @property
+    def cached_cards(self) -> int:
+        """
+        Number of Card objects currently held in memory.
+        """
+        return self._cached_cards
@@ -1,13 +1,66 @@
-from copy import deepcopy
-from flask import render_template, request, redirect, jsonify, flash
+import base64
+import functools
+import hashlib
+import json
+import math
+import os
+from datetime import datetime, timezone
+from flask import (Response, render_template, request, redirect, jsonify, flash, session, make_response, url_for,
+                   stream_with_context)
 from flask_login import current_user, login_user, logout_user, login_required
 from app import app
-from app.models import Card, User
-from app.forms import LoginForm, RegistrationForm
-from app.scheduler import Scheduler
+from app.auth import AuthBusyError, authenticate, password_hasher
+from app.card_order import CARD_ORDERS
+from app.deck_io import DECK_FORMATS, DeckFormatError, deck_format, export_deck, import_deck, text_lines
+from app.models import REVIEW_FLAGS, Card, User, storage
+from app.forms import USERNAME_TAKEN, LoginForm, RegistrationForm
+from app.study_session import study_sessions
+from app.user_store import UsernameTakenError
+from config import Config
 
 # Import modules
-from .utils import update_user_json, calculate_score
+from .utils import calculate_score
+
+
+# Changes whenever a template changes, so a deploy never answers 304 with stale markup
+_TEMPLATES_STAMP = max((entry.stat().st_mtime_ns for entry in os.scandir(os.path.join(app.root_path, app.template_folder))),
+                       default=0)
+
+
+def _deck_etag(user_id) -> str:
+    """
+    ETag of a page built only from the user's cards: the page, the user, the
+    version of their cards and the day, which due counts depend on.
+    """
+    today = datetime.now(timezone.utc).date()
+    key = f'{request.full_path}\0{user_id}\0{Card.user_deck_version(user_id)}\0{today}\0{_TEMPLATES_STAMP}'
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def deck_conditional(view):
+    """
+    Answer conditional GETs of a page built only from the user's cards with
+    304 Not Modified while none of their cards changed, before any card is loaded.
+
+    Args:
+        view (callable): The view function, wrapped after ``login_required``.
+
+    Returns:
+        callable: The wrapped view.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = _deck_etag(current_user.id)
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+        response.set_etag(etag, weak=True)
+        # Browsers revalidate on every view; the page is only ever reused by this user
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+        return response
+    return wrapper
 
 
 # ROUTE 1.1: Register Page
@@ -23,26 +76,38 @@ def register():
 
     if request.method == 'POST':
         if form.validate_on_submit():
-            user = User(username=form.username.data, email=form.email.data)
-            user.set_password(form.password.data)
-            users, message = User.load_users()
-            users[user.username] = user
-            User.save_users(users)
-            return redirect("/login")
+            if _create_user(form):
+                return redirect("/login")
+            return render_template('register.html', title='Register', form=form)
 
     if current_user.is_authenticated:
         return redirect("/post_login")
-    if form.validate_on_submit():
-        user = User(username=form.username.data, email=form.email.data)
-        user.set_password(form.password.data)
-        users, message = User.load_users()
-        users[user.username] = user
-        User.save_users(users)
+    if form.validate_on_submit() and _create_user(form):
         flash('Congratulations, you are now a registered user!')
         return redirect("/login")
     return render_template('register.html', title='Register', form=form)
 
 
+def _create_user(form) -> bool:
+    """
+    Register the user of a validated RegistrationForm.
+
+    The form only checked the username against this worker's user cache, so the
+    store may still find it taken; the form then shows the same error.
+
+    Returns:
+        bool: True if the user was created.
+    """
+    user = User(username=form.username.data, email=form.email.data)
+    user.set_password(form.password.data)
+    try:
+        user.create()
+    except UsernameTakenError:
+        form.username.errors.append(USERNAME_TAKEN)
+        return False
+    return True
+
+
 # ROUTE 1.2: Login Page
 # --------------------
 @app.route('/login', methods=['GET', 'POST'])
@@ -56,12 +121,16 @@ def login():
         return redirect("/post_login")
     form = LoginForm()
     if form.validate_on_submit():
-        json_status = update_user_json({"username": form.username.data, "password": form.password.data}, "login")
+        try:
+            json_status, user_record = authenticate(password_hasher, storage, form.username.data, form.password.data)
+        except AuthBusyError:
+            # Shed load instead of letting password hashing tie up every worker
+            return "Too many sign-ins at the moment, please try again shortly.", 503, {"Retry-After": "2"}
         # Check for User
         # --------------
         # If the user exists and enter's valid credentials
         if json_status == "Valid":
-            user = User.get_by_username(form.username.data)
+            user = User(username=form.username.data, email=user_record['email'], password_hash=user_record['password_hash'])
             login_user(user, remember=form.remember_me.data)
             # Redirect the user to /post_login page
             return redirect("/post_login")
@@ -77,13 +146,14 @@ def login():
 # Under "Manage Cards" -> "View All Cards"
 @app.route("/all_cards")
 @login_required
+@deck_conditional
 def all_cards():
     """
-    Display all cards for the logged-in user.
+    Display the logged-in user's cards in creation order, one page at a time.
     """
     u = User.get_by_username(current_user.id)
-    cards = Card.get_by_user_id(u.id)
-    return render_template("all_cards.html", cards=cards)
+    total_cards = sum(stats['cards'] for stats in Card.topic_stats(u.id).values())
+    return render_template("all_cards.html", **_card_page(u.id, 'id', total_cards))
 
 
 # ROUTE 3: Logout the User
@@ -109,27 +179,18 @@ def index():
     """
     try:
         u = User.get_by_username(current_user.id)
-        cards = Card.get_by_user_id(u.id)
-        total_cards = len(cards)
-        page = request.args.get('page', 1, type=int)
-        if page > total_cards:
-            page = total_cards
-        if page < 1:
-            page = 1
-        card = cards[page - 1] if cards else None
-        topics = set(card.topic for card in cards)
-        all_topics_len = len(topics)
-        all_topics = sorted(topics)
+        # Counts come from the per-topic totals, no card is loaded
+        stats = Card.topic_stats(u.id)
+        total_cards = sum(topic_stats['cards'] for topic_stats in stats.values())
+        all_topics = sorted(stats)
+        all_topics_len = len(all_topics)
     except Exception as e:
         print(e)
-        page = 1
-        card = None
         total_cards = 0
         all_topics_len = 0
         all_topics = []
 
-    return render_template("index.html", card=card, page=page, total_cards=total_cards, all_topics_len=all_topics_len,
-                           all_topics=all_topics)
+    return render_template("index.html", total_cards=total_cards, all_topics_len=all_topics_len, all_topics=all_topics)
 
 
 # ROUTE 5.1: POST LOGIN PAGE DISPLAY
@@ -164,14 +225,13 @@ def post_login_action():
 # ---------------------------------------
 @app.route("/start_by_topic")
 @login_required
+@deck_conditional
 def start_by_topic():
     """
     Display a page for starting a game by selecting a topic.
     """
     u = User.get_by_username(current_user.id)
-    cards = Card.get_by_user_id(u.id)
-    topics = sorted(set(card.topic for card in cards))
-    return render_template("start_by_topic.html", topics=topics)
+    return render_template("start_by_topic.html", topics=Card.topic_counts(u.id))
 
 
 # ROUTE 6.2: START GAME by selected topic
@@ -184,26 +244,20 @@ def start_game_by_topic(topic):
     """
     print(topic)
     u = User.get_by_username(current_user.id)
-    # Gather cards by topic into a list
-    cards = [card for card in Card.get_by_user_id(u.id) if card.topic.lower() == topic.lower()]
-    # ASK THE ALGO TO PICK THE CARD FOR REVIEW
-    card_queue = Scheduler(cards)
-    _cards = card_queue.pick_card()
-    total_cards = len(_cards)
-
-    if not _cards:
-        flash("There are no cards available today for this topic.")
-        return redirect("/post_login")
 
+    def pick_topic_cards():
+        # ASK THE ALGO TO PICK THE CARD FOR REVIEW, among the topic's cards in any case
+        return [card.id for card in Card.pick_for_review(u.id, topic=topic)[0]]
+
+    study = _study_session(u.id, topic, pick_topic_cards)
     # Page: Card's served
-    page = request.args.get('page', 1, type=int)
-    if page > total_cards:
-        page = total_cards
-    if page < 1:
-        page = 1
-    card = _cards[page - 1]
+    card = _session_card(study, request.args.get('page', 1, type=int), u.id)
+    if card is None:
+        flash("There are no cards available today for this topic.")
+        return redirect("/post_login")
 
-    return render_template('start_game.html', card=card, page=page, total_cards=total_cards, topic=topic)
+    return render_template('start_game.html', card=card, page=study.cursor + 1, total_cards=len(study), topic=topic,
+                           prefetch=Config.STUDY_PREFETCH_CARDS)
 
 
 # ROUTE 6.3: PLAY GAME WITH ALL CARDS
@@ -215,13 +269,9 @@ def start_game():
     Start a game with all available cards for the logged-in user.
     """
     u = User.get_by_username(current_user.id)
-    cards = Card.get_by_user_id(u.id)
-    card_queue = Scheduler(cards)
-    _cards = card_queue.pick_card()
-    # random.shuffle(_cards)
-    total_cards = len(_cards)
+    study = _study_session(u.id, None, lambda: Card.review_queue(u.id))
 
-    if not _cards:
+    if not len(study):
         flash("There are no cards available today to start the game.")
         return redirect("/post_login")
 
@@ -232,42 +282,203 @@ def start_game():
 
         print(flag, card_id, page)
 
-        # Update the flags dictionary in the JSON file
-        cards_dataset = deepcopy(Card.load_cards())
-        updated_card_dataset = []
-        current_id_card_dataset = {}
-        for card_details in cards_dataset:
-            if card_details.id == card_id:
-                current_id_card_dataset = card_details
-            else:
-                updated_card_dataset.append(card_details)
-
-        # right / wrong
-        current_id_flag_details = current_id_card_dataset.flags
-        if flag in current_id_flag_details.keys():
-            current_id_flag_details[flag] += 1
-        else:
-            current_id_flag_details[flag] = 1
-
-        current_id_card_dataset.flags = current_id_flag_details
-        updated_card_dataset.append(current_id_card_dataset)
-
-        # save back json
-        Card.save_cards(updated_card_dataset)
+        # Append the flag increment to the card log
+        Card.record_answer(card_id, flag, author_id=u.id)
+        if flag in ('right', 'wrong'):
+            Card.schedule_review(card_id, author_id=u.id)
+        study.answered.add(card_id)
 
         next_page = page + 1
-        if next_page > total_cards:
+        if next_page > len(study):
             return jsonify(next_page=None)
         return jsonify(next_page=next_page)
 
+    card = _session_card(study, request.args.get('page', 1, type=int), u.id)
+    if card is None:
+        flash("There are no cards available today to start the game.")
+        return redirect("/post_login")
+
+    return render_template('start_game.html', card=card, page=study.cursor + 1, total_cards=len(study),
+                           prefetch=Config.STUDY_PREFETCH_CARDS)
+
+
+# ROUTE 6.4: PREFETCH CARDS OF THE RUNNING GAME
+# -----------------------------------------
+@app.route("/api/study/cards")
+@login_required
+def study_cards():
+    """
+    Return consecutive cards of the running game's frozen queue, so the study page
+    can flip cards without loading a page per card.
+
+    Query parameters: ``page`` (first page, 1-based), ``limit`` (number of cards, at
+    most STUDY_PREFETCH_MAX) and ``topic`` (the topic played, omitted for all cards).
+    """
+    study = study_sessions.get(session.get('study_session'), current_user.id, request.args.get('topic'))
+    if study is None:
+        return jsonify(error='No running game'), 404
     page = request.args.get('page', 1, type=int)
-    if page > total_cards:
-        page = total_cards
-    if page < 1:
+    limit = min(max(request.args.get('limit', Config.STUDY_PREFETCH_CARDS, type=int), 1), Config.STUDY_PREFETCH_MAX)
+    window = study.window(page, limit, lambda card_id: Card.get_by_id(card_id, author_id=current_user.id))
+    return jsonify(total=len(study),
+                   cards=[dict(page=card_page, id=card.id, topic=card.topic, question=card.question,
+                               hint=card.hint, answer=card.answer) for card_page, card in window])
+
+
+# ROUTE 6.5: SUBMIT BUFFERED ANSWERS
+# -----------------------------------------
+@app.route("/api/reviews", methods=['POST'])
+@login_required
+def submit_reviews():
+    """
+    Apply a batch of answers buffered by the study page in one write.
+
+    Expects ``{"reviews": [{"card_id": 1, "flag": "right", "timestamp": "2024-06-10T08:00:00Z",
+    "response_ms": 4200}, ...]}``. ``timestamp`` defaults to now; ``response_ms`` is
+    checked but not stored, cards have no field for it yet.
+    """
+    payload = request.get_json(silent=True)
+    reviews = payload.get('reviews') if isinstance(payload, dict) else None
+    if not isinstance(reviews, list) or len(reviews) > Config.REVIEW_BATCH_MAX:
+        return jsonify(error=f'Expected a list of at most {Config.REVIEW_BATCH_MAX} reviews'), 400
+    now = datetime.now(timezone.utc)
+    try:
+        answers = [_parse_review(review, now) for review in reviews]
+    except (AttributeError, KeyError, TypeError, ValueError) as error:
+        return jsonify(error=f'Invalid review: {error}'), 400
+
+    applied = Card.record_reviews(current_user.id, answers)
+    return jsonify(applied=applied, rejected=len(answers) - applied)
+
+
+def _parse_review(review, now) -> tuple:
+    """
+    Validate one review event of /api/reviews.
+
+    Returns:
+        tuple: The card id, the flag and the answer time, never later than ``now``.
+
+    Raises:
+        ValueError: If a field is missing or invalid.
+    """
+    flag = review['flag']
+    if flag not in REVIEW_FLAGS:
+        raise ValueError(f'unknown flag {flag!r}')
+    if float(review.get('response_ms', 0)) < 0:
+        raise ValueError('negative response_ms')
+    answered_at = now
+    if review.get('timestamp'):
+        answered_at = datetime.fromisoformat(review['timestamp'])
+        if answered_at.tzinfo is None:
+            answered_at = answered_at.replace(tzinfo=timezone.utc)
+        answered_at = min(answered_at, now)
+    return int(review['card_id']), flag, answered_at
+
+
+def _study_session(user_id, topic, pick_card_ids):
+    """
+    Get the user's running game, or freeze a new review queue when a game starts
+    (a request without a page) or the running one is gone.
+
+    Args:
+        user_id (str): The player.
+        topic (str): The topic played, None for all cards.
+        pick_card_ids (callable): Returns the card ids of a new queue in review order.
+
+    Returns:
+        StudySession: The game's session.
+    """
+    study = None
+    if 'page' in request.args or request.method == 'POST':
+        study = study_sessions.get(session.get('study_session'), user_id, topic)
+    if study is None:
+        study = study_sessions.start(user_id, topic, pick_card_ids())
+        session['study_session'] = study.id
+    return study
+
+
+def _session_card(study, page, user_id):
+    """
+    Get the card on a page of a game, skipping cards deleted since the game started.
+
+    Returns:
+        Card: The card, None if the queue is empty.
+    """
+    while len(study):
+        card_id = study.card_id_at(page)
+        card = Card.get_by_id(card_id, author_id=user_id)
+        if card is not None:
+            return card
+        study.drop(card_id)
+    return None
+
+
+def _encode_cursor(key) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def _decode_cursor(value, order):
+    """
+    Returns:
+        tuple: The sort key in a page link, None if missing or not a key of ``order``.
+    """
+    if not value:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(value.encode()))
+    except ValueError:
+        return None
+    key_types = CARD_ORDERS[order].key_types
+    if not isinstance(key, list) or len(key) != len(key_types) or not all(map(isinstance, key, key_types)):
+        return None
+    return tuple(key)
+
+
+def _card_page(user_id, order, total, topic=None) -> dict:
+    """
+    Get the page of the user's cards a listing request asks for.
+
+    Pages are found by keyset: the ``after``/``before`` cursor of a page link holds
+    the sort key of the card the page starts after or ends before, so a page costs
+    the same wherever it is in the deck. ``page`` is only carried along for display.
+
+    Args:
+        user_id (str): The owner of the cards.
+        order (str): A key of app.card_order.CARD_ORDERS.
+        total (int): Number of cards listed over all pages.
+        topic (str, optional): Only cards of this topic. Defaults to None.
+
+    Returns:
+        dict: The template variables cards, page, page_count, total_cards, prev_url and next_url, and
+        listing_key, the fragment cache key of the rendered page.
+    """
+    limit = min(max(request.args.get('limit', Config.CARD_PAGE_SIZE, type=int), 1), Config.CARD_PAGE_MAX)
+    page = max(request.args.get('page', 1, type=int), 1)
+    after = _decode_cursor(request.args.get('after'), order)
+    before = _decode_cursor(request.args.get('before'), order) if after is None else None
+    # One card more than the page tells whether there is another page in that direction
+    cards = Card.page_by_user(user_id, order=order, topic=topic, after=after, before=before, limit=limit + 1)
+    if before is not None:
+        has_prev, has_next = len(cards) > limit, True
+        cards = cards[-limit:]
+    else:
+        has_prev, has_next = after is not None, len(cards) > limit
+        cards = cards[:limit]
+    if not has_prev:
         page = 1
-    card = _cards[page - 1]
 
-    return render_template('start_game.html', card=card, page=page, total_cards=total_cards)
+    def link(page, **cursor):
+        args = {name: request.args[name] for name in ('topic', 'limit') if name in request.args}
+        return url_for(request.endpoint, **request.view_args, **args, page=page, **cursor)
+
+    key = CARD_ORDERS[order].key
+    return {'cards': cards,
+            'listing_key': (user_id, Card.user_deck_version(user_id), request.full_path),
+            'page': page,
+            'page_count': max(math.ceil(total / limit), 1),
+            'total_cards': total,
+            'prev_url': link(page - 1, before=_encode_cursor(key(cards[0]))) if has_prev and cards else None,
+            'next_url': link(page + 1, after=_encode_cursor(key(cards[-1]))) if has_next and cards else None}
 
 
 # ROUTE 7: ADD CARDS
@@ -283,7 +494,7 @@ def new_card():
     u = User.get_by_username(current_user.id)
 
     if request.method == "GET":
-        all_topics = sorted(set(card.topic for card in Card.get_by_user_id(u.id)))
+        all_topics = list(Card.topic_counts(u.id))
         return render_template("new.html", all_topics=all_topics)
     else:
         topic = request.form["topic"]
@@ -292,9 +503,7 @@ def new_card():
         if not hint:
             hint = "No hints available!"
         answer = request.form["answer"]
-        cards = Card.load_cards()
-        card_id = max(card.id for card in cards) + 1 if cards else 1
-        card = Card(id=card_id,
+        card = Card(id=Card.allocate_ids()[0],
                     topic=topic,
                     question=question,
                     hint=hint,
@@ -308,18 +517,23 @@ def new_card():
 # -----------------------------
 @app.route("/cards")
 @login_required
+@deck_conditional
 def show_cards():
-    """Shows all the cards in the database belonging to all the topics"""
+    """Shows the user's cards ordered by topic, one page at a time, optionally only those of ?topic="""
     u = User.get_by_username(current_user.id)
-    cards = sorted(Card.get_by_user_id(u.id), key=lambda card: card.topic)
-    all_topics = sorted(set(card.topic for card in cards))
+    stats = Card.topic_stats(u.id)
+    all_topics = sorted(stats)
+    topic = request.args.get('topic') or None
+    if topic is None:
+        total_cards = sum(topic_stats['cards'] for topic_stats in stats.values())
+    else:
+        total_cards = stats.get(topic, {}).get('cards', 0)
 
     return render_template("cards.html",
-                           cards=cards,
                            all_topics=all_topics,
-                           page=1,
-                           total_cards=len(cards),
-                           all_topics_len=len(all_topics))
+                           all_topics_len=len(all_topics),
+                           topic=topic,
+                           **_card_page(u.id, 'topic', total_cards, topic=topic))
 
 
 # ROUTE 9.1: Display Cards by Topic
@@ -341,10 +555,25 @@ def get_card_category(card_category):
 # ---------------------------------
 @app.route("/cards/topic/<string:card_topic>")
 @login_required
+@deck_conditional
 def get_card_topic(card_topic):
     u = User.get_by_username(current_user.id)
-    cards = [card for card in Card.get_by_user_id(u.id) if card.topic == card_topic]
-    return render_template("all_cards.html", cards=cards)
+    total_cards = Card.topic_stats(u.id).get(card_topic, {}).get('cards', 0)
+    return render_template("all_cards.html", **_card_page(u.id, 'topic', total_cards, topic=card_topic))
+
+
+# ROUTE 9.3: SEARCH CARDS
+# ---------------------------------
+@app.route("/cards/search")
+@login_required
+@deck_conditional
+def search_cards():
+    """
+    Full-text search of the user's questions, answers and hints, best matches first.
+    """
+    query = request.args.get('q', '').strip()
+    cards = Card.search(current_user.id, query, limit=Config.SEARCH_RESULTS_MAX) if query else []
+    return render_template("search.html", query=query, cards=cards)
 
 
 # ROUTE 10: GET CARD
@@ -355,7 +584,7 @@ def get_card(card_id):
     """
     Fetches selected card to be displayed
     """
-    card = Card.get_by_id(card_id)
+    card = Card.get_by_id(card_id, author_id=current_user.id)
     return render_template("show.html", card=card)
 
 
@@ -365,14 +594,8 @@ def get_card(card_id):
 @login_required
 def edit(card_id):
     """Enables to edit card"""
-    card = Card.get_by_id(card_id)
-    card.question = request.form["question"]
-    card.topic = request.form["topic"]
-    cards = Card.load_cards()
-    for i, c in enumerate(cards):
-        if c.id == card_id:
-            cards[i] = card
-    Card.save_cards(cards)
+    Card.update_card(card_id, {"question": request.form["question"], "topic": request.form["topic"]},
+                     author_id=current_user.id)
     return redirect("/")
 
 
@@ -381,7 +604,7 @@ def edit(card_id):
 @app.route("/cards/<int:card_id>/delete", methods=["POST"])
 @login_required
 def delete_card(card_id):
-    Card.delete_card(card_id)
+    Card.delete_card(card_id, author_id=current_user.id)
     return redirect("/")
 
 
@@ -389,26 +612,71 @@ def delete_card(card_id):
 # ----------------------------------
 @app.route('/scoreboard')
 @login_required
+@deck_conditional
 def scoreboard():
     """
     Display scoreboard with user's performance stats.
     """
     u = User.get_by_username(current_user.id)
-    cards = Card.get_by_user_id(u.id)
-
+    # Totals are maintained per topic as answers come in
     scoreboard = {}
-    for card in cards:
-        topic = card.topic
-        if topic not in scoreboard:
-            scoreboard[topic] = {
-                'right': 0,
-                'wrong': 0,
-                'hints': 0,
-                'score': 0
-            }
-        scoreboard[topic]['right'] += card.flags.get('right', 0)
-        scoreboard[topic]['wrong'] += card.flags.get('wrong', 0)
-        scoreboard[topic]['hints'] += card.flags.get('hint_used', 0)
-        scoreboard[topic]['score'] = calculate_score(scoreboard[topic])
+    for topic, stats in Card.topic_stats(u.id).items():
+        scoreboard[topic] = dict(stats, score=calculate_score(stats))
 
     return render_template('scoreboard.html', scoreboard=scoreboard)
+
+
+# ROUTE 14: FRAGMENT CACHE STATS
+# ----------------------------------
+@app.route('/api/fragment_cache')
+@login_required
+def fragment_cache_stats():
+    """
+    Report the hits, misses and size of this worker's rendered fragment cache.
+    """
+    return jsonify(app.jinja_env.fragment_cache.stats())
+
+
+# ROUTE 15: IMPORT A DECK
+# ----------------------------------
+@app.route('/api/cards/import', methods=['POST'])
+@login_required
+def import_cards():
+    """
+    Add the cards of an uploaded deck file to the user's deck.
+
+    The file is either the ``file`` field of a multipart form or the request body.
+    ``?format=`` is csv, jsonl or tsv and defaults to the uploaded file's extension;
+    ``?topic=`` is the topic of rows without one. The body is read line by line and
+    the cards are added in batches of IMPORT_BATCH_SIZE, see app.deck_io.
+    """
+    upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+    try:
+        fmt = deck_format(request.args.get('format') or (upload.filename if upload is not None else None))
+    except DeckFormatError as error:
+        return jsonify(error=str(error)), 400
+    stream = upload.stream if upload is not None else request.stream
+    summary = import_deck(text_lines(stream), fmt, current_user.id,
+                          default_topic=request.args.get('topic', '').strip() or 'Imported',
+                          batch_size=Config.IMPORT_BATCH_SIZE, max_errors=Config.IMPORT_MAX_ERRORS)
+    return jsonify(summary), 400 if summary['error'] else 200
+
+
+# ROUTE 16: EXPORT THE DECK
+# ----------------------------------
+@app.route('/cards/export')
+@login_required
+def export_cards():
+    """
+    Download the user's deck as csv, jsonl or tsv (``?format=``, defaults to csv).
+
+    The file is streamed while the deck is read page by page, so memory use does
+    not grow with the deck.
+    """
+    try:
+        fmt = deck_format(request.args.get('format', 'csv'))
+    except DeckFormatError as error:
+        return jsonify(error=str(error)), 400
+    cards = Card.iter_by_user(current_user.id, page_size=Config.EXPORT_PAGE_SIZE)
+    return Response(stream_with_context(export_deck(cards, fmt)), mimetype=DECK_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=deck.{fmt}'})
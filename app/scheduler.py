@@ -2,29 +2,151 @@
 Class that handles scheduling of the cardsa
 """
 import datetime
-from collections import defaultdict
+
+import numpy as np
+
+BOX_INTERVALS = [7, 4, 3, 2, 1]  # Review intervals in days (Intervals are split from 1 day -- 7 days interval) # Highest scoring cards are given lowest preference
+BOX_THRESHOLD = [80, 60, 40, 20, 0]  # Different score thresholds
+
+
+def _flag(card, name):
+    # Card.flag avoids building the flags dict of a slotted card
+    flag = getattr(card, 'flag', None)
+    return flag(name) if flag is not None else card.flags.get(name, 0)
+
+
+def _review_date(value):
+    """
+    Convert a next review date to a naive datetime (wall clock of its own time zone,
+    so ``.date()`` is unchanged), None if the card has no review date.
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    elif not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    return value.replace(tzinfo=None)
+
+
+class DeckArrays:
+    """
+    Review counters and review dates of a list of cards as NumPy arrays, so a whole
+    deck is scored, boxed and rescheduled in a few vectorized operations.
+
+    Attributes:
+        right (ndarray): Right answers per card.
+        wrong (ndarray): Wrong answers per card.
+        hints (ndarray): The ``hints`` flag per card, as read by Scheduler.calculate_score.
+        hint_used (ndarray): Hints used per card, as recorded by the game.
+        review_dates (ndarray): Next review dates (datetime64[us], NaT when unscheduled).
+    """
+    def __init__(self, cards) -> None:
+        count = len(cards)
+        self.right = np.fromiter((_flag(card, 'right') for card in cards), dtype=np.int64, count=count)
+        self.wrong = np.fromiter((_flag(card, 'wrong') for card in cards), dtype=np.int64, count=count)
+        self.hints = np.fromiter((_flag(card, 'hints') for card in cards), dtype=np.int64, count=count)
+        self.hint_used = np.fromiter((_flag(card, 'hint_used') for card in cards), dtype=np.int64, count=count)
+        # Scheduled decks share a handful of review dates, so convert each distinct value once
+        positions = {}
+        indices = np.fromiter((positions.setdefault(card.next_review_date, len(positions)) for card in cards),
+                              dtype=np.intp, count=count)
+        distinct = np.array([_review_date(value) for value in positions], dtype='datetime64[us]')
+        self.review_dates = distinct[indices] if count else distinct
+
+    @classmethod
+    def from_counters(cls, right, wrong, hints, hint_used):
+        """
+        Build a deck from counter arrays, e.g. in a worker process that never sees the cards.
+
+        Returns:
+            DeckArrays: The deck, without review dates.
+        """
+        deck = cls.__new__(cls)
+        deck.right, deck.wrong, deck.hints, deck.hint_used = (np.asarray(counts, dtype=np.int64)
+                                                              for counts in (right, wrong, hints, hint_used))
+        deck.review_dates = np.full(len(deck.right), np.datetime64('NaT'), dtype='datetime64[us]')
+        return deck
+
+    def counters(self) -> tuple:
+        """
+        Returns:
+            tuple: The right, wrong, hints and hint_used arrays.
+        """
+        return self.right, self.wrong, self.hints, self.hint_used
+
+    def __len__(self) -> int:
+        return len(self.right)
+
+    def scores(self):
+        """
+        Returns:
+            ndarray: Score of every card, as Scheduler.calculate_score.
+        """
+        return self.right * 10 - self.wrong * 5 - self.hints * 2
+
+    def boxes(self, box_threshold):
+        """
+        Args:
+            box_threshold (list): Descending minimum scores of the boxes.
+
+        Returns:
+            ndarray: Box of every card, as Scheduler.determine_box.
+        """
+        thresholds = np.asarray(box_threshold)[::-1]
+        # Number of thresholds the score reaches; scores below the last threshold go to the last box
+        reached = np.searchsorted(thresholds, self.scores(), side='right')
+        return np.minimum(len(thresholds) - reached, len(thresholds) - 1)
 
 
 class Scheduler:
     """
     Simple daily review card scheduler inspider by Leitner System
     """
-    def __init__(self, cards):
+    def __init__(self, cards, box_intervals=None, box_threshold=None):
         self.cards = cards
-        self.box_intervals = [7, 4, 3, 2, 1]  # Review intervals in days (Intervals are split from 1 day -- 7 days interval) # Highest scoring cards are given lowest preference
+        self.box_intervals = list(box_intervals or BOX_INTERVALS)
         self.box_count = len(self.box_intervals)
-        self.box_threshold = [80, 60, 40, 20, 0]  # Different score thresholds
+        self.box_threshold = list(box_threshold or BOX_THRESHOLD)
+        self._deck = None
+
+    @property
+    def deck(self) -> DeckArrays:
+        """
+        Counters and review dates of ``cards`` as arrays, built on first use.
+        """
+        if self._deck is None:
+            self._deck = DeckArrays(self.cards)
+        return self._deck
 
     def schedule_cards(self):
         """
         Schedule card for review based in their parameters
         Returns updated cards list with next review date set
         """
-        for card in self.cards:
-            next_review_date = self.calculate_next_review_date(card)
-            card.next_review_date = next_review_date
+        now = datetime.datetime.now(datetime.timezone.utc)
+        # Only box_count distinct dates exist, so build them once and index by box
+        box_dates = [now + datetime.timedelta(days=interval_days) for interval_days in self.box_intervals]
+        for card, box in zip(self.cards, self.deck.boxes(self.box_threshold).tolist()):
+            card.next_review_date = box_dates[box]
+        self._deck = None
         return self.cards
 
+    def next_review_dates(self, now=None):
+        """
+        Vectorized calculate_next_review_date for every card.
+
+        Args:
+            now (datetime, optional): Reference time. Defaults to the current UTC time.
+
+        Returns:
+            ndarray: Next review date of every card as datetime64[us] in UTC.
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        now = np.datetime64(now.astimezone(datetime.timezone.utc).replace(tzinfo=None), 'us')
+        intervals = np.asarray(self.box_intervals, dtype='timedelta64[D]')
+        return now + intervals[self.deck.boxes(self.box_threshold)]
+
     def calculate_next_review_date(self, card):
         """
         Calculate the next review date based on the card performance
@@ -38,9 +160,9 @@ class Scheduler:
         """
         Calculates card score based on card's statistics
         """
-        right = card.flags.get('right', 0)
-        wrong = card.flags.get('wrong', 0)
-        hints = card.flags.get('hints', 0)
+        right = _flag(card, 'right')
+        wrong = _flag(card, 'wrong')
+        hints = _flag(card, 'hints')
         score = right * 10 - wrong * 5 - hints * 2
         return score
 
@@ -58,24 +180,21 @@ class Scheduler:
                 return i
         return self.box_count - 1
 
-    def pick_card(self):
+    def pick_card(self, today=None):
         """
         Picks the card's based on the cards passed to the scheduler object
         Args:
-            Scheduler object
+            today (date, optional): The review day. Defaults to today in UTC.
         Returns:
             Picked cards : list
         """
-        today = datetime.datetime.now(datetime.timezone.utc).date()
-        review_dates = defaultdict(list)
-        for card in self.cards:
-            if card.next_review_date and card.next_review_date.date() <= today:
-                review_dates[card.next_review_date].append(card)
-        if review_dates:
-            picked_cards = []
-            for date in sorted(review_dates.keys()):
-                picked_cards.extend(review_dates[date])
-            return picked_cards
+        today = np.datetime64(today or datetime.datetime.now(datetime.timezone.utc).date(), 'D')
+        review_dates = self.deck.review_dates
+        due = np.flatnonzero(review_dates.astype('datetime64[D]') <= today)  # NaT never compares true
+        if len(due):
+            # Stable, so cards due at the same time keep their deck order
+            order = due[np.argsort(review_dates[due], kind='stable')]
+            return [self.cards[i] for i in order.tolist()]
 
         # IF NO CARDS ARE FOUND TO BE SCHEDULED FOR REVIEW ON A DAY
         # PICK A CARD FROM LEST SCORED BOX
@@ -90,11 +209,9 @@ class Scheduler:
         Return:
             Least scored cards in the available boxes: list
         """
-        least_scored_cards = []
-        for card in self.cards:
-            current_box = self.determine_box(card)
-            if current_box == self.box_count - 1:  # Select the box_interval of last date __ or __
-                least_scored_cards.append(card)
+        boxes = self.deck.boxes(self.box_threshold)
+        # Select the box_interval of last date __ or __
+        least_scored_cards = [self.cards[i] for i in np.flatnonzero(boxes == self.box_count - 1).tolist()]
         # Sorting least_scored_cards by last review date (ascending) before picking
         least_scored_cards.sort(key=lambda x: x.timestamp or datetime.datetime.min)
         return least_scored_cards
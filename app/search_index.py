@@ -0,0 +1,163 @@
+"""
+Per-author inverted index answering full-text card searches
+"""
+import bisect
+import heapq
+import math
+import re
+
+# Weight of one occurrence of a term in each searched field
+FIELD_WEIGHTS = (('question', 3), ('answer', 1), ('hint', 1))
+# Share of the score a term earns when it only starts with a query token
+PREFIX_WEIGHT = 0.5
+
+_TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text) -> list:
+    """
+    Args:
+        text (str): Any text, may be None.
+
+    Returns:
+        list: The case-folded words of the text, in order.
+    """
+    return _TOKEN.findall(text.casefold()) if text else []
+
+
+def card_terms(fields) -> dict:
+    """
+    Args:
+        fields (tuple): The card's question, answer and hint.
+
+    Returns:
+        dict: Weight of every term of the card, as FIELD_WEIGHTS.
+    """
+    terms = {}
+    for (name, weight), text in zip(FIELD_WEIGHTS, fields):
+        for term in tokenize(text):
+            terms[term] = terms.get(term, 0) + weight
+    return terms
+
+
+class SearchIndex:
+    """
+    Postings of every term of an author's questions, answers and hints.
+
+    A query matches the cards holding, for each of its tokens, a term equal to or
+    starting with the token. Cards are ranked by the sum over the tokens of the
+    best matching term's weight in the card times its inverse document frequency;
+    prefix matches count PREFIX_WEIGHT of an exact one. Terms are kept sorted, so a
+    prefix is expanded with one bisection. Edits re-index a single card.
+    """
+    def __init__(self, cards) -> None:
+        """
+        Build the index.
+
+        Args:
+            cards (list): The author's Card objects.
+        """
+        self._cards = {}
+        self._fields = {}  # card id -> the indexed (question, answer, hint)
+        self._postings = {}  # term -> {card id: weight}
+        for card in cards:
+            self._index(card)
+        self._terms = sorted(self._postings)
+
+    @staticmethod
+    def _fields_of(card) -> tuple:
+        return tuple(getattr(card, name) for name, weight in FIELD_WEIGHTS)
+
+    def _index(self, card) -> list:
+        """
+        Post the card's terms, returning the terms new to the index.
+        """
+        fields = self._fields[card.id] = self._fields_of(card)
+        self._cards[card.id] = card
+        new_terms = []
+        for term, weight in card_terms(fields).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                new_terms.append(term)
+            postings[card.id] = weight
+        return new_terms
+
+    def add(self, card) -> None:
+        """
+        Args:
+            card (Card): A card new to the index.
+        """
+        for term in self._index(card):
+            bisect.insort(self._terms, term)
+
+    def remove(self, card) -> None:
+        """
+        Args:
+            card (Card): A card in the index.
+        """
+        self._cards.pop(card.id, None)
+        fields = self._fields.pop(card.id, None)
+        if fields is None:
+            return
+        for term in card_terms(fields):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(card.id, None)
+            if not postings:
+                del self._postings[term]
+                position = bisect.bisect_left(self._terms, term)
+                if position < len(self._terms) and self._terms[position] == term:
+                    del self._terms[position]
+
+    def update(self, card) -> None:
+        """
+        Args:
+            card (Card): A card in the index whose fields may have changed.
+        """
+        if self._fields.get(card.id) != self._fields_of(card):
+            self.remove(card)
+            self.add(card)
+
+    def _expand(self, token):
+        position = bisect.bisect_left(self._terms, token)
+        while position < len(self._terms) and self._terms[position].startswith(token):
+            yield self._terms[position]
+            position += 1
+
+    def search(self, query, limit=None) -> list:
+        """
+        Get the cards matching every token of a query, best first.
+
+        Args:
+            query (str): Words to search for, each one also matching as a prefix.
+            limit (int, optional): Maximum number of cards. Defaults to None (all).
+
+        Returns:
+            list: Card objects by descending score, then by id.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        count = len(self._cards)
+        scores = None
+        for token in tokens:
+            matches = {}
+            for term in self._expand(token):
+                postings = self._postings[term]
+                weight = math.log(1 + count / len(postings)) * (1 if term == token else PREFIX_WEIGHT)
+                for card_id, term_weight in postings.items():
+                    score = weight * term_weight
+                    if (scores is None or card_id in scores) and score > matches.get(card_id, 0):
+                        matches[card_id] = score
+            if scores is not None:
+                matches = {card_id: score + scores[card_id] for card_id, score in matches.items()}
+            scores = matches
+            if not scores:
+                return []
+        if limit is None:
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        else:
+            ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [self._cards[card_id] for card_id, score in ranked]
@@ -0,0 +1,78 @@
+// Buffers the answers of a game and sends them to /api/reviews in batches: every
+// FLUSH_EVERY answers, every FLUSH_INTERVAL_MS and when the user leaves the game.
+// The buffer lives in sessionStorage, so it survives moving between cards.
+var ReviewBuffer = (function () {
+  var KEY = 'pendingReviews';
+  var FLUSH_EVERY = 10;
+  var FLUSH_INTERVAL_MS = 30000;
+  var staying = false;
+
+  function pending() {
+    try {
+      return JSON.parse(sessionStorage.getItem(KEY)) || [];
+    } catch (error) {
+      return [];
+    }
+  }
+
+  function store(reviews) {
+    sessionStorage.setItem(KEY, JSON.stringify(reviews));
+  }
+
+  function flush(onExit) {
+    var reviews = pending();
+    if (!reviews.length) {
+      return;
+    }
+    var body = JSON.stringify({reviews: reviews});
+    store([]);
+    if (onExit && navigator.sendBeacon) {
+      if (!navigator.sendBeacon('/api/reviews', new Blob([body], {type: 'application/json'}))) {
+        store(reviews.concat(pending()));
+      }
+      return;
+    }
+    fetch('/api/reviews', {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: body,
+      keepalive: true
+    })
+    .then(function (response) {
+      // Keep the answers for the next flush unless the server rejected them
+      if (response.status >= 500) {
+        store(reviews.concat(pending()));
+      }
+    })
+    .catch(function () {
+      store(reviews.concat(pending()));
+    });
+  }
+
+  function add(cardId, flag, responseMs) {
+    var reviews = pending();
+    reviews.push({card_id: cardId, flag: flag, timestamp: new Date().toISOString(), response_ms: responseMs});
+    store(reviews);
+    if (reviews.length >= FLUSH_EVERY) {
+      flush(false);
+    }
+  }
+
+  // Call when a link to the previous or next card is about to load it: the buffer
+  // is kept across that navigation instead of being flushed on pagehide
+  function stayInGame() {
+    staying = true;
+  }
+
+  setInterval(function () { flush(false); }, FLUSH_INTERVAL_MS);
+  window.addEventListener('pagehide', function () {
+    if (!staying) {
+      flush(true);
+    }
+  });
+  window.addEventListener('pageshow', function () {
+    staying = false;
+  });
+
+  return {add: add, flush: flush, stayInGame: stayInGame};
+})();
@@ -0,0 +1,33 @@
+"""
+Pluggable persistence for cards and users, selected by ``Config.STORAGE_BACKEND``
+"""
+from app.storage.base import StorageBackend
+from app.storage.json_backend import JsonBackend
+from app.storage.mmap_backend import MmapBackend
+from app.storage.sharded_backend import ShardedJsonBackend
+from app.storage.sqlite_backend import SqliteBackend
+
+BACKENDS = {
+    'json': JsonBackend,
+    'mmap': MmapBackend,
+    'sharded': ShardedJsonBackend,
+    'sqlite': SqliteBackend,
+}
+
+
+def create_storage(config, card_factory) -> StorageBackend:
+    """
+    Build the storage backend named by ``config.STORAGE_BACKEND``.
+
+    Args:
+        config (Config): The application configuration.
+        card_factory (callable): Builds a Card object from one card record.
+
+    Returns:
+        StorageBackend: The configured backend.
+    """
+    try:
+        backend = BACKENDS[config.STORAGE_BACKEND]
+    except KeyError:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{config.STORAGE_BACKEND}', expected one of {sorted(BACKENDS)}")
+    return backend.from_config(config, card_factory)
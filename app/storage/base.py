@@ -0,0 +1,399 @@
+"""
+Interface shared by all storage backends
+"""
+import contextlib
+
+from app.aggregates import topic_totals
+from app.card_order import CARD_ORDERS
+from app.search_index import SearchIndex
+from app.topic_index import TopicIndex, normalize_topic
+from app.scheduler import Scheduler
+
+
+class StorageBackend:
+    """
+    Persistence for cards and users.
+
+    Reads return Card objects built by the backend's card factory, writes take plain
+    card records (the dicts stored in card_data.json). User records are dicts with
+    ``email`` and ``password_hash`` keys, keyed by username.
+    """
+    def __init__(self, card_factory) -> None:
+        """
+        Args:
+            card_factory (callable): Builds a Card object from one card record.
+        """
+        self.card_factory = card_factory
+
+    # Cards
+    # -----
+    def load_cards(self) -> list:
+        """
+        Returns:
+            list: Every Card object in the store.
+        """
+        raise NotImplementedError
+
+    def save_cards(self, records, expected_version=None) -> None:
+        """
+        Replace every card in the store.
+
+        Args:
+            records (list): Card records to store.
+            expected_version (int, optional): Only write if the deck is still at this version.
+
+        Raises:
+            ConflictError: If ``expected_version`` is given and the deck changed since.
+        """
+        raise NotImplementedError
+
+    def version(self) -> int:
+        """
+        Returns:
+            int: Deck version, increases monotonically with every card write from any worker.
+        """
+        raise NotImplementedError
+
+    def cards_by_author(self, author_id) -> list:
+        """
+        Args:
+            author_id (str): The ID of the author.
+
+        Returns:
+            list: The author's Card objects.
+        """
+        raise NotImplementedError
+
+    def cards_by_author_topic(self, author_id, topic) -> list:
+        """
+        Args:
+            author_id (str): The ID of the author.
+            topic (str): The exact topic to filter by.
+
+        Returns:
+            list: The author's Card objects for the topic.
+        """
+        raise NotImplementedError
+
+    def cards_page(self, author_id, order='id', topic=None, after=None, before=None, limit=None) -> list:
+        """
+        One page of the author's cards in a stable order, found by keyset: the page
+        starts right after the sort key of the previous page's last card (or ends
+        right before the next page's first card), so no page skips over the ones
+        before it.
+
+        Backends with an in-memory repository answer this from a sorted index; this
+        default sorts all of the author's cards.
+
+        Args:
+            author_id (str): The ID of the author.
+            order (str, optional): A key of app.card_order.CARD_ORDERS, ``'id'`` sorts by
+                ``(id,)`` and ``'topic'`` by ``(topic, id)``. Defaults to 'id'.
+            topic (str, optional): Only cards of this topic, ``'topic'`` order only. Defaults to None.
+            after (tuple, optional): Sort key the page starts after. Defaults to None.
+            before (tuple, optional): Sort key the page ends before. Defaults to None.
+            limit (int, optional): Maximum number of cards to return. Defaults to None (all).
+
+        Returns:
+            list: The page's Card objects in sort order.
+
+        Raises:
+            ValueError: If ``topic`` is given for the ``'id'`` order.
+        """
+        cards = self.cards_by_author(author_id) if topic is None else self.cards_by_author_topic(author_id, topic)
+        return CARD_ORDERS[order](cards).page(after=after, before=before, limit=limit, topic=topic)
+
+    def search_cards(self, author_id, query, limit=None) -> list:
+        """
+        Full-text search of the author's questions, answers and hints.
+
+        Every word of the query must start a word of the card; see
+        app.search_index.SearchIndex for the ranking. Backends with an in-memory
+        repository keep the inverted index up to date; this default builds it from
+        all of the author's cards.
+
+        Args:
+            author_id (str): The ID of the author.
+            query (str): Words to search for.
+            limit (int, optional): Maximum number of cards to return. Defaults to None (all).
+
+        Returns:
+            list: The matching Card objects, best first.
+        """
+        return SearchIndex(self.cards_by_author(author_id)).search(query, limit=limit)
+
+    def rebuild_search_index(self) -> None:
+        """
+        Rebuild the full-text search index from the stored cards. Backends that
+        build it from the cards on load have nothing to rebuild.
+        """
+
+    def author_version(self, author_id) -> str:
+        """
+        Version of one author's cards, for staleness checks of data derived from them.
+
+        The token changes whenever one of the author's cards changes and is only
+        meant to be compared for equality. This default is the whole deck's version,
+        so any card write changes the token of every author.
+
+        Args:
+            author_id (str): The ID of the author.
+
+        Returns:
+            str: Opaque version token.
+        """
+        return str(self.version())
+
+    def pick_for_review(self, author_id, offset=0, limit=None, today=None, topic=None) -> tuple:
+        """
+        The author's cards Scheduler.pick_card would pick, in review order.
+
+        Backends with an in-memory repository answer this from a due index; this
+        default runs the Scheduler over all of the author's cards (of the topic).
+
+        Args:
+            author_id (str): The ID of the author.
+            offset (int, optional): Number of picked cards to skip. Defaults to 0.
+            limit (int, optional): Maximum number of cards to return. Defaults to None (all).
+            today (date, optional): The review day. Defaults to today in UTC.
+            topic (str, optional): Only pick among the cards of this topic, in any case
+                or spacing. Defaults to None.
+
+        Returns:
+            tuple: The requested Card objects and the total number of picked cards.
+        """
+        picked = Scheduler(self._topic_cards(author_id, topic)).pick_card(today=today)
+        end = None if limit is None else offset + limit
+        return picked[offset:end], len(picked)
+
+    def _topic_cards(self, author_id, topic) -> list:
+        """
+        The author's cards of a topic in any case or spacing, all of them for None.
+        """
+        cards = self.cards_by_author(author_id)
+        if topic is None:
+            return cards
+        key = normalize_topic(topic)
+        return [card for card in cards if normalize_topic(card.topic) == key]
+
+    def topic_counts(self, author_id, today=None) -> dict:
+        """
+        Number of cards and of cards due per topic, topics compared case-insensitively.
+
+        Backends with an in-memory repository keep these in a topic index; this
+        default counts all of the author's cards.
+
+        Args:
+            author_id (str): The ID of the author.
+            today (date, optional): The review day of the due counts. Defaults to today in UTC.
+
+        Returns:
+            dict: ``{'cards': .., 'due': ..}`` keyed by topic, see app.topic_index.TopicIndex.counts.
+        """
+        return TopicIndex(self.cards_by_author(author_id)).counts(today=today)
+
+    def card_authors(self) -> list:
+        """
+        Returns:
+            list: IDs of every author with at least one card, sorted.
+        """
+        return sorted({card.author_id for card in self.load_cards()})
+
+    def set_review_dates(self, author_id, dates) -> None:
+        """
+        Store the next review dates of many of an author's cards in one write.
+
+        Args:
+            author_id (str): The owner of the cards.
+            dates (dict): ISO 8601 review dates keyed by card id.
+        """
+        for card_id, review_date in dates.items():
+            self.update_card(card_id, {'next_review_date': review_date}, author_id=author_id)
+
+    def topic_stats(self, author_id) -> dict:
+        """
+        The author's right/wrong/hint totals and card count per topic.
+
+        Args:
+            author_id (str): The ID of the author.
+
+        Returns:
+            dict: ``{'right': .., 'wrong': .., 'hints': .., 'cards': ..}`` keyed by topic.
+        """
+        return topic_totals(self.cards_by_author(author_id))
+
+    def rebuild_topic_stats(self) -> None:
+        """
+        Recompute materialized topic totals from the cards. Backends that derive
+        them from the cards on load have nothing to rebuild.
+        """
+
+    def card(self, card_id, author_id=None):
+        """
+        Args:
+            card_id (int): The unique identifier of the card.
+            author_id (str, optional): Only return the card if it belongs to this author.
+                Lets backends go straight to the author's cards.
+
+        Returns:
+            Card: The Card object if found, otherwise None.
+        """
+        raise NotImplementedError
+
+    def allocate_card_ids(self, count=1) -> range:
+        """
+        Reserve ids for new cards. Ids are unique across workers and never reused.
+
+        Args:
+            count (int, optional): Number of ids, e.g. for a bulk insert. Defaults to 1.
+
+        Returns:
+            range: The reserved ids.
+        """
+        raise NotImplementedError
+
+    def add_card(self, record) -> None:
+        """
+        Args:
+            record (dict): The card record to insert.
+        """
+        raise NotImplementedError
+
+    def add_cards(self, records) -> None:
+        """
+        Insert many cards as one write where the backend allows, e.g. for an import.
+
+        Args:
+            records (list): The card records to insert, with ids already allocated.
+        """
+        for record in records:
+            self.add_card(record)
+
+    def bulk_insert(self, author_id):
+        """
+        Context manager around the add_cards calls of one bulk insert. Backends that
+        fold a log into a snapshot postpone that until the insert is done.
+
+        Args:
+            author_id (str): The author the cards are added for.
+        """
+        return contextlib.nullcontext()
+
+    def update_card(self, card_id, fields, author_id=None) -> None:
+        """
+        Args:
+            card_id (int): The unique identifier of the card.
+            fields (dict): Attributes to overwrite.
+            author_id (str, optional): Owner of the card, if known.
+        """
+        raise NotImplementedError
+
+    def record_answer(self, card_id, flag, author_id=None) -> None:
+        """
+        Args:
+            card_id (int): The unique identifier of the card.
+            flag (str): The review flag to increment.
+            author_id (str, optional): Owner of the card, if known.
+        """
+        raise NotImplementedError
+
+    def record_reviews(self, author_id, flag_counts, review_dates) -> None:
+        """
+        Apply a batch of answers to an author's cards in one write. Cards of other
+        authors are skipped.
+
+        This default falls back to one write per answer.
+
+        Args:
+            author_id (str): The owner of the cards.
+            flag_counts (dict): Flag increments keyed by ``(card id, flag)``.
+            review_dates (dict): New ISO 8601 review dates keyed by card id.
+        """
+        for (card_id, flag), count in flag_counts.items():
+            for _ in range(count):
+                self.record_answer(card_id, flag, author_id=author_id)
+        if review_dates:
+            self.set_review_dates(author_id, review_dates)
+
+    def delete_card(self, card_id, author_id=None) -> None:
+        """
+        Args:
+            card_id (int): The unique identifier of the card.
+            author_id (str, optional): Owner of the card, if known.
+        """
+        raise NotImplementedError
+
+    # Users
+    # -----
+    def load_users(self) -> dict:
+        """
+        Returns:
+            dict: User records keyed by username.
+        """
+        raise NotImplementedError
+
+    def get_user(self, username):
+        """
+        Args:
+            username (str): The username to look up.
+
+        Returns:
+            dict: The user record, None if there is no such user.
+        """
+        try:
+            return self.load_users().get(username)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def get_username_by_email(self, email):
+        """
+        Args:
+            email (str): The email address to look up.
+
+        Returns:
+            str: The username registered with the email, None if there is none.
+        """
+        try:
+            users = self.load_users()
+        except (FileNotFoundError, ValueError):
+            return None
+        return next((username for username, user in users.items() if user['email'] == email), None)
+
+    def save_users(self, users) -> None:
+        """
+        Replace every user in the store.
+
+        Args:
+            users (dict): User records keyed by username.
+        """
+        raise NotImplementedError
+
+    def save_user(self, username, record) -> None:
+        """
+        Insert or replace a single user without losing concurrent registrations.
+
+        Args:
+            username (str): The username of the user.
+            record (dict): The user record.
+        """
+        raise NotImplementedError
+
+    def add_user(self, username, record) -> None:
+        """
+        Insert a new user, atomically with the check that the username is free.
+
+        Args:
+            username (str): The username of the user.
+            record (dict): The user record.
+
+        Raises:
+            UsernameTakenError: If the username is already registered.
+        """
+        raise NotImplementedError
+
+    # Maintenance
+    # -----------
+    def compact(self) -> None:
+        """
+        Reclaim space and fold pending writes, if the backend needs it.
+        """
@@ -0,0 +1,175 @@
+"""
+Storage backend on top of card_data.json and user_data.json
+"""
+from app.idsequence import IdSequence
+from app.oplog import OpLogStore, review_ops
+from app.repository import CardRepository
+from app.storage.base import StorageBackend
+from app.user_store import JsonUserStore
+
+
+class JsonUserMixin:
+    """
+    Users kept in a single cached JSON file, shared by the JSON card backends.
+    Expects ``users`` to be a JsonUserStore set by the backend.
+    """
+    def load_users(self) -> dict:
+        return self.users.load()
+
+    def get_user(self, username):
+        return self.users.get(username)
+
+    def get_username_by_email(self, email):
+        return self.users.username_for_email(email)
+
+    def save_users(self, users) -> None:
+        self.users.save(users)
+
+    def save_user(self, username, record) -> None:
+        self.users.save_one(username, record)
+
+    def add_user(self, username, record) -> None:
+        self.users.add_one(username, record)
+
+
+class JsonBackend(JsonUserMixin, StorageBackend):
+    """
+    Cards live in a JSON snapshot plus operation log and are served from an indexed
+    in-memory repository; users live in a single JSON file.
+    """
+    store_class = OpLogStore
+    repository_class = CardRepository
+
+    def __init__(self, card_factory, card_path, user_path, max_cards=None,
+                 fsync_batch=32, fsync_interval=1.0, compact_threshold=10000, user_check_interval=1.0, id_block_size=1) -> None:
+        """
+        Initialize a JsonBackend.
+
+        Args:
+            card_factory (callable): Builds a Card object from one card record.
+            card_path (str): Path of the card snapshot.
+            user_path (str): Path of the user file.
+            max_cards (int, optional): Memory budget of the card repository. Defaults to None.
+            fsync_batch (int, optional): Log records per fsync. Defaults to 32.
+            fsync_interval (float, optional): Maximum seconds between log fsyncs. Defaults to 1.0.
+            compact_threshold (int, optional): Log length that triggers compaction. Defaults to 10000.
+            user_check_interval (float, optional): Seconds between user file change checks. Defaults to 1.0.
+            id_block_size (int, optional): Card ids reserved per worker at once. Defaults to 1.
+        """
+        super().__init__(card_factory)
+        self.users = JsonUserStore(user_path, check_interval=user_check_interval)
+        self.card_store = self.store_class(card_path,
+                                           fsync_batch=fsync_batch,
+                                           fsync_interval=fsync_interval,
+                                           compact_threshold=compact_threshold)
+        self.repository = self.repository_class(self.card_store, factory=card_factory, max_cards=max_cards)
+        self.card_ids = IdSequence(card_path + '.seq', seed=self._max_card_id, block_size=id_block_size)
+
+    @classmethod
+    def from_config(cls, config, card_factory):
+        return cls(card_factory,
+                   card_path=config.CARD_DATA_PATH,
+                   user_path=config.USER_DATA_PATH,
+                   max_cards=config.CARD_CACHE_MAX_CARDS,
+                   fsync_batch=config.CARD_LOG_FSYNC_BATCH,
+                   fsync_interval=config.CARD_LOG_FSYNC_INTERVAL,
+                   compact_threshold=config.CARD_LOG_COMPACT_RECORDS,
+                   user_check_interval=config.USER_CACHE_CHECK_INTERVAL,
+                   id_block_size=config.CARD_ID_BLOCK_SIZE)
+
+    # Cards
+    # -----
+    def load_cards(self) -> list:
+        return [self.card_factory(record) for record in self.card_store.load()]
+
+    def save_cards(self, records, expected_version=None) -> None:
+        self.card_store.write_snapshot(records, expected_version=expected_version)
+        self.repository.invalidate()
+        self.card_ids.ensure_above(max((record['id'] for record in records), default=0))
+
+    def version(self) -> int:
+        return self.card_store.version()
+
+    def cards_by_author(self, author_id) -> list:
+        return self.repository.get_by_author(author_id)
+
+    def cards_by_author_topic(self, author_id, topic) -> list:
+        return self.repository.get_by_author_topic(author_id, topic)
+
+    def cards_page(self, author_id, order='id', topic=None, after=None, before=None, limit=None) -> list:
+        return self.repository.cards_page(author_id, order=order, topic=topic, after=after, before=before, limit=limit)
+
+    def search_cards(self, author_id, query, limit=None) -> list:
+        return self.repository.search(author_id, query, limit=limit)
+
+    def rebuild_search_index(self) -> None:
+        self.repository.invalidate()
+
+    def author_version(self, author_id) -> str:
+        return self.repository.author_version(author_id)
+
+    def pick_for_review(self, author_id, offset=0, limit=None, today=None, topic=None) -> tuple:
+        return self.repository.pick_for_review(author_id, offset=offset, limit=limit, today=today, topic=topic)
+
+    def topic_counts(self, author_id, today=None) -> dict:
+        return self.repository.topic_counts(author_id, today=today)
+
+    def card_authors(self) -> list:
+        return self.repository.authors()
+
+    def set_review_dates(self, author_id, dates) -> None:
+        self.card_store.append({'op': 'schedule', 'author_id': author_id, 'dates': list(dates.items())})
+
+    def topic_stats(self, author_id) -> dict:
+        return self.repository.topic_stats(author_id)
+
+    def rebuild_topic_stats(self) -> None:
+        self.repository.invalidate()
+
+    def card(self, card_id, author_id=None):
+        card = self.repository.get(card_id)
+        if card is None or (author_id is not None and card.author_id != author_id):
+            return None
+        return card
+
+    def _max_card_id(self) -> int:
+        # Only used once, to start the id sequence of an existing deck
+        return max((record['id'] for record in self.card_store.load()), default=0)
+
+    def allocate_card_ids(self, count=1) -> range:
+        return self.card_ids.allocate(count)
+
+    def add_card(self, record) -> None:
+        self.card_store.append({'op': 'add', 'card': record})
+
+    def add_cards(self, records) -> None:
+        if records:
+            self.card_store.append_many([{'op': 'add', 'card': record} for record in records])
+
+    def bulk_insert(self, author_id):
+        return self.card_store.compaction_deferred()
+
+    def _owned(self, card_id, author_id) -> bool:
+        return author_id is None or self.card(card_id, author_id) is not None
+
+    def update_card(self, card_id, fields, author_id=None) -> None:
+        if self._owned(card_id, author_id):
+            self.card_store.append({'op': 'edit', 'id': card_id, 'fields': fields})
+
+    def record_answer(self, card_id, flag, author_id=None) -> None:
+        if self._owned(card_id, author_id):
+            self.card_store.append({'op': 'flag', 'id': card_id, 'flag': flag, 'delta': 1})
+
+    def record_reviews(self, author_id, flag_counts, review_dates) -> None:
+        ops = review_ops(author_id, flag_counts, review_dates, lambda card_id: self._owned(card_id, author_id))
+        if ops:
+            self.card_store.append_many(ops)
+
+    def delete_card(self, card_id, author_id=None) -> None:
+        if self._owned(card_id, author_id):
+            self.card_store.append({'op': 'delete', 'id': card_id})
+
+    # Maintenance
+    # -----------
+    def compact(self) -> None:
+        self.card_store.compact()
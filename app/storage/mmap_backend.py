@@ -0,0 +1,27 @@
+"""
+Storage backend on top of a memory-mapped binary card snapshot
+"""
+from app.binary_snapshot import BinaryOpLogStore, MmapCardRepository
+from app.storage.json_backend import JsonBackend
+
+
+class MmapBackend(JsonBackend):
+    """
+    Like JsonBackend, but the card snapshot is the binary format of
+    app.binary_snapshot. Workers map the file instead of parsing it and only decode
+    the partitions of the authors they serve; the operation log is unchanged.
+    """
+    store_class = BinaryOpLogStore
+    repository_class = MmapCardRepository
+
+    @classmethod
+    def from_config(cls, config, card_factory):
+        return cls(card_factory,
+                   card_path=config.CARD_BINARY_PATH,
+                   user_path=config.USER_DATA_PATH,
+                   max_cards=config.CARD_CACHE_MAX_CARDS,
+                   fsync_batch=config.CARD_LOG_FSYNC_BATCH,
+                   fsync_interval=config.CARD_LOG_FSYNC_INTERVAL,
+                   compact_threshold=config.CARD_LOG_COMPACT_RECORDS,
+                   user_check_interval=config.USER_CACHE_CHECK_INTERVAL,
+                   id_block_size=config.CARD_ID_BLOCK_SIZE)
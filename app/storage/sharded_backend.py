@@ -0,0 +1,373 @@
+"""
+Storage backend with one card file per author
+
+Cards are partitioned into ``<shard_dir>/<author_id>.json``, each shard being its own
+snapshot + operation log with its own lock, so one author's writes never contend
+with, or slow down, another author's reads. A small append-only id index maps card
+ids to authors for the rare lookups that do not know the owner.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import quote, unquote
+
+from app.filelock import ConflictError, FileLock
+from app.idsequence import IdSequence
+from app.oplog import OpLogStore, review_ops
+from app.repository import CardRepository
+from app.storage.base import StorageBackend
+from app.storage.json_backend import JsonUserMixin
+from app.user_store import JsonUserStore
+
+SHARD_SUFFIX = '.json'
+ID_INDEX_NAME = '_ids.jsonl'
+ID_SEQUENCE_NAME = '_ids.seq'
+
+
+class CardIdIndex:
+    """
+    Append-only map from card id to author id.
+
+    Each line is ``{"id": 1, "author_id": "jan"}``; an ``author_id`` of null marks a
+    deleted card. The file is read incrementally, like the card operation log.
+
+    Attributes:
+        path (str): Path of the JSON lines index file.
+    """
+    def __init__(self, path) -> None:
+        self.path = path
+        self.lock = FileLock(path + '.lock')
+        self._thread_lock = threading.Lock()
+        self._authors = {}
+        self._offset = 0
+        self._inode = None
+
+    def _refresh(self) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._authors, self._offset, self._inode = {}, 0, None
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # Index was rewritten, start over
+            self._authors, self._offset, self._inode = {}, 0, stat.st_ino
+        if stat.st_size == self._offset:
+            return
+        with open(self.path, 'rb') as file:
+            file.seek(self._offset)
+            data = file.read()
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            entry = json.loads(line)
+            if entry['author_id'] is None:
+                self._authors.pop(entry['id'], None)
+            else:
+                self._authors[entry['id']] = entry['author_id']
+        self._offset += end
+
+    def author_of(self, card_id):
+        """
+        Args:
+            card_id (int): The unique identifier of the card.
+
+        Returns:
+            str: The author of the card, None if unknown.
+        """
+        with self._thread_lock:
+            self._refresh()
+            return self._authors.get(card_id)
+
+    def _append(self, card_id, author_id) -> None:
+        self._append_many([(card_id, author_id)])
+
+    def _append_many(self, entries) -> None:
+        with self.lock.acquire():
+            with open(self.path, 'a') as file:
+                file.write(''.join(json.dumps({'id': card_id, 'author_id': author_id}) + '\n'
+                                   for card_id, author_id in entries))
+
+    def add(self, card_id, author_id) -> None:
+        self._append(card_id, author_id)
+
+    def add_many(self, entries) -> None:
+        """
+        Args:
+            entries (list): (card id, author id) pairs of new cards.
+        """
+        self._append_many(entries)
+
+    def remove(self, card_id) -> None:
+        self._append(card_id, None)
+
+    def rewrite(self, authors) -> None:
+        """
+        Replace the index with the given mapping, dropping deleted entries.
+
+        Args:
+            authors (dict): Author ids keyed by card id.
+        """
+        with self.lock.acquire():
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as file:
+                for card_id, author_id in authors.items():
+                    file.write(json.dumps({'id': card_id, 'author_id': author_id}) + '\n')
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+
+    def compact(self) -> None:
+        """
+        Rewrite the index without the history of deleted cards.
+        """
+        with self.lock.acquire():
+            self.rewrite(self.mapping())
+
+    def mapping(self) -> dict:
+        """
+        Returns:
+            dict: Author ids keyed by card id.
+        """
+        with self._thread_lock:
+            self._refresh()
+            return dict(self._authors)
+
+
+class _Shard:
+    """
+    The card store and in-memory repository of one author.
+    """
+    def __init__(self, path, card_factory, store_options) -> None:
+        self.store = OpLogStore(path, **store_options)
+        self.repository = CardRepository(self.store, factory=card_factory)
+
+
+class ShardedJsonBackend(JsonUserMixin, StorageBackend):
+    """
+    Per-author card shards plus the shared JSON user file.
+
+    Open shards are kept in LRU order; when more than ``max_open_shards`` are open,
+    or the cards cached by all open shards exceed ``max_cards``, the least recently
+    used shards are closed.
+    """
+    def __init__(self, card_factory, shard_dir, user_path, max_cards=None, max_open_shards=256,
+                 fsync_batch=32, fsync_interval=1.0, compact_threshold=10000, user_check_interval=1.0, id_block_size=1) -> None:
+        """
+        Initialize a ShardedJsonBackend.
+
+        Args:
+            card_factory (callable): Builds a Card object from one card record.
+            shard_dir (str): Directory holding one card file per author.
+            user_path (str): Path of the user file.
+            max_cards (int, optional): Memory budget across open shards. Defaults to None.
+            max_open_shards (int, optional): Shards kept open, each holding a log file handle. Defaults to 256.
+            fsync_batch (int, optional): Log records per fsync. Defaults to 32.
+            fsync_interval (float, optional): Maximum seconds between log fsyncs. Defaults to 1.0.
+            compact_threshold (int, optional): Log length that triggers compaction. Defaults to 10000.
+            user_check_interval (float, optional): Seconds between user file change checks. Defaults to 1.0.
+            id_block_size (int, optional): Card ids reserved per worker at once. Defaults to 1.
+        """
+        super().__init__(card_factory)
+        self.shard_dir = shard_dir
+        self.users = JsonUserStore(user_path, check_interval=user_check_interval)
+        self.max_cards = max_cards
+        self.max_open_shards = max_open_shards
+        self.store_options = {'fsync_batch': fsync_batch,
+                              'fsync_interval': fsync_interval,
+                              'compact_threshold': compact_threshold}
+        os.makedirs(shard_dir, exist_ok=True)
+        self.ids = CardIdIndex(os.path.join(shard_dir, ID_INDEX_NAME))
+        self.card_ids = IdSequence(os.path.join(shard_dir, ID_SEQUENCE_NAME),
+                                   seed=lambda: max(self.ids.mapping(), default=0),
+                                   block_size=id_block_size)
+        self._shards = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, card_factory):
+        return cls(card_factory,
+                   shard_dir=config.CARD_SHARD_DIR,
+                   user_path=config.USER_DATA_PATH,
+                   max_cards=config.CARD_CACHE_MAX_CARDS,
+                   max_open_shards=config.CARD_MAX_OPEN_SHARDS,
+                   fsync_batch=config.CARD_LOG_FSYNC_BATCH,
+                   fsync_interval=config.CARD_LOG_FSYNC_INTERVAL,
+                   compact_threshold=config.CARD_LOG_COMPACT_RECORDS,
+                   user_check_interval=config.USER_CACHE_CHECK_INTERVAL,
+                   id_block_size=config.CARD_ID_BLOCK_SIZE)
+
+    def shard_path(self, author_id) -> str:
+        """
+        Args:
+            author_id (str): The ID of the author.
+
+        Returns:
+            str: Path of the author's shard snapshot.
+        """
+        return os.path.join(self.shard_dir, quote(author_id, safe='') + SHARD_SUFFIX)
+
+    def authors(self) -> list:
+        """
+        Returns:
+            list: IDs of every author that has a shard, sorted.
+        """
+        authors = set()
+        for name in os.listdir(self.shard_dir):
+            # A new author's shard may only consist of its log until the first compaction
+            if name.endswith(SHARD_SUFFIX + '.log'):
+                name = name[:-len('.log')]
+            if name.endswith(SHARD_SUFFIX):
+                authors.add(unquote(name[:-len(SHARD_SUFFIX)]))
+        return sorted(authors)
+
+    def _shard(self, author_id) -> _Shard:
+        with self._lock:
+            shard = self._shards.get(author_id)
+            if shard is None:
+                shard = _Shard(self.shard_path(author_id), self.card_factory, self.store_options)
+                self._shards[author_id] = shard
+            self._shards.move_to_end(author_id)
+            self._evict()
+            return shard
+
+    def _evict(self) -> None:
+        while len(self._shards) > max(self.max_open_shards, 1):
+            author_id, shard = self._shards.popitem(last=False)
+            shard.store.close()
+        if self.max_cards is None:
+            return
+        while len(self._shards) > 1 and sum(shard.repository.cached_cards for shard in self._shards.values()) > self.max_cards:
+            author_id, shard = self._shards.popitem(last=False)
+            shard.store.close()
+
+    def _owner(self, card_id, author_id):
+        return author_id if author_id is not None else self.ids.author_of(card_id)
+
+    # Cards
+    # -----
+    def load_cards(self) -> list:
+        return [self.card_factory(record) for author_id in self.authors() for record in self._shard(author_id).store.load()]
+
+    def save_cards(self, records, expected_version=None) -> None:
+        """
+        Replace every shard. The version check is per deck, not atomic across shards,
+        so concurrent single-card writes may still interleave with a full rewrite.
+        """
+        if expected_version is not None and self.version() != expected_version:
+            raise ConflictError(f'Deck changed since version {expected_version}')
+        grouped = OrderedDict()
+        for record in records:
+            grouped.setdefault(record['author_id'], []).append(record)
+        for author_id in self.authors():
+            if author_id not in grouped:
+                grouped[author_id] = []
+        for author_id, author_records in grouped.items():
+            shard = self._shard(author_id)
+            shard.store.write_snapshot(author_records)
+            shard.repository.invalidate()
+        self.ids.rewrite({record['id']: record['author_id'] for record in records})
+        self.card_ids.ensure_above(max((record['id'] for record in records), default=0))
+
+    def version(self, author_id=None) -> int:
+        if author_id is not None:
+            return FileLock(self.shard_path(author_id) + '.lock').version()
+        return sum(FileLock(self.shard_path(author) + '.lock').version() for author in self.authors())
+
+    def cards_by_author(self, author_id) -> list:
+        return self._shard(author_id).repository.get_by_author(author_id)
+
+    def cards_by_author_topic(self, author_id, topic) -> list:
+        return self._shard(author_id).repository.get_by_author_topic(author_id, topic)
+
+    def cards_page(self, author_id, order='id', topic=None, after=None, before=None, limit=None) -> list:
+        return self._shard(author_id).repository.cards_page(author_id, order=order, topic=topic,
+                                                            after=after, before=before, limit=limit)
+
+    def search_cards(self, author_id, query, limit=None) -> list:
+        return self._shard(author_id).repository.search(author_id, query, limit=limit)
+
+    def rebuild_search_index(self) -> None:
+        self._invalidate_shards()
+
+    def author_version(self, author_id) -> str:
+        # Every write to a shard bumps the shard's own version, compaction does not
+        return str(self.version(author_id))
+
+    def pick_for_review(self, author_id, offset=0, limit=None, today=None, topic=None) -> tuple:
+        return self._shard(author_id).repository.pick_for_review(author_id, offset=offset, limit=limit, today=today,
+                                                                 topic=topic)
+
+    def topic_counts(self, author_id, today=None) -> dict:
+        return self._shard(author_id).repository.topic_counts(author_id, today=today)
+
+    def card_authors(self) -> list:
+        return self.authors()
+
+    def set_review_dates(self, author_id, dates) -> None:
+        self._shard(author_id).store.append({'op': 'schedule', 'author_id': author_id, 'dates': list(dates.items())})
+
+    def topic_stats(self, author_id) -> dict:
+        return self._shard(author_id).repository.topic_stats(author_id)
+
+    def rebuild_topic_stats(self) -> None:
+        self._invalidate_shards()
+
+    def _invalidate_shards(self) -> None:
+        with self._lock:
+            shards = list(self._shards.values())
+        for shard in shards:
+            shard.repository.invalidate()
+
+    def card(self, card_id, author_id=None):
+        owner = self._owner(card_id, author_id)
+        if owner is None:
+            return None
+        return self._shard(owner).repository.get(card_id)
+
+    def allocate_card_ids(self, count=1) -> range:
+        return self.card_ids.allocate(count)
+
+    def add_card(self, record) -> None:
+        self._shard(record['author_id']).store.append({'op': 'add', 'card': record})
+        self.ids.add(record['id'], record['author_id'])
+
+    def add_cards(self, records) -> None:
+        by_author = {}
+        for record in records:
+            by_author.setdefault(record['author_id'], []).append(record)
+        for author_id, author_records in by_author.items():
+            self._shard(author_id).store.append_many([{'op': 'add', 'card': record} for record in author_records])
+        if records:
+            self.ids.add_many([(record['id'], record['author_id']) for record in records])
+
+    def bulk_insert(self, author_id):
+        return self._shard(author_id).store.compaction_deferred()
+
+    def update_card(self, card_id, fields, author_id=None) -> None:
+        owner = self._owner(card_id, author_id)
+        if owner is not None:
+            self._shard(owner).store.append({'op': 'edit', 'id': card_id, 'fields': fields})
+
+    def record_answer(self, card_id, flag, author_id=None) -> None:
+        owner = self._owner(card_id, author_id)
+        if owner is not None:
+            self._shard(owner).store.append({'op': 'flag', 'id': card_id, 'flag': flag, 'delta': 1})
+
+    def record_reviews(self, author_id, flag_counts, review_dates) -> None:
+        shard = self._shard(author_id)
+        ops = review_ops(author_id, flag_counts, review_dates, lambda card_id: shard.repository.get(card_id) is not None)
+        if ops:
+            shard.store.append_many(ops)
+
+    def delete_card(self, card_id, author_id=None) -> None:
+        owner = self._owner(card_id, author_id)
+        if owner is not None and self._shard(owner).repository.get(card_id) is not None:
+            self._shard(owner).store.append({'op': 'delete', 'id': card_id})
+            self.ids.remove(card_id)
+
+    # Maintenance
+    # -----------
+    def compact(self) -> None:
+        for author_id in self.authors():
+            self._shard(author_id).store.compact()
+        self.ids.compact()
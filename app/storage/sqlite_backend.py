@@ -0,0 +1,554 @@
+"""
+Storage backend on top of the instance SQLite database
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from app.aggregates import STAT_FLAGS
+from app.filelock import ConflictError
+from app.search_index import FIELD_WEIGHTS, tokenize
+from app.storage.base import StorageBackend
+from app.topic_index import merge_topic_counts, normalize_topic
+from app.user_store import UsernameTakenError
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    id INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    hint TEXT,
+    author_id TEXT NOT NULL,
+    timestamp TEXT,
+    flags TEXT NOT NULL DEFAULT '{}',
+    next_review_date TEXT
+);
+CREATE INDEX IF NOT EXISTS cards_author_topic ON cards (author_id, topic);
+CREATE INDEX IF NOT EXISTS cards_author ON cards (author_id);
+CREATE INDEX IF NOT EXISTS cards_author_review ON cards (author_id, next_review_date);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    password_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS topic_stats (
+    author_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    right_count INTEGER NOT NULL,
+    wrong_count INTEGER NOT NULL,
+    hint_count INTEGER NOT NULL,
+    card_count INTEGER NOT NULL,
+    PRIMARY KEY (author_id, topic)
+);
+CREATE TABLE IF NOT EXISTS author_versions (
+    author_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS cards_insert_version AFTER INSERT ON cards BEGIN
+    INSERT OR REPLACE INTO author_versions (author_id, version)
+    SELECT NEW.author_id, value FROM meta WHERE key = 'deck_version';
+END;
+CREATE TRIGGER IF NOT EXISTS cards_update_version AFTER UPDATE ON cards BEGIN
+    INSERT OR REPLACE INTO author_versions (author_id, version)
+    SELECT NEW.author_id, value FROM meta WHERE key = 'deck_version';
+END;
+CREATE TRIGGER IF NOT EXISTS cards_delete_version AFTER DELETE ON cards BEGIN
+    INSERT OR REPLACE INTO author_versions (author_id, version)
+    SELECT OLD.author_id, value FROM meta WHERE key = 'deck_version';
+END;
+CREATE VIRTUAL TABLE IF NOT EXISTS cards_search USING fts5(
+    question, answer, hint, content='cards', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS cards_insert_search AFTER INSERT ON cards BEGIN
+    INSERT INTO cards_search (rowid, question, answer, hint) VALUES (NEW.id, NEW.question, NEW.answer, NEW.hint);
+END;
+CREATE TRIGGER IF NOT EXISTS cards_update_search AFTER UPDATE OF question, answer, hint ON cards BEGIN
+    INSERT INTO cards_search (cards_search, rowid, question, answer, hint)
+    VALUES ('delete', OLD.id, OLD.question, OLD.answer, OLD.hint);
+    INSERT INTO cards_search (rowid, question, answer, hint) VALUES (NEW.id, NEW.question, NEW.answer, NEW.hint);
+END;
+CREATE TRIGGER IF NOT EXISTS cards_delete_search AFTER DELETE ON cards BEGIN
+    INSERT INTO cards_search (cards_search, rowid, question, answer, hint)
+    VALUES ('delete', OLD.id, OLD.question, OLD.answer, OLD.hint);
+END;
+INSERT OR IGNORE INTO meta (key, value) VALUES ('deck_version', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('topic_stats_built', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('search_built', 0);
+INSERT OR IGNORE INTO meta (key, value) SELECT 'card_id_seq', coalesce(max(id), 0) FROM cards;
+"""
+
+CARD_COLUMNS = ('id', 'topic', 'question', 'answer', 'hint', 'author_id', 'timestamp', 'flags', 'next_review_date')
+# Sort key columns of each card listing order; the indexes on (author_id, topic) and
+# (author_id) end with the rowid, so both orders are index scans
+ORDER_COLUMNS = {'id': ('id',), 'topic': ('topic', 'id')}
+# bm25 weights of the cards_search columns, as app.search_index.FIELD_WEIGHTS
+SEARCH_WEIGHTS = ', '.join(str(float(weight)) for name, weight in FIELD_WEIGHTS)
+# topic_stats column counting each card flag
+STAT_COLUMNS = {'right': 'right_count', 'wrong': 'wrong_count', 'hint_used': 'hint_count'}
+TOPIC_TOTALS = """
+INSERT INTO topic_stats (author_id, topic, right_count, wrong_count, hint_count, card_count)
+SELECT author_id, topic,
+       sum(coalesce(json_extract(flags, '$.right'), 0)),
+       sum(coalesce(json_extract(flags, '$.wrong'), 0)),
+       sum(coalesce(json_extract(flags, '$.hint_used'), 0)),
+       count(*)
+FROM cards {where} GROUP BY author_id, topic
+"""
+
+
+class ConnectionPool:
+    """
+    Small per-process pool of SQLite connections.
+
+    Connections are not shared across ``fork`` (gunicorn workers): a pool that
+    notices it now lives in a different process drops the inherited connections
+    and opens its own.
+
+    Attributes:
+        path (str): Path of the database file.
+        size (int): Maximum number of idle connections kept open.
+    """
+    def __init__(self, path, size=4) -> None:
+        self.path = path
+        self.size = size
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA foreign_keys=ON')
+        # INSERT OR REPLACE then fires the delete triggers of the replaced row
+        connection.execute('PRAGMA recursive_triggers=ON')
+        return connection
+
+    def _check_fork(self) -> None:
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._idle = queue.LifoQueue(maxsize=self.size)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a ``with`` block.
+
+        Yields:
+            sqlite3.Connection: An open connection in autocommit mode.
+        """
+        self._check_fork()
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = self._connect()
+        try:
+            yield connection
+        finally:
+            try:
+                self._idle.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Borrow a connection and run the ``with`` block in one write transaction.
+
+        ``BEGIN IMMEDIATE`` takes the database write lock up front, so concurrent
+        workers queue up instead of failing on lock upgrades.
+
+        Yields:
+            sqlite3.Connection: An open connection inside ``BEGIN IMMEDIATE``.
+        """
+        with self.connection() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+
+class SqliteBackend(StorageBackend):
+    """
+    Cards and users stored in SQLite (WAL mode) with indexes on
+    ``cards(author_id, topic)``, ``cards(author_id, next_review_date)`` and ``users(email)``.
+    Per-topic answer totals are materialized in ``topic_stats`` inside the same transactions,
+    and the FTS5 table ``cards_search`` indexes questions, answers and hints through triggers.
+    """
+    def __init__(self, card_factory, path, pool_size=4) -> None:
+        """
+        Initialize a SqliteBackend and create the schema if needed.
+
+        Args:
+            card_factory (callable): Builds a Card object from one card record.
+            path (str): Path of the database file.
+            pool_size (int, optional): Idle connections kept per worker. Defaults to 4.
+        """
+        super().__init__(card_factory)
+        self.pool = ConnectionPool(path, pool_size)
+        with self.pool.connection() as connection:
+            connection.executescript(SCHEMA)
+        with self.pool.transaction() as connection:
+            # Databases created before topic_stats existed
+            if not connection.execute("SELECT value FROM meta WHERE key = 'topic_stats_built'").fetchone()[0]:
+                self._rebuild_stats(connection)
+            # Databases created before cards_search existed
+            if not connection.execute("SELECT value FROM meta WHERE key = 'search_built'").fetchone()[0]:
+                self._rebuild_search(connection)
+
+    @classmethod
+    def from_config(cls, config, card_factory):
+        return cls(card_factory, path=config.SQLITE_PATH, pool_size=config.SQLITE_POOL_SIZE)
+
+    def _card(self, row):
+        record = dict(row)
+        record['flags'] = json.loads(record['flags'] or '{}')
+        return self.card_factory(record)
+
+    @staticmethod
+    def _row(record) -> tuple:
+        values = dict(record)
+        values['flags'] = json.dumps(values.get('flags') or {})
+        return tuple(values.get(column) for column in CARD_COLUMNS)
+
+    def _select(self, where='', params=()) -> list:
+        with self.pool.connection() as connection:
+            rows = connection.execute(f"SELECT {', '.join(CARD_COLUMNS)} FROM cards {where} ORDER BY id", params).fetchall()
+        return [self._card(row) for row in rows]
+
+    # Cards
+    # -----
+    def load_cards(self) -> list:
+        return self._select()
+
+    def save_cards(self, records, expected_version=None) -> None:
+        with self.pool.transaction() as connection:
+            if expected_version is not None and self._version(connection) != expected_version:
+                raise ConflictError(f'Deck changed since version {expected_version}')
+            connection.execute('DELETE FROM cards')
+            self._insert(connection, records)
+            self._rebuild_stats(connection)
+            self._bump_version(connection)
+
+    @staticmethod
+    def _version(connection) -> int:
+        return connection.execute("SELECT value FROM meta WHERE key = 'deck_version'").fetchone()[0]
+
+    @staticmethod
+    def _bump_version(connection) -> None:
+        connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'deck_version'")
+
+    def version(self) -> int:
+        with self.pool.connection() as connection:
+            return self._version(connection)
+
+    def author_version(self, author_id) -> str:
+        # The triggers on cards record the deck version every write to the author
+        # started from; every write bumps it afterwards, so no two writes share it
+        with self.pool.connection() as connection:
+            row = connection.execute('SELECT version FROM author_versions WHERE author_id = ?', (author_id,)).fetchone()
+        return str(row[0]) if row is not None else '-'
+
+    @staticmethod
+    def _rebuild_stats(connection) -> None:
+        connection.execute('DELETE FROM topic_stats')
+        connection.execute(TOPIC_TOTALS.format(where=''))
+        connection.execute("UPDATE meta SET value = 1 WHERE key = 'topic_stats_built'")
+
+    @staticmethod
+    def _refresh_stats(connection, groups) -> None:
+        """
+        Recompute the topic_stats rows of some (author_id, topic) pairs, using the
+        cards(author_id, topic) index.
+        """
+        for author_id, topic in set(groups):
+            connection.execute('DELETE FROM topic_stats WHERE author_id = ? AND topic = ?', (author_id, topic))
+            connection.execute(TOPIC_TOTALS.format(where='WHERE author_id = ? AND topic = ?'), (author_id, topic))
+
+    @staticmethod
+    def _add_stats(connection, records) -> None:
+        """
+        Add new cards to the topic_stats rows of their (author_id, topic) pairs without
+        rescanning the cards already counted there.
+        """
+        totals = {}
+        for record in records:
+            flags = record.get('flags') or {}
+            row = totals.setdefault((record['author_id'], record['topic']), [0, 0, 0, 0])
+            for position, (column, flag) in enumerate(STAT_FLAGS):
+                row[position] += flags.get(flag, 0)
+            row[3] += 1
+        connection.executemany('INSERT INTO topic_stats (author_id, topic, right_count, wrong_count, hint_count, card_count) '
+                               'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (author_id, topic) DO UPDATE SET '
+                               'right_count = right_count + excluded.right_count, '
+                               'wrong_count = wrong_count + excluded.wrong_count, '
+                               'hint_count = hint_count + excluded.hint_count, '
+                               'card_count = card_count + excluded.card_count',
+                               [(*group, *row) for group, row in totals.items()])
+
+    @staticmethod
+    def _groups(connection, where, params) -> list:
+        return [tuple(row) for row in connection.execute(f'SELECT author_id, topic FROM cards {where}', params)]
+
+    def card_authors(self) -> list:
+        with self.pool.connection() as connection:
+            return [row[0] for row in connection.execute('SELECT DISTINCT author_id FROM cards ORDER BY author_id')]
+
+    def set_review_dates(self, author_id, dates) -> None:
+        with self.pool.transaction() as connection:
+            connection.executemany('UPDATE cards SET next_review_date = ? WHERE id = ? AND author_id = ?',
+                                   [(review_date, card_id, author_id) for card_id, review_date in dates.items()])
+            self._bump_version(connection)
+
+    def topic_stats(self, author_id) -> dict:
+        with self.pool.connection() as connection:
+            rows = connection.execute('SELECT topic, right_count, wrong_count, hint_count, card_count FROM topic_stats '
+                                      'WHERE author_id = ? ORDER BY topic', (author_id,)).fetchall()
+        return {row['topic']: {'right': row['right_count'], 'wrong': row['wrong_count'],
+                               'hints': row['hint_count'], 'cards': row['card_count']} for row in rows}
+
+    def rebuild_topic_stats(self) -> None:
+        with self.pool.transaction() as connection:
+            self._rebuild_stats(connection)
+
+    def topic_counts(self, author_id, today=None) -> dict:
+        # Card counts come from topic_stats, due counts from the (author_id, next_review_date) index
+        today = today or datetime.now(timezone.utc).date()
+        with self.pool.connection() as connection:
+            due = dict(connection.execute("SELECT topic, count(*) FROM cards WHERE author_id = ? AND next_review_date <> '' "
+                                          "AND next_review_date < ? GROUP BY topic",
+                                          (author_id, (today + timedelta(days=1)).isoformat())).fetchall())
+        return merge_topic_counts({topic: {'cards': stats['cards'], 'due': due.get(topic, 0)}
+                                   for topic, stats in self.topic_stats(author_id).items()})
+
+    def _topic_cards(self, author_id, topic) -> list:
+        if topic is None:
+            return self.cards_by_author(author_id)
+        # Read every spelling of the topic through the (author_id, topic) index
+        key = normalize_topic(topic)
+        spellings = [spelling for spelling in self.topic_stats(author_id) if normalize_topic(spelling) == key]
+        if not spellings:
+            return []
+        placeholders = ', '.join('?' for spelling in spellings)
+        return self._select(f'WHERE author_id = ? AND topic IN ({placeholders})', (author_id, *spellings))
+
+    @staticmethod
+    def _rebuild_search(connection) -> None:
+        connection.execute("INSERT INTO cards_search (cards_search) VALUES ('rebuild')")
+        connection.execute("UPDATE meta SET value = 1 WHERE key = 'search_built'")
+
+    def rebuild_search_index(self) -> None:
+        with self.pool.transaction() as connection:
+            self._rebuild_search(connection)
+
+    def search_cards(self, author_id, query, limit=None) -> list:
+        # cards_search covers every author, the author filter applies to its matches
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = ' '.join(f'"{token}"*' for token in dict.fromkeys(tokens))
+        columns = ', '.join(f'cards.{column}' for column in CARD_COLUMNS)
+        with self.pool.connection() as connection:
+            rows = connection.execute(f'SELECT {columns} FROM cards_search JOIN cards ON cards.id = cards_search.rowid '
+                                      f'WHERE cards_search MATCH ? AND cards.author_id = ? '
+                                      f'ORDER BY bm25(cards_search, {SEARCH_WEIGHTS}), cards.id LIMIT ?',
+                                      (match, author_id, -1 if limit is None else limit)).fetchall()
+        return [self._card(row) for row in rows]
+
+    @staticmethod
+    def _insert(connection, records, verb='INSERT OR REPLACE') -> None:
+        placeholders = ', '.join('?' for column in CARD_COLUMNS)
+        connection.executemany(f"{verb} INTO cards ({', '.join(CARD_COLUMNS)}) VALUES ({placeholders})",
+                               [SqliteBackend._row(record) for record in records])
+
+    def cards_by_author(self, author_id) -> list:
+        return self._select('WHERE author_id = ?', (author_id,))
+
+    def cards_by_author_topic(self, author_id, topic) -> list:
+        return self._select('WHERE author_id = ? AND topic = ?', (author_id, topic))
+
+    def cards_page(self, author_id, order='id', topic=None, after=None, before=None, limit=None) -> list:
+        columns = ORDER_COLUMNS[order]
+        if topic is not None and columns[0] != 'topic':
+            raise ValueError(f'The {order!r} order cannot be restricted to a topic')
+        conditions, params = ['author_id = ?'], [author_id]
+        if topic is not None:
+            # Within one topic the id alone orders the cards; a (topic, id) row value
+            # next to topic = ? would make SQLite sort the rows instead of scanning the index
+            conditions.append('topic = ?')
+            params.append(topic)
+            columns = ('id',)
+            after, before = self._id_bound(after, topic, True), self._id_bound(before, topic, False)
+            if after == () or before == ():
+                return []
+        key = f"({', '.join(columns)})"
+        placeholders = f"({', '.join('?' for column in columns)})"
+        if after is not None:
+            conditions.append(f'{key} > {placeholders}')
+            params.extend(after)
+        if before is not None:
+            conditions.append(f'{key} < {placeholders}')
+            params.extend(before)
+        # A page ending before a key is the last rows before it, read backwards
+        direction = 'DESC' if before is not None else 'ASC'
+        sort = ', '.join(f'{column} {direction}' for column in columns)
+        params.append(-1 if limit is None else limit)
+        with self.pool.connection() as connection:
+            rows = connection.execute(f"SELECT {', '.join(CARD_COLUMNS)} FROM cards WHERE {' AND '.join(conditions)} "
+                                      f"ORDER BY {sort} LIMIT ?", params).fetchall()
+        cards = [self._card(row) for row in rows]
+        return cards[::-1] if before is not None else cards
+
+    @staticmethod
+    def _id_bound(key, topic, lower):
+        """
+        Reduce a (topic, id) cursor to an id cursor within one topic.
+
+        Returns:
+            tuple: ``(id,)``, None if the cursor bounds no card of the topic, ``()`` if it excludes them all.
+        """
+        if key is None or (key[0] < topic if lower else key[0] > topic):
+            return None
+        if key[0] != topic:
+            return ()
+        return (key[1],)
+
+    @staticmethod
+    def _match(card_id, author_id) -> tuple:
+        if author_id is None:
+            return 'WHERE id = ?', (card_id,)
+        return 'WHERE id = ? AND author_id = ?', (card_id, author_id)
+
+    def card(self, card_id, author_id=None):
+        cards = self._select(*self._match(card_id, author_id))
+        return cards[0] if cards else None
+
+    def allocate_card_ids(self, count=1) -> range:
+        with self.pool.transaction() as connection:
+            # max(id) keeps ids created by save_cards or older versions from being reused
+            connection.execute("UPDATE meta SET value = max(value, (SELECT coalesce(max(id), 0) FROM cards)) + ? "
+                               "WHERE key = 'card_id_seq'", (count,))
+            last = connection.execute("SELECT value FROM meta WHERE key = 'card_id_seq'").fetchone()[0]
+        return range(last - count + 1, last + 1)
+
+    def add_card(self, record) -> None:
+        with self.pool.transaction() as connection:
+            self._insert(connection, [record])
+            self._refresh_stats(connection, [(record['author_id'], record['topic'])])
+            self._bump_version(connection)
+
+    def add_cards(self, records) -> None:
+        if not records:
+            return
+        with self.pool.transaction() as connection:
+            # New ids only, so the cards can be added to topic_stats instead of recounting the topics
+            self._insert(connection, records, verb='INSERT')
+            self._add_stats(connection, records)
+            self._bump_version(connection)
+
+    def update_card(self, card_id, fields, author_id=None) -> None:
+        fields = {name: value for name, value in fields.items() if name in CARD_COLUMNS and name != 'id'}
+        if 'flags' in fields:
+            fields['flags'] = json.dumps(fields['flags'])
+        if not fields:
+            return
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        where, params = self._match(card_id, author_id)
+        with self.pool.transaction() as connection:
+            groups = self._groups(connection, where, params)
+            connection.execute(f'UPDATE cards SET {assignments} {where}', (*fields.values(), *params))
+            if 'topic' in fields or 'flags' in fields:
+                self._refresh_stats(connection, groups + self._groups(connection, where, params))
+            self._bump_version(connection)
+
+    def record_answer(self, card_id, flag, author_id=None) -> None:
+        path = '$."' + flag.replace('"', '') + '"'
+        where, params = self._match(card_id, author_id)
+        with self.pool.transaction() as connection:
+            connection.execute(f"UPDATE cards SET flags = json_set(flags, ?, coalesce(json_extract(flags, ?), 0) + 1) {where}",
+                               (path, path, *params))
+            column = STAT_COLUMNS.get(flag)
+            if column is not None:
+                connection.execute(f'UPDATE topic_stats SET {column} = {column} + 1 '
+                                   f'WHERE (author_id, topic) IN (SELECT author_id, topic FROM cards {where})', params)
+            self._bump_version(connection)
+
+    def record_reviews(self, author_id, flag_counts, review_dates) -> None:
+        with self.pool.transaction() as connection:
+            connection.executemany('UPDATE cards SET flags = json_set(flags, ?, coalesce(json_extract(flags, ?), 0) + ?) '
+                                   'WHERE id = ? AND author_id = ?',
+                                   [('$."' + flag.replace('"', '') + '"',) * 2 + (count, card_id, author_id)
+                                    for (card_id, flag), count in flag_counts.items()])
+            for flag, column in STAT_COLUMNS.items():
+                connection.executemany(f'UPDATE topic_stats SET {column} = {column} + ? WHERE (author_id, topic) IN '
+                                       f'(SELECT author_id, topic FROM cards WHERE id = ? AND author_id = ?)',
+                                       [(count, card_id, author_id)
+                                        for (card_id, answer_flag), count in flag_counts.items() if answer_flag == flag])
+            connection.executemany('UPDATE cards SET next_review_date = ? WHERE id = ? AND author_id = ?',
+                                   [(review_date, card_id, author_id) for card_id, review_date in review_dates.items()])
+            self._bump_version(connection)
+
+    def delete_card(self, card_id, author_id=None) -> None:
+        where, params = self._match(card_id, author_id)
+        with self.pool.transaction() as connection:
+            groups = self._groups(connection, where, params)
+            connection.execute(f'DELETE FROM cards {where}', params)
+            self._refresh_stats(connection, groups)
+            self._bump_version(connection)
+
+    # Users
+    # -----
+    def load_users(self) -> dict:
+        with self.pool.connection() as connection:
+            rows = connection.execute('SELECT username, email, password_hash FROM users').fetchall()
+        return {row['username']: {'email': row['email'], 'password_hash': row['password_hash']} for row in rows}
+
+    def get_user(self, username):
+        with self.pool.connection() as connection:
+            row = connection.execute('SELECT email, password_hash FROM users WHERE username = ?', (username,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def get_username_by_email(self, email):
+        with self.pool.connection() as connection:
+            row = connection.execute('SELECT username FROM users WHERE email = ?', (email,)).fetchone()
+        return row['username'] if row is not None else None
+
+    def save_users(self, users) -> None:
+        with self.pool.transaction() as connection:
+            connection.execute('DELETE FROM users')
+            connection.executemany('INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
+                                   [(username, user['email'], user['password_hash']) for username, user in users.items()])
+
+    def save_user(self, username, record) -> None:
+        with self.pool.transaction() as connection:
+            connection.execute('INSERT OR REPLACE INTO users (username, email, password_hash) VALUES (?, ?, ?)',
+                               (username, record['email'], record['password_hash']))
+
+    def add_user(self, username, record) -> None:
+        try:
+            with self.pool.transaction() as connection:
+                connection.execute('INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
+                                   (username, record['email'], record['password_hash']))
+        except sqlite3.IntegrityError:
+            raise UsernameTakenError(f'Username {username!r} is already registered')
+
+    # Maintenance
+    # -----------
+    def compact(self) -> None:
+        with self.pool.connection() as connection:
+            connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
@@ -0,0 +1,157 @@
+"""
+Frozen review queues for study sessions
+
+The queue of a game is computed once when it starts and then served page by page
+from memory, so paging and answering neither reload nor reschedule the deck, and
+the order cannot shift under the user mid-game.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+
+class StudySession:
+    """
+    One running game.
+
+    Attributes:
+        id (str): Random session id, kept in the user's Flask session.
+        user_id (str): The player.
+        topic (str): The topic played, None for a game over all cards.
+        card_ids (list): The frozen queue of card ids.
+        cursor (int): Index of the card shown last.
+        answered (set): Ids of the cards answered in this session.
+    """
+    def __init__(self, user_id, topic, card_ids) -> None:
+        self.id = secrets.token_urlsafe(16)
+        self.user_id = user_id
+        self.topic = topic
+        self.card_ids = list(card_ids)
+        self.cursor = 0
+        self.answered = set()
+        self.touched_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.card_ids)
+
+    def card_id_at(self, page) -> int:
+        """
+        Move the cursor to a page and return its card id.
+
+        Args:
+            page (int): 1-based page number, clamped to the queue.
+
+        Returns:
+            int: The id of the card on the page.
+        """
+        self.cursor = min(max(page, 1), len(self.card_ids)) - 1
+        return self.card_ids[self.cursor]
+
+    def window(self, page, limit, lookup) -> list:
+        """
+        Get the cards on consecutive pages without moving the cursor, dropping
+        cards that no longer exist from the queue.
+
+        Args:
+            page (int): 1-based first page.
+            limit (int): Maximum number of cards.
+            lookup (callable): Returns the card of a card id, None if it is gone.
+
+        Returns:
+            list: ``(page, card)`` pairs.
+        """
+        cards = []
+        position = max(page, 1) - 1
+        while len(cards) < limit and position < len(self.card_ids):
+            card_id = self.card_ids[position]
+            card = lookup(card_id)
+            if card is None:
+                self.drop(card_id)
+                continue
+            cards.append((position + 1, card))
+            position += 1
+        return cards
+
+    def drop(self, card_id) -> None:
+        """
+        Remove a card that no longer exists from the queue.
+
+        Args:
+            card_id (int): The unique identifier of the card.
+        """
+        if card_id in self.card_ids:
+            self.card_ids.remove(card_id)
+
+
+class SessionStore:
+    """
+    Bounded, per-process store of study sessions with LRU eviction.
+
+    Sessions live in the memory of the worker that started them. A request that
+    reaches another worker, or a session that was evicted or expired, simply starts
+    a new queue.
+
+    Attributes:
+        max_sessions (int): Sessions kept before the least recently used is evicted.
+        ttl (float): Seconds of inactivity after which a session expires.
+    """
+    def __init__(self, max_sessions=1000, ttl=3600.0) -> None:
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, user_id, topic, card_ids) -> StudySession:
+        """
+        Freeze a new queue.
+
+        Args:
+            user_id (str): The player.
+            topic (str): The topic played, None for all cards.
+            card_ids (list): The queue of card ids in review order.
+
+        Returns:
+            StudySession: The new session.
+        """
+        session = StudySession(user_id, topic, card_ids)
+        with self._lock:
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id, user_id, topic=None):
+        """
+        Look up a running session.
+
+        Args:
+            session_id (str): The session id, may be None.
+            user_id (str): The player, must match the session's.
+            topic (str, optional): The topic played, must match the session's.
+
+        Returns:
+            StudySession: The session, None if unknown, expired or not the user's.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            now = time.monotonic()
+            if now - session.touched_at > self.ttl:
+                del self._sessions[session_id]
+                return None
+            if session.user_id != user_id or session.topic != topic:
+                return None
+            session.touched_at = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+# Shared by every request handled by this worker process
+study_sessions = SessionStore(max_sessions=Config.STUDY_SESSION_MAX, ttl=Config.STUDY_SESSION_TTL)
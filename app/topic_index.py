@@ -0,0 +1,163 @@
+"""
+Per-author topic index with case-insensitive lookup and live per-topic counts
+"""
+from collections import Counter
+
+from app.due_index import DueIndex
+from app.scheduler import Scheduler
+
+
+def normalize_topic(topic) -> str:
+    """
+    Args:
+        topic (str): A topic as typed by a user.
+
+    Returns:
+        str: The lookup key of the topic: case-folded, with runs of whitespace collapsed.
+    """
+    return ' '.join(topic.split()).casefold()
+
+
+def display_topic(spellings) -> str:
+    """
+    Args:
+        spellings (Counter): Number of cards per spelling of one normalized topic.
+
+    Returns:
+        str: The spelling most cards use, the first in sort order on ties.
+    """
+    return min(spellings, key=lambda spelling: (-spellings[spelling], spelling))
+
+
+def merge_topic_counts(counts) -> dict:
+    """
+    Add up the counts of the spellings of each normalized topic.
+
+    Args:
+        counts (dict): ``{'cards': .., 'due': ..}`` keyed by exact topic.
+
+    Returns:
+        dict: The counts per normalized topic keyed by its display spelling, as TopicIndex.counts.
+    """
+    grouped = {}
+    for spelling, spelling_counts in counts.items():
+        spellings, totals = grouped.setdefault(normalize_topic(spelling), (Counter(), {'cards': 0, 'due': 0}))
+        spellings[spelling] += spelling_counts['cards']
+        for name in totals:
+            totals[name] += spelling_counts[name]
+    return {display_topic(spellings): totals for topic, (spellings, totals) in sorted(grouped.items())}
+
+
+class TopicIndex:
+    """
+    Cards of one author grouped by normalized topic, with a DueIndex per topic.
+
+    Card and due counts per topic are read off the per-topic indexes, and a game
+    over one topic picks from its DueIndex instead of scanning the deck. Answers,
+    edits and moves between topics re-key a single card.
+
+    Attributes:
+        scheduler (Scheduler): Supplies the scoring and box thresholds of every topic's DueIndex.
+    """
+    def __init__(self, cards, scheduler=None) -> None:
+        """
+        Build the index.
+
+        Args:
+            cards (list): The author's Card objects.
+            scheduler (Scheduler, optional): Scoring rules. Defaults to a Scheduler with the default boxes.
+        """
+        self.scheduler = scheduler or Scheduler([])
+        self._topic_of = {}  # card id -> (normalized topic, spelling)
+        self._spellings = {}  # normalized topic -> Counter of spellings
+        self._due = {}  # normalized topic -> DueIndex
+        grouped = {}
+        for card in cards:
+            key = self._topic_of[card.id] = (normalize_topic(card.topic), card.topic)
+            grouped.setdefault(key[0], []).append(card)
+            self._spellings.setdefault(key[0], Counter())[card.topic] += 1
+        for topic, topic_cards in grouped.items():
+            self._due[topic] = DueIndex(topic_cards, scheduler=self.scheduler)
+
+    def add(self, card) -> None:
+        """
+        Args:
+            card (Card): A card new to the index.
+        """
+        topic, spelling = self._topic_of[card.id] = (normalize_topic(card.topic), card.topic)
+        self._spellings.setdefault(topic, Counter())[spelling] += 1
+        due = self._due.get(topic)
+        if due is None:
+            due = self._due[topic] = DueIndex([], scheduler=self.scheduler)
+        due.add(card)
+
+    def remove(self, card) -> None:
+        """
+        Args:
+            card (Card): A card in the index.
+        """
+        key = self._topic_of.pop(card.id, None)
+        if key is None:
+            return
+        topic, spelling = key
+        spellings = self._spellings[topic]
+        spellings[spelling] -= 1
+        if not spellings[spelling]:
+            del spellings[spelling]
+        self._due[topic].remove(card)
+        if not spellings:
+            del self._spellings[topic]
+            del self._due[topic]
+
+    def update(self, card) -> None:
+        """
+        Args:
+            card (Card): A card in the index whose topic, flags or review date may have changed.
+        """
+        if self._topic_of.get(card.id) != (normalize_topic(card.topic), card.topic):
+            self.remove(card)
+            self.add(card)
+        else:
+            self._due[self._topic_of[card.id][0]].update(card)
+
+    def counts(self, today=None) -> dict:
+        """
+        Get the card and due counts of every topic.
+
+        Args:
+            today (date, optional): The review day of the due counts. Defaults to today in UTC.
+
+        Returns:
+            dict: ``{'cards': .., 'due': ..}`` keyed by each topic's display spelling, sorted case-insensitively.
+        """
+        counts = {topic: {'cards': len(due), 'due': due.due_count(today)} for topic, due in self._due.items()}
+        return {display_topic(self._spellings[topic]): counts[topic] for topic in sorted(counts)}
+
+    def card_ids(self, topic) -> list:
+        """
+        Args:
+            topic (str): A topic in any case or spacing.
+
+        Returns:
+            list: The ids of the topic's cards.
+        """
+        due = self._due.get(normalize_topic(topic))
+        return [card.id for card in due] if due is not None else []
+
+    def pick(self, topic, today=None, offset=0, limit=None) -> tuple:
+        """
+        The cards of a topic Scheduler.pick_card would pick, as DueIndex.pick.
+
+        Args:
+            topic (str): A topic in any case or spacing.
+            today (date, optional): The review day. Defaults to today in UTC.
+            offset (int, optional): Number of picked cards to skip. Defaults to 0.
+            limit (int, optional): Maximum number of cards to return. Defaults to None (all).
+
+        Returns:
+            tuple: The requested slice of picked Card objects and the total number of picked cards.
+        """
+        due = self._due.get(normalize_topic(topic))
+        if due is None:
+            return [], 0
+        return due.pick(today=today, offset=offset, limit=limit)
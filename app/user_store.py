@@ -0,0 +1,172 @@
+"""
+Process-level cache of the JSON user file with an email index
+"""
+import json
+import os
+import threading
+import time
+
+from app.filelock import FileLock, atomic_write_json
+
+
+class UsernameTakenError(Exception):
+    """
+    Raised when registering a username that already belongs to another user.
+    """
+
+
+class JsonUserStore:
+    """
+    Users kept in a single JSON file keyed by username.
+
+    The file is parsed once per change and kept in memory together with an
+    email -> username index. Whether the file changed (mtime, size, inode) is checked
+    at most every ``check_interval`` seconds, so the steady state of Flask-Login's
+    per-request user loader is a dict lookup without any file I/O. Writes from this
+    process update the cache directly.
+
+    Attributes:
+        path (str): Path of the user file.
+        check_interval (float): Seconds between checks for writes by other processes.
+    """
+    def __init__(self, path, check_interval=1.0) -> None:
+        """
+        Initialize a JsonUserStore.
+
+        Args:
+            path (str): Path of the user file.
+            check_interval (float, optional): Seconds between file change checks. Defaults to 1.0.
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self.lock = FileLock(path + '.lock')
+        self._thread_lock = threading.RLock()
+        self._users = None
+        self._by_email = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _remember(self, users) -> None:
+        self._users = users
+        self._by_email = {record['email']: username for username, record in users.items()}
+        self._version = self._file_version()
+        self._checked_at = time.monotonic()
+
+    def _refresh(self) -> None:
+        """
+        Reload the file if another process changed it.
+
+        Raises:
+            FileNotFoundError: If the user file does not exist.
+            json.JSONDecodeError: If the user file is corrupt.
+        """
+        now = time.monotonic()
+        if self._users is not None and now - self._checked_at < self.check_interval:
+            return
+        version = self._file_version()
+        self._checked_at = now
+        if self._users is not None and version == self._version:
+            return
+        with open(self.path, 'r') as file:
+            users = json.load(file)
+        self._remember(users)
+
+    def load(self) -> dict:
+        """
+        Returns:
+            dict: A copy of all user records keyed by username.
+
+        Raises:
+            FileNotFoundError: If the user file does not exist.
+            json.JSONDecodeError: If the user file is corrupt.
+        """
+        with self._thread_lock:
+            self._refresh()
+            return dict(self._users)
+
+    def get(self, username):
+        """
+        Args:
+            username (str): The username to look up.
+
+        Returns:
+            dict: The user record, None if unknown or the file is unreadable.
+        """
+        with self._thread_lock:
+            try:
+                self._refresh()
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+            return self._users.get(username)
+
+    def username_for_email(self, email):
+        """
+        Args:
+            email (str): The email address to look up.
+
+        Returns:
+            str: The username registered with the email, None if there is none.
+        """
+        with self._thread_lock:
+            try:
+                self._refresh()
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+            return self._by_email.get(email)
+
+    def save(self, users) -> None:
+        """
+        Replace every user.
+
+        Args:
+            users (dict): User records keyed by username.
+        """
+        with self._thread_lock, self.lock.acquire():
+            atomic_write_json(self.path, users)
+            self._remember(dict(users))
+
+    def save_one(self, username, record) -> None:
+        """
+        Insert or replace one user, re-reading the file under the lock first so
+        concurrent registrations in other workers are kept.
+
+        Args:
+            username (str): The username of the user.
+            record (dict): The user record.
+        """
+        self._write_one(username, record, replace=True)
+
+    def add_one(self, username, record) -> None:
+        """
+        Insert a new user. The check runs on the file re-read under the lock, so it
+        also sees registrations that other workers made since the cache was refreshed.
+
+        Args:
+            username (str): The username of the user.
+            record (dict): The user record.
+
+        Raises:
+            UsernameTakenError: If the username is already registered.
+        """
+        self._write_one(username, record, replace=False)
+
+    def _write_one(self, username, record, replace) -> None:
+        with self._thread_lock, self.lock.acquire():
+            try:
+                with open(self.path, 'r') as file:
+                    users = json.load(file)
+            except FileNotFoundError:
+                users = {}
+            if not replace and username in users:
+                self._remember(users)
+                raise UsernameTakenError(f'Username {username!r} is already registered')
+            users[username] = record
+            atomic_write_json(self.path, users)
+            self._remember(users)
@@ -1,30 +1,17 @@
-import json
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash
+from app.auth import authenticate, password_hasher
+from app.models import storage
 
 
 def update_user_json(user_details, user_status):
-    user_data = {}
-    try:
-        with open('user_data.json', 'r') as user_read_file:
-            user_data = json.load(user_read_file)
-    except Exception as exp:
-        print(f"Exception : {exp}")
-
     if user_status == 'register':
-        user_data[user_details['username']] = {
+        storage.add_user(user_details['username'], {
             'email': user_details['email'],
             'password_hash': generate_password_hash(user_details['password'])
-        }
-        with open('user_data.json', 'w') as user_write_file:
-            json.dump(user_data, user_write_file)
+        })
     elif user_status == 'login':
-        if user_details['username'] in list(user_data.keys()):
-            if check_password_hash(user_data[user_details['username']]['password_hash'], user_details['password']):
-                return "Valid"
-            else:
-                return "Entered Password is Wrong, Please Check"
-        else:
-            return "Username Not Found Please Register"
+        status, user_record = authenticate(password_hasher, storage, user_details['username'], user_details['password'])
+        return status
     return "Unknown Error"
 
 
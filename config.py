@@ -4,3 +4,67 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 
 class Config(object):
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
+    # Storage backend for cards and users: 'json' (card_data.json / user_data.json),
+    # 'mmap' (binary snapshot CARD_BINARY_PATH), 'sharded' (one card file per author
+    # in CARD_SHARD_DIR) or 'sqlite'
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json')
+    CARD_DATA_PATH = os.environ.get('CARD_DATA_PATH', 'card_data.json')
+    CARD_BINARY_PATH = os.environ.get('CARD_BINARY_PATH', 'card_data.bin')
+    CARD_SHARD_DIR = os.environ.get('CARD_SHARD_DIR', 'card_data')
+    USER_DATA_PATH = os.environ.get('USER_DATA_PATH', 'user_data.json')
+    SQLITE_PATH = os.environ.get('SQLITE_PATH') or os.path.join(basedir, 'instance', 'flaskr.sqlite')
+    SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 4))
+    # Upper bound of cards held by the in-memory card repository (0 = unbounded)
+    CARD_CACHE_MAX_CARDS = int(os.environ.get('CARD_CACHE_MAX_CARDS', 0)) or None
+    # Author shards the sharded backend keeps open, each with its own log file handle
+    CARD_MAX_OPEN_SHARDS = int(os.environ.get('CARD_MAX_OPEN_SHARDS', 256))
+    # Card writes are appended to card_data.json.log and folded into the snapshot in the background
+    CARD_LOG_FSYNC_BATCH = int(os.environ.get('CARD_LOG_FSYNC_BATCH', 32))
+    CARD_LOG_FSYNC_INTERVAL = float(os.environ.get('CARD_LOG_FSYNC_INTERVAL', 1.0))
+    CARD_LOG_COMPACT_RECORDS = int(os.environ.get('CARD_LOG_COMPACT_RECORDS', 10000))
+    # Card ids each worker reserves at once from the shared id sequence (1 = ids in creation order)
+    CARD_ID_BLOCK_SIZE = int(os.environ.get('CARD_ID_BLOCK_SIZE', 1))
+    # Seconds between checks whether another worker changed user_data.json
+    USER_CACHE_CHECK_INTERVAL = float(os.environ.get('USER_CACHE_CHECK_INTERVAL', 1.0))
+    # Password hashing runs on a bounded per-worker pool; logins beyond AUTH_MAX_PENDING get a 503
+    AUTH_HASH_WORKERS = int(os.environ.get('AUTH_HASH_WORKERS', 2))
+    AUTH_MAX_PENDING = int(os.environ.get('AUTH_MAX_PENDING', 8))
+    AUTH_TIMEOUT = float(os.environ.get('AUTH_TIMEOUT', 10.0))
+    # Password hashes in flight across all worker processes (lock files AUTH_SLOT_PATH.<n>);
+    # further logins get a 503, so a burst of them cannot occupy every sync worker
+    AUTH_MAX_HASHING = int(os.environ.get('AUTH_MAX_HASHING', 2))
+    AUTH_SLOT_PATH = os.environ.get('AUTH_SLOT_PATH', 'auth_slots.lock')
+    # Hashes made with another method or work factor are upgraded on the next successful login
+    AUTH_PASSWORD_METHOD = os.environ.get('AUTH_PASSWORD_METHOD', 'scrypt')
+    # Running games keep their frozen review queue in the worker's memory (LRU, idle expiry in seconds)
+    STUDY_SESSION_MAX = int(os.environ.get('STUDY_SESSION_MAX', 1000))
+    STUDY_SESSION_TTL = float(os.environ.get('STUDY_SESSION_TTL', 3600))
+    # Cards the study page prefetches per request to flip cards without a page load, and the cap per request
+    STUDY_PREFETCH_CARDS = int(os.environ.get('STUDY_PREFETCH_CARDS', 10))
+    STUDY_PREFETCH_MAX = int(os.environ.get('STUDY_PREFETCH_MAX', 50))
+    # Review scheduling: 'leitner', 'sm2' or 'fsrs'; answers and `flask reschedule` use it
+    SCHEDULER_ENGINE = os.environ.get('SCHEDULER_ENGINE', 'leitner')
+    # Due lists precomputed at each UTC day rollover (`flask precompute-due` or, with
+    # DUE_LIST_ROLLOVER=1, a thread in every worker) let the first game of the day skip picking
+    DUE_LIST_PATH = os.environ.get('DUE_LIST_PATH', 'due_lists.json')
+    DUE_LIST_ROLLOVER = os.environ.get('DUE_LIST_ROLLOVER', '0') == '1'
+    # Cards per page of the card listings (?limit= may ask for up to CARD_PAGE_MAX)
+    CARD_PAGE_SIZE = int(os.environ.get('CARD_PAGE_SIZE', 30))
+    CARD_PAGE_MAX = int(os.environ.get('CARD_PAGE_MAX', 200))
+    # Most cards a /cards/search query returns
+    SEARCH_RESULTS_MAX = int(os.environ.get('SEARCH_RESULTS_MAX', 50))
+    # Rendered card and listing markup each worker keeps for the card listings, in characters
+    FRAGMENT_CACHE_MAX_CHARS = int(os.environ.get('FRAGMENT_CACHE_MAX_CHARS', 8000000))
+    # Deck imports add cards in batches of IMPORT_BATCH_SIZE and report up to IMPORT_MAX_ERRORS rejected rows
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+    IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS', 100))
+    # Cards a deck export reads from storage at a time
+    EXPORT_PAGE_SIZE = int(os.environ.get('EXPORT_PAGE_SIZE', 1000))
+    # Most answers the study page may submit to /api/reviews in one request
+    REVIEW_BATCH_MAX = int(os.environ.get('REVIEW_BATCH_MAX', 200))
+    # gunicorn serving mode (gunicorn.conf.py): 'sync' workers serve one request at a time,
+    # 'threaded' workers up to SERVER_THREADS at once, so requests waiting on the disk
+    # do not hold up the others and idle keep-alive connections hold no thread
+    SERVING_MODE = os.environ.get('SERVING_MODE', 'sync')
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', 4))
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 64))
@@ -0,0 +1,17 @@
+"""
+gunicorn settings, read by ``gunicorn app:app`` from the working directory
+
+SERVING_MODE=threaded runs gthread workers: each process accepts connections on a
+poller and serves up to SERVER_THREADS requests at once on a thread pool. The
+storage layer blocks in flock, reads and fsync, which release the GIL, and keeps
+its per-process state behind thread locks, so the other requests of the process
+carry on meanwhile.
+"""
+from config import Config
+
+workers = Config.SERVER_WORKERS
+if Config.SERVING_MODE == 'threaded':
+    worker_class = 'gthread'
+    threads = Config.SERVER_THREADS
+elif Config.SERVING_MODE != 'sync':
+    raise ValueError(f"Unknown SERVING_MODE {Config.SERVING_MODE!r}, expected 'sync' or 'threaded'")
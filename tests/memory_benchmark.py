@@ -0,0 +1,57 @@
+"""
+Memory benchmark of in-memory card representations
+
+Compares the former plain Card (instance ``__dict__`` plus a flags dict per card)
+with the slotted Card, using tracemalloc. Run with ``python -m tests.memory_benchmark``.
+"""
+import gc
+import tracemalloc
+
+from app.models import Card
+
+
+class DictCard:
+    """
+    The card representation before Card used __slots__.
+    """
+    def __init__(self, id, topic, question, answer, author_id, hint=None, timestamp=None, flags=None, next_review_date=None):
+        self.id = id
+        self.topic = topic
+        self.question = question
+        self.hint = hint
+        self.answer = answer
+        self.author_id = author_id
+        self.timestamp = timestamp
+        self.flags = flags if flags is not None else {}
+        self.next_review_date = next_review_date
+
+
+def make_records(count) -> list:
+    # Shared strings, so only the per-card object overhead is measured
+    return [{'id': card_id, 'topic': 'Python', 'question': 'Q', 'answer': 'A', 'author_id': 'jan', 'hint': None,
+             'timestamp': '2024-06-09 12:34:17', 'flags': {'right': 3, 'wrong': 1} if card_id % 2 else {},
+             'next_review_date': None} for card_id in range(count)]
+
+
+def measure(factory, records) -> int:
+    gc.collect()
+    tracemalloc.start()
+    # Copy the flags too, as json.load would have created them per card
+    cards = [factory(dict(record, flags=dict(record['flags']))) for record in records]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del cards
+    return size
+
+
+def main(count=100000) -> None:
+    records = make_records(count)
+    before = measure(lambda record: DictCard(**record), records)
+    after = measure(Card.from_record, records)
+    print(f'{count} cards')
+    print(f'dict card:    {before / count:7.1f} bytes/card')
+    print(f'slotted card: {after / count:7.1f} bytes/card ({100 * (1 - after / before):.0f}% less)')
+
+
+if __name__ == '__main__':
+    main()
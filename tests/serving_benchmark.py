@@ -0,0 +1,167 @@
+"""
+Serving benchmark of the sync and threaded gunicorn modes (SERVING_MODE)
+
+Starts gunicorn on a throwaway copy of the data files for each mode and lets
+``--clients`` simulated players study at once: every player signs in, then
+alternates between showing the next card of their game and submitting an answer
+to /api/reviews, pausing ``--think-ms`` in between. Answers are ``hint_used``, which
+is logged without rescheduling the card, so decks never run out of due cards.
+``CARD_LOG_FSYNC_BATCH=1`` makes every answer wait for the disk; ``--data-dir``
+puts the files on the volume to measure. Run with ``python -m tests.serving_benchmark``.
+"""
+import argparse
+import http.client
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.security import generate_password_hash
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Cheap hashes, so signing in hundreds of players does not dominate the run
+PASSWORD_METHOD = 'pbkdf2:sha256:1000'
+
+
+def write_data(directory, users, cards_per_user) -> None:
+    password_hash = generate_password_hash('password', PASSWORD_METHOD)
+    with open(os.path.join(directory, 'user_data.json'), 'w') as file:
+        json.dump({f'player{user}': {'email': f'player{user}@example.com', 'password_hash': password_hash}
+                   for user in range(users)}, file)
+    cards = [{'id': user * cards_per_user + number + 1, 'topic': f'Topic {number % 5}', 'question': f'Question {number}?',
+              'answer': f'Answer {number}', 'hint': 'No hints available!', 'author_id': f'player{user}',
+              'timestamp': '2024-06-09 12:34:17', 'flags': {}, 'next_review_date': None}
+             for user in range(users) for number in range(cards_per_user)]
+    with open(os.path.join(directory, 'card_data.json'), 'w') as file:
+        json.dump(cards, file)
+
+
+def start_server(directory, mode, port, workers, threads) -> subprocess.Popen:
+    env = dict(os.environ, SERVING_MODE=mode, SERVER_WORKERS=str(workers), SERVER_THREADS=str(threads),
+               CARD_DATA_PATH=os.path.join(directory, 'card_data.json'),
+               USER_DATA_PATH=os.path.join(directory, 'user_data.json'),
+               DUE_LIST_PATH=os.path.join(directory, 'due_lists.json'),
+               AUTH_PASSWORD_METHOD=PASSWORD_METHOD, CARD_LOG_FSYNC_BATCH='1')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-b', f'127.0.0.1:{port}', '--log-level', 'warning',
+                               '--backlog', '2048', 'app:app'], cwd=ROOT, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('gunicorn did not start')
+
+
+class Player:
+    """
+    One simulated player with its own connection and session cookie.
+    """
+    def __init__(self, port, username) -> None:
+        self.port = port
+        self.username = username
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        self.cookies = {}
+
+    def request(self, method, path, body=None, content_type=None) -> tuple:
+        headers = {'Cookie': '; '.join(f'{name}={value}' for name, value in self.cookies.items())}
+        if content_type:
+            headers['Content-Type'] = content_type
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # Sync workers close the connection after every response
+            self.connection.close()
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        data = response.read()
+        for name, value in response.getheaders():
+            if name.lower() == 'set-cookie':
+                cookie_name, cookie_value = value.split(';', 1)[0].split('=', 1)
+                self.cookies[cookie_name] = cookie_value
+        return response.status, data
+
+    def sign_in(self) -> None:
+        status, page = self.request('GET', '/login')
+        token = re.search(rb'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1).decode()
+        body = f'csrf_token={token}&username={self.username}&password=password'
+        status, page = self.request('POST', '/login', body, 'application/x-www-form-urlencoded')
+        if status != 302:
+            raise RuntimeError(f'{self.username} could not sign in ({status})')
+
+
+def play(player, deadline, think, latencies, failures) -> None:
+    page = 1
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        status, data = player.request('GET', f'/start_game?page={page}')
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            failures.append(status)
+        match = re.search(rb'= \{id: (\d+),', data)
+        if match:
+            body = json.dumps({'reviews': [{'card_id': int(match.group(1)), 'flag': 'hint_used'}]})
+            start = time.perf_counter()
+            status, data = player.request('POST', '/api/reviews', body, 'application/json')
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                failures.append(status)
+        page = page % 20 + 1
+        time.sleep(think)
+
+
+def run(mode, clients, seconds, workers, threads, users, cards_per_user, port, think=0, data_dir=None) -> dict:
+    with tempfile.TemporaryDirectory(dir=data_dir) as directory:
+        write_data(directory, users, cards_per_user)
+        server = start_server(directory, mode, port, workers, threads)
+        try:
+            players = [Player(port, f'player{number % users}') for number in range(clients)]
+            for player in players:
+                player.sign_in()
+            latencies, failures = [], []
+            deadline = time.monotonic() + seconds
+            runners = [threading.Thread(target=play, args=(player, deadline, think, latencies, failures)) for player in players]
+            start = time.perf_counter()
+            for runner in runners:
+                runner.start()
+            for runner in runners:
+                runner.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+    latencies.sort()
+    return {'requests': len(latencies), 'rate': len(latencies) / elapsed, 'failures': len(failures),
+            'p50': statistics.median(latencies) * 1000, 'p99': latencies[int(len(latencies) * 0.99)] * 1000}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--cards-per-user', type=int, default=200)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--think-ms', type=float, default=0)
+    parser.add_argument('--data-dir', default=None)
+    args = parser.parse_args()
+    for mode in ('sync', 'threaded'):
+        result = run(mode, args.clients, args.seconds, args.workers, args.threads, args.users, args.cards_per_user,
+                     args.port, think=args.think_ms / 1000, data_dir=args.data_dir)
+        print(f"{mode:>8}: {result['requests']} requests, {result['rate']:,.0f} req/s, "
+              f"p50 {result['p50']:.1f} ms, p99 {result['p99']:.1f} ms, {result['failures']} failed")
+
+
+if __name__ == '__main__':
+    main()
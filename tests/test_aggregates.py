@@ -0,0 +1,25 @@
+from app.aggregates import TopicStats, topic_totals
+from app.models import Card
+
+
+def make_card(card_id, topic='Python', **flags):
+    return Card(id=card_id, topic=topic, question='Q', answer='A', author_id='jan', flags=flags)
+
+
+def test_incremental_totals_match_recomputed():
+    cards = [make_card(1, right=2), make_card(2, wrong=1, hint_used=3), make_card(3, topic='Go', right=1)]
+    stats = TopicStats(cards)
+    assert stats.totals() == topic_totals(cards) == {
+        'Python': {'right': 2, 'wrong': 1, 'hints': 3, 'cards': 2},
+        'Go': {'right': 1, 'wrong': 0, 'hints': 0, 'cards': 1},
+    }
+    cards[0].add_flag('wrong')
+    stats.update(cards[0])
+    cards[1].topic = 'Go'
+    stats.update(cards[1])
+    stats.remove(cards[2])
+    cards.pop()
+    cards.append(make_card(4, topic='Rust', show_answer=5))
+    stats.add(cards[-1])
+    assert stats.totals() == topic_totals(cards)
+    assert 'Rust' in stats.totals() and stats.totals()['Rust']['cards'] == 1
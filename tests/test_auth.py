@@ -0,0 +1,87 @@
+import multiprocessing
+import threading
+import pytest
+from werkzeug.security import check_password_hash, generate_password_hash
+from app import auth
+from app.auth import AuthBusyError, PasswordHasher, authenticate, method_prefix
+from app.filelock import FileSemaphore
+from app.models import Card
+from app.storage import JsonBackend
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = JsonBackend(Card.from_record, card_path=str(tmp_path / 'card_data.json'),
+                          user_path=str(tmp_path / 'user_data.json'), user_check_interval=0)
+    storage.save_user('jan', {'email': 'jan@thi.de', 'password_hash': generate_password_hash('secret', 'pbkdf2:sha256:1000')})
+    return storage
+
+
+def test_authenticate(storage):
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000')
+    assert authenticate(hasher, storage, 'jan', 'secret')[0] == 'Valid'
+    assert authenticate(hasher, storage, 'jan', 'wrong') == ('Entered Password is Wrong, Please Check', None)
+    assert authenticate(hasher, storage, 'ana', 'secret') == ('Username Not Found Please Register', None)
+
+
+def test_saturated_pool_rejects_fast():
+    hasher = PasswordHasher(max_workers=1, max_pending=1)
+    release = threading.Event()
+    blocked = hasher.submit(release.wait)
+    with pytest.raises(AuthBusyError):
+        hasher.verify('pbkdf2:sha256:1000$salt$hash', 'secret')
+    release.set()
+    blocked.result()
+    assert hasher.verify(generate_password_hash('secret', 'pbkdf2:sha256:1000'), 'secret')
+
+
+def _hold_slot(path, taken, release):
+    slot = FileSemaphore(path, 1).try_acquire()
+    taken.set()
+    release.wait(10)
+    FileSemaphore(path, 1).release(slot)
+
+
+def test_shared_slots_limit_hashing_across_processes(tmp_path):
+    path = str(tmp_path / 'auth_slots.lock')
+    context = multiprocessing.get_context('fork')
+    taken, release = context.Event(), context.Event()
+    worker = context.Process(target=_hold_slot, args=(path, taken, release))
+    worker.start()
+    assert taken.wait(10)
+    # A fresh hasher has free local slots, but the other worker holds the only shared one
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000', shared_slots=FileSemaphore(path, 1))
+    password_hash = generate_password_hash('secret', 'pbkdf2:sha256:1000')
+    with pytest.raises(AuthBusyError):
+        hasher.verify(password_hash, 'secret')
+    release.set()
+    worker.join(10)
+    assert hasher.verify(password_hash, 'secret')
+    # The slot is handed back once the hash is done
+    assert hasher.verify(password_hash, 'secret')
+
+
+def test_outdated_hash_is_upgraded_on_login(storage):
+    hasher = PasswordHasher(method='pbkdf2:sha256:2000')
+    assert authenticate(hasher, storage, 'jan', 'secret')[0] == 'Valid'
+    hasher._get_executor().shutdown(wait=True)
+    password_hash = storage.get_user('jan')['password_hash']
+    assert password_hash.startswith('pbkdf2:sha256:2000$')
+    assert check_password_hash(password_hash, 'secret')
+    assert not hasher.needs_rehash(password_hash)
+
+
+@pytest.mark.parametrize('method', ['scrypt', 'scrypt:16384:8:1', 'pbkdf2', 'pbkdf2:sha512', 'pbkdf2:sha256:1000'])
+def test_method_prefix_matches_werkzeug(method):
+    assert method_prefix(method) == generate_password_hash('secret', method).split('$', 1)[0]
+
+
+def test_needs_rehash_does_not_hash(monkeypatch):
+    hasher = PasswordHasher(method='scrypt')
+
+    def fail(*args):
+        raise AssertionError('hashed on the request thread')
+
+    monkeypatch.setattr(auth, 'generate_password_hash', fail)
+    assert hasher.needs_rehash('pbkdf2:sha256:1000$salt$hash')
+    assert not hasher.needs_rehash('scrypt:32768:8:1$salt$hash')
@@ -0,0 +1,49 @@
+from app.binary_snapshot import BinaryOpLogStore, BinarySnapshot, MmapCardRepository, write_binary_snapshot
+from app.models import CARD_SCHEMA_VERSION, Card
+
+
+def make_record(card_id, author_id='jan', topic='Python'):
+    return {'id': card_id, 'topic': topic, 'question': f'Q{card_id} ü', 'answer': f'A{card_id}',
+            'author_id': author_id, 'hint': None, 'timestamp': '2024-06-09 12:34:17', 'flags': {'right': card_id},
+            'next_review_date': None, 'schema': CARD_SCHEMA_VERSION}
+
+
+def stored(record):
+    # The binary layout is versioned as a whole (FORMAT_VERSION), records do not keep the schema key
+    return {name: value for name, value in record.items() if name != 'schema'}
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'card_data.bin')
+    records = [make_record(5), make_record(2, author_id='ana'), make_record(9), make_record(1, author_id='ana')]
+    write_binary_snapshot(path, records)
+    snapshot = BinarySnapshot(path)
+    try:
+        assert len(snapshot) == 4
+        assert snapshot.get(9) == stored(make_record(9))
+        assert snapshot.get(3) is None
+        assert snapshot.author_counts() == {'jan': 2, 'ana': 2}
+        assert [record['id'] for record in snapshot.records_for_author('ana')] == [2, 1]
+        assert snapshot.records_for_author('ola') == []
+        assert sorted(snapshot.records(), key=lambda record: record['id']) == sorted(map(stored, records), key=lambda record: record['id'])
+    finally:
+        snapshot.close()
+
+
+def test_repository_decodes_only_requested_author(tmp_path):
+    store = BinaryOpLogStore(str(tmp_path / 'card_data.bin'), compact_threshold=0)
+    store.write_snapshot([make_record(1), make_record(2, author_id='ana'), make_record(3)])
+    repository = MmapCardRepository(store, factory=Card.from_record)
+    store.append({'op': 'add', 'card': make_record(4, author_id='ana')})
+    store.append({'op': 'flag', 'id': 1, 'flag': 'right', 'delta': 1})
+    store.append({'op': 'delete', 'id': 3})
+
+    assert [card.id for card in repository.get_by_author('ana')] == [2, 4]
+    assert repository.cached_cards == 2
+    assert repository.get(1).flags == {'right': 2}
+    assert repository.get(3) is None
+    assert [card.id for card in repository.get_by_author('jan')] == [1]
+
+    store.compact()
+    assert [record['id'] for record in store.read_snapshot()] == [1, 2, 4]
+    assert repository.get(1).flags == {'right': 2}
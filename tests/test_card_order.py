@@ -0,0 +1,43 @@
+import pytest
+from app.card_order import IdOrder, TopicOrder
+from tests.test_due_index import by_id
+from tests.test_scheduler import make_deck
+
+
+def make_topic_deck(count):
+    cards = make_deck(count)
+    for card in cards:
+        card.topic = ('Rust', 'Go', 'Python')[card.id % 3]
+    return cards
+
+
+def test_pages_follow_sort_order():
+    cards = make_topic_deck(100)
+    index = TopicOrder(cards)
+    expected = by_id(sorted(cards, key=lambda card: (card.topic, card.id)))
+    first = index.page(limit=30)
+    second = index.page(after=TopicOrder.key(first[-1]), limit=30)
+    assert by_id(first + second) == expected[:60]
+    assert by_id(index.page(before=TopicOrder.key(second[0]), limit=30)) == expected[:30]
+    assert by_id(index.page(before=TopicOrder.key(second[0]), limit=5)) == expected[25:30]
+
+
+def test_topic_pages():
+    cards = make_topic_deck(100)
+    topic = 'Go'
+    index = TopicOrder(cards)
+    assert by_id(index.page(topic=topic)) == sorted(card.id for card in cards if card.topic == topic)
+    with pytest.raises(ValueError):
+        IdOrder(cards).page(topic=topic)
+
+
+def test_updates_are_incremental():
+    cards = make_topic_deck(20)
+    index = TopicOrder(cards)
+    cards[0].topic = 'AAA'
+    index.update(cards[0])
+    index.remove(cards[1])
+    assert index.page(limit=1) == [cards[0]]
+    assert cards[1] not in index.page()
+    index.add(cards[1])
+    assert len(index.page()) == 20
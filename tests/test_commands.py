@@ -0,0 +1,53 @@
+import json
+import pytest
+from app import app, commands
+from app.idsequence import IdSequence
+from app.models import CARD_SCHEMA_VERSION, Card
+from app.oplog import OpLogStore
+from app.storage import SqliteBackend
+
+
+def make_record(card_id, author_id='jan'):
+    return {'id': card_id, 'topic': 'Python', 'question': f'Q{card_id}', 'answer': f'A{card_id}',
+            'author_id': author_id, 'hint': None, 'timestamp': '2024-06-09 12:34:17', 'flags': {},
+            'next_review_date': None, 'schema': CARD_SCHEMA_VERSION}
+
+
+@pytest.fixture
+def storage(monkeypatch, tmp_path):
+    backend = SqliteBackend(Card.from_record, path=str(tmp_path / 'flaskr.sqlite'))
+    monkeypatch.setattr(commands, 'storage', backend)
+    return backend
+
+
+def test_import_json_replays_the_log(storage, tmp_path):
+    cards_path, users_path = str(tmp_path / 'card_data.json'), str(tmp_path / 'user_data.json')
+    store = OpLogStore(cards_path)
+    store.write_snapshot([make_record(1)])
+    store.append({'op': 'add', 'card': make_record(2)})
+    store.append({'op': 'flag', 'id': 1, 'flag': 'right', 'delta': 1})
+    store.close()
+    with open(users_path, 'w') as file:
+        json.dump({'jan': {'email': 'jan@example.com', 'password_hash': 'x'}}, file)
+    result = app.test_cli_runner().invoke(args=['import-json', '--cards', cards_path, '--users', users_path])
+    assert result.exit_code == 0, result.output
+    assert [card.id for card in storage.cards_by_author('jan')] == [1, 2]
+    assert storage.card(1).flags == {'right': 1}
+
+
+def test_export_json_replaces_the_json_store(storage, tmp_path):
+    cards_path, users_path = str(tmp_path / 'card_data.json'), str(tmp_path / 'user_data.json')
+    # An older JSON store at the target paths, with a log not yet compacted
+    store = OpLogStore(cards_path)
+    store.write_snapshot([make_record(1)])
+    store.append({'op': 'flag', 'id': 1, 'flag': 'right', 'delta': 1})
+    store.close()
+    storage.save_cards([dict(make_record(1), flags={'right': 1}), make_record(7)])
+    storage.save_users({'jan': {'email': 'jan@example.com', 'password_hash': 'x'}})
+    result = app.test_cli_runner().invoke(args=['export-json', '--cards', cards_path, '--users', users_path])
+    assert result.exit_code == 0, result.output
+    records = OpLogStore(cards_path).load()
+    assert [(record['id'], record['flags']) for record in records] == [(1, {'right': 1}), (7, {})]
+    assert IdSequence(cards_path + '.seq').allocate()[0] == 8
+    with open(users_path) as file:
+        assert list(json.load(file)) == ['jan']
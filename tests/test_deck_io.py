@@ -0,0 +1,95 @@
+import io
+import pytest
+from app import models
+from app.deck_io import DEFAULT_HINT, MAX_FIELD_CHARS, DeckFormatError, deck_format, export_deck, import_deck, text_lines
+from app.models import Card
+from app.storage import JsonBackend
+
+
+@pytest.fixture
+def storage(monkeypatch, tmp_path):
+    backend = JsonBackend(Card.from_record, card_path=str(tmp_path / 'card_data.json'),
+                          user_path=str(tmp_path / 'user_data.json'))
+    monkeypatch.setattr(models, 'storage', backend)
+    return backend
+
+
+def lines(text):
+    return text_lines(io.BytesIO(text.encode('utf-8')))
+
+
+def test_deck_format():
+    assert deck_format('csv') == 'csv'
+    assert deck_format('Spanish.JSONL') == 'jsonl'
+    assert deck_format('anki export.txt') == 'tsv'
+    with pytest.raises(DeckFormatError):
+        deck_format('deck.xlsx')
+    with pytest.raises(DeckFormatError):
+        deck_format(None)
+
+
+def test_import_csv(storage):
+    text = ('﻿Question,Answer,Topic,Source\n'
+            'Capital of Peru?,Lima,Geography,atlas\n'
+            '"Two\nlines?",yes,,\n'
+            'No answer?,,Geography,\n'
+            f'Too long?,{"x" * (MAX_FIELD_CHARS + 1)},,\n')
+    summary = import_deck(lines(text), 'csv', 'jan', default_topic='Misc', batch_size=1)
+    assert summary['imported'] == 2
+    assert summary['rejected'] == 2
+    assert summary['errors'] == [{'line': 5, 'error': 'answer is missing'},
+                                 {'line': 6, 'error': f'answer is longer than {MAX_FIELD_CHARS} characters'}]
+    assert summary['error'] is None
+    cards = storage.cards_by_author('jan')
+    assert [(card.topic, card.question, card.answer, card.hint) for card in cards] == [
+        ('Geography', 'Capital of Peru?', 'Lima', DEFAULT_HINT), ('Misc', 'Two\nlines?', 'yes', DEFAULT_HINT)]
+    assert len({card.id for card in cards}) == 2
+
+
+def test_import_csv_without_required_columns(storage):
+    summary = import_deck(lines('front,back\nQ,A\n'), 'csv', 'jan')
+    assert summary['imported'] == 0
+    assert 'question and answer' in summary['error']
+
+
+def test_import_jsonl(storage):
+    text = ('{"question": "Q1", "answer": "A1", "topic": "T", "hint": "H"}\n'
+            '\n'
+            'not json\n'
+            '[1, 2]\n'
+            '{"question": "Q2", "answer": 2}\n'
+            '{"question": "Q3", "answer": "A3"}\n')
+    summary = import_deck(lines(text), 'jsonl', 'jan', max_errors=2)
+    assert summary['imported'] == 2
+    assert summary['rejected'] == 3
+    assert [error['line'] for error in summary['errors']] == [3, 4]
+    assert [(card.question, card.hint, card.topic) for card in storage.cards_by_author('jan')] == [
+        ('Q1', 'H', 'T'), ('Q3', DEFAULT_HINT, 'Imported')]
+
+
+def test_import_tsv(storage):
+    text = '#separator:tab\n#html:true\nHola<br>amigo\tHello<br/>friend\tspanish\nAdios\tBye\n'
+    summary = import_deck(lines(text), 'tsv', 'jan')
+    assert summary['imported'] == 2
+    assert [(card.question, card.answer, card.topic) for card in storage.cards_by_author('jan')] == [
+        ('Hola\namigo', 'Hello\nfriend', 'spanish'), ('Adios', 'Bye', 'Imported')]
+
+
+def test_invalid_encoding_stops_the_import(storage):
+    summary = import_deck(text_lines(io.BytesIO(b'{"question": "Q", "answer": "A"}\n\xff\xfe\n')), 'jsonl', 'jan')
+    assert summary['imported'] == 1
+    assert summary['error']
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl', 'tsv'])
+def test_export_round_trip(storage, fmt):
+    cards = [Card(id=card_id, topic='T, "quoted"', question=f'Q{card_id}\n\tmore', answer=f'A{card_id}',
+                  hint=None if card_id == 2 else 'H', author_id='ana') for card_id in range(1, 6)]
+    chunks = list(export_deck(cards, fmt, chunk_cards=2))
+    assert len(chunks) == 3
+    summary = import_deck(lines(''.join(chunks)), fmt, 'jan')
+    assert summary['imported'] == 5
+    imported = storage.cards_by_author('jan')
+    assert [(card.topic, card.question, card.answer) for card in imported] == [
+        (card.topic, card.question, card.answer) for card in cards]
+    assert imported[1].hint == DEFAULT_HINT
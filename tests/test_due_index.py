@@ -0,0 +1,48 @@
+import datetime
+from app.due_index import DueIndex
+from app.scheduler import Scheduler
+from tests.test_scheduler import make_deck
+
+
+def by_id(cards):
+    return [card.id for card in cards]
+
+
+def expected_pick(cards):
+    # Scheduler.pick_card, with ties broken by id like the index does
+    return by_id(Scheduler(sorted(cards, key=lambda card: card.id)).pick_card())
+
+
+def test_pick_matches_scheduler():
+    cards = make_deck(300)
+    index = DueIndex(cards)
+    picked, total = index.pick()
+    assert by_id(picked) == expected_pick(cards)
+    assert total == len(picked)
+    page, total = index.pick(offset=5, limit=3)
+    assert by_id(page) == expected_pick(cards)[5:8]
+
+
+def test_least_scored_box_when_nothing_is_due():
+    cards = [card for card in make_deck(300) if card.next_review_date is None]
+    index = DueIndex(cards)
+    assert by_id(index.pick()[0]) == expected_pick(cards)
+
+
+def test_updates_are_incremental():
+    cards = [card for card in make_deck(100) if card.next_review_date is None]
+    index = DueIndex(cards)
+    weakest = index.pick(limit=1)[0][0]
+    for _ in range(10):
+        weakest.add_flag('right')
+    index.update(weakest)
+    assert weakest.id not in by_id(index.pick()[0])
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cards[0].next_review_date = now - datetime.timedelta(days=1)
+    index.update(cards[0])
+    cards[1].next_review_date = now - datetime.timedelta(days=2)
+    index.update(cards[1])
+    assert index.pick() == ([cards[1], cards[0]], 2)
+    index.remove(cards[1])
+    assert index.pick() == ([cards[0]], 1)
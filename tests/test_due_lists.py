@@ -0,0 +1,72 @@
+import datetime
+from app.due_lists import DueListStore, RolloverThread, precompute_due_lists
+from app.models import Card
+from app.storage import JsonBackend, SqliteBackend
+
+DAY = datetime.date(2024, 6, 10)
+
+
+def make_record(card_id, author_id='jan', next_review_date=None):
+    return {'id': card_id, 'topic': 'Python', 'question': f'Q{card_id}', 'answer': f'A{card_id}',
+            'author_id': author_id, 'hint': None, 'timestamp': f'2024-06-0{card_id % 9 + 1} 12:00:00',
+            'flags': {}, 'next_review_date': next_review_date}
+
+
+def make_deck(storage):
+    storage.save_cards([make_record(1), make_record(2, next_review_date='2024-06-10T09:00:00'),
+                        make_record(3, next_review_date='2024-06-09T09:00:00'), make_record(4, 'ana'),
+                        make_record(5, 'ana', next_review_date='2024-06-30T09:00:00')])
+
+
+def json_backend(tmp_path):
+    return JsonBackend(Card.from_record, card_path=str(tmp_path / 'card_data.json'),
+                       user_path=str(tmp_path / 'user_data.json'))
+
+
+def test_store_serves_only_current_lists(tmp_path):
+    store = DueListStore(str(tmp_path / 'due_lists.json'))
+    assert store.day() is None and store.get('jan', DAY, '1') is None
+    store.write(DAY, {'jan': ['1', [3, 2]]})
+    assert store.get('jan', DAY, '1') == [3, 2]
+    assert store.get('jan', DAY, '2') is None
+    assert store.get('jan', DAY + datetime.timedelta(days=1), '1') is None
+    assert store.get('ana', DAY, '1') is None
+    # Another worker replaced the file
+    DueListStore(store.path).write(DAY, {'jan': ['2', [2]]})
+    assert store.get('jan', DAY, '2') == [2]
+
+
+def test_precompute_matches_pick_for_review(tmp_path):
+    for storage in (json_backend(tmp_path), SqliteBackend(Card.from_record, path=str(tmp_path / 'flaskr.sqlite'))):
+        make_deck(storage)
+        store = DueListStore(str(tmp_path / 'due_lists.json'))
+        result = precompute_due_lists(storage, store, day=DAY, workers=0, authors_per_task=1)
+        assert result['authors'] == 2 and result['cards'] == 4
+        for author_id in ('jan', 'ana'):
+            expected = [card.id for card in storage.pick_for_review(author_id, today=DAY)[0]]
+            assert store.get(author_id, DAY, storage.author_version(author_id)) == expected
+        assert store.get('jan', DAY, storage.author_version('jan')) == [3, 2]
+        # Answering a card makes only that author's list stale
+        storage.record_answer(4, 'right')
+        assert store.get('ana', DAY, storage.author_version('ana')) is None
+        assert store.get('jan', DAY, storage.author_version('jan')) == [3, 2]
+
+
+def test_precompute_on_process_pool(tmp_path):
+    storage = json_backend(tmp_path)
+    make_deck(storage)
+    store = DueListStore(str(tmp_path / 'due_lists.json'))
+    precompute_due_lists(storage, store, day=DAY, workers=2, authors_per_task=1)
+    # A fresh worker derives the same version tokens from the files
+    other = json_backend(tmp_path)
+    assert store.get('jan', DAY, other.author_version('jan')) == [3, 2]
+    assert store.get('ana', DAY, other.author_version('ana')) == [4, 5]
+
+
+def test_rollover_runs_once_per_day(tmp_path):
+    storage = json_backend(tmp_path)
+    make_deck(storage)
+    rollover = RolloverThread(storage, DueListStore(str(tmp_path / 'due_lists.json')))
+    assert rollover.run_once(DAY)
+    assert not rollover.run_once(DAY)
+    assert rollover.run_once(DAY + datetime.timedelta(days=1))
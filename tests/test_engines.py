@@ -0,0 +1,50 @@
+import datetime
+import pytest
+from app.engines import ENGINES, create_engine
+from app.engines.leitner import LeitnerEngine
+from app.models import Card
+from app.scheduler import DeckArrays, Scheduler
+from tests.test_scheduler import make_deck
+
+
+def counted_deck(right_counts, wrong=0, hint_used=0):
+    return [Card(id=card_id, topic='Python', question='Q', answer='A', author_id='jan',
+                 flags={'right': right, 'wrong': wrong, 'hint_used': hint_used})
+            for card_id, right in enumerate(right_counts)]
+
+
+def test_leitner_matches_scheduler_boxes():
+    cards = make_deck(300)
+    scheduler = Scheduler(cards)
+    expected = [scheduler.box_intervals[scheduler.determine_box(card)] for card in cards]
+    assert LeitnerEngine().review_days(DeckArrays(cards)).tolist() == expected
+
+
+@pytest.mark.parametrize('name', sorted(ENGINES))
+def test_intervals_grow_with_right_answers(name):
+    engine = create_engine(name)
+    days = engine.review_days(DeckArrays(counted_deck(range(0, 40), wrong=2, hint_used=1))).tolist()
+    assert days == sorted(days)
+    assert days[0] >= 1 and days[-1] <= engine.max_interval
+    assert days[-1] > days[0]
+
+
+@pytest.mark.parametrize('name', ['sm2', 'fsrs'])
+def test_wrong_answers_shorten_intervals(name):
+    engine = create_engine(name)
+    steady, shaky = (engine.review_days(DeckArrays(counted_deck([8], wrong=wrong)))[0] for wrong in (0, 4))
+    assert shaky < steady
+
+
+def test_next_review_dates_are_iso_strings():
+    now = datetime.datetime(2024, 6, 10, 8, tzinfo=datetime.timezone.utc)
+    engine = create_engine('sm2')
+    cards = counted_deck([0, 3, 6])
+    days = engine.review_days(DeckArrays(cards)).tolist()
+    assert engine.next_review_dates(cards, now=now) == [(now + datetime.timedelta(days=day)).isoformat()
+                                                        for day in days]
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        create_engine('anki')
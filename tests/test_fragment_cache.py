@@ -0,0 +1,37 @@
+from jinja2 import Environment
+from markupsafe import Markup
+from app.fragment_cache import FragmentCache, FragmentCacheExtension
+
+
+def test_renders_once_per_key():
+    cache = FragmentCache()
+    calls = []
+
+    def render():
+        calls.append(1)
+        return Markup('<b>card</b>')
+
+    assert cache.get_or_render(('card', 1), render) == '<b>card</b>'
+    assert cache.get_or_render(('card', 1), render) == '<b>card</b>'
+    cache.get_or_render(('card', 2), render)
+    assert len(calls) == 2
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'evictions': 0, 'fragments': 2, 'chars': 22}
+
+
+def test_evicts_least_recently_used():
+    cache = FragmentCache(max_chars=10)
+    cache.get_or_render('a', lambda: 'aaaa')
+    cache.get_or_render('b', lambda: 'bbbb')
+    cache.get_or_render('a', lambda: 'aaaa')
+    cache.get_or_render('c', lambda: 'cccc')
+    assert cache.stats()['evictions'] == 1
+    cache.get_or_render('a', lambda: 'aaaa')
+    assert cache.get_or_render('b', lambda: 'new') == 'new'
+
+
+def test_cache_tag():
+    environment = Environment(autoescape=True, extensions=[FragmentCacheExtension])
+    template = environment.from_string('{% for card in cards %}{% cache card.id, card.q %}<i>{{ card.q }}</i>{% endcache %}{% endfor %}')
+    assert template.render(cards=[{'id': 1, 'q': 'a<b'}, {'id': 2, 'q': 'c'}]) == '<i>a&lt;b</i><i>c</i>'
+    assert template.render(cards=[{'id': 1, 'q': 'a<b'}, {'id': 2, 'q': 'd'}]) == '<i>a&lt;b</i><i>d</i>'
+    assert environment.fragment_cache.stats()['hits'] == 1
@@ -0,0 +1,27 @@
+import os
+import runpy
+import pytest
+from config import Config
+
+CONF_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py')
+
+
+def test_sync_mode(monkeypatch):
+    monkeypatch.setattr(Config, 'SERVING_MODE', 'sync')
+    settings = runpy.run_path(CONF_PATH)
+    assert settings['workers'] == Config.SERVER_WORKERS
+    assert 'worker_class' not in settings
+
+
+def test_threaded_mode(monkeypatch):
+    monkeypatch.setattr(Config, 'SERVING_MODE', 'threaded')
+    monkeypatch.setattr(Config, 'SERVER_THREADS', 32)
+    settings = runpy.run_path(CONF_PATH)
+    assert settings['worker_class'] == 'gthread'
+    assert settings['threads'] == 32
+
+
+def test_unknown_mode(monkeypatch):
+    monkeypatch.setattr(Config, 'SERVING_MODE', 'async')
+    with pytest.raises(ValueError):
+        runpy.run_path(CONF_PATH)
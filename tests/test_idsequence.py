@@ -0,0 +1,39 @@
+import multiprocessing
+from app.idsequence import IdSequence
+
+
+def test_sequence_starts_after_existing_ids(tmp_path):
+    sequence = IdSequence(str(tmp_path / 'card_data.json.seq'), seed=lambda: 13)
+    assert list(sequence.allocate()) == [14]
+    assert list(sequence.allocate(3)) == [15, 16, 17]
+    sequence.ensure_above(10)
+    sequence.ensure_above(20)
+    # A fresh process sees the persisted counter
+    assert list(IdSequence(sequence.path, seed=lambda: 0).allocate()) == [21]
+
+
+def test_blocks_are_reserved_per_process(tmp_path):
+    path = str(tmp_path / 'card_data.json.seq')
+    first, second = IdSequence(path, block_size=10), IdSequence(path, block_size=10)
+    assert list(first.allocate()) == [1]
+    assert list(second.allocate()) == [11]
+    assert list(first.allocate(2)) == [2, 3]
+    assert list(second.allocate(25)) == list(range(21, 46))
+
+
+def _allocate_many(path, count, queue):
+    sequence = IdSequence(path)
+    queue.put([sequence.allocate()[0] for _ in range(count)])
+
+
+def test_concurrent_workers_get_unique_ids(tmp_path):
+    path = str(tmp_path / 'card_data.json.seq')
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    workers = [context.Process(target=_allocate_many, args=(path, 50, queue)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    ids = [card_id for _ in workers for card_id in queue.get()]
+    for worker in workers:
+        worker.join()
+    assert sorted(ids) == list(range(1, 201))
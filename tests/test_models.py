@@ -0,0 +1,45 @@
+import json
+import pytest
+from app.models import CARD_SCHEMA_VERSION, Card
+from app.storage import JsonBackend
+
+
+def make_record(**changes):
+    record = {'id': 1, 'topic': 'Python', 'question': 'Q1', 'hint': None, 'answer': 'A1', 'author_id': 'jan',
+              'timestamp': '2024-06-09 12:34:17', 'flags': {'right': 2, 'show_answer': 1, 'retried': 1},
+              'next_review_date': None}
+    record.update(changes)
+    return record
+
+
+def test_card_record_round_trip():
+    card = Card.from_record(make_record())
+    assert not hasattr(card, '__dict__')
+    assert card.right == 2 and card.wrong == 0
+    assert card.to_record() == make_record(schema=CARD_SCHEMA_VERSION)
+
+
+def test_add_flag():
+    card = Card.from_record(make_record(flags={}))
+    card.add_flag('wrong')
+    card.add_flag('wrong')
+    card.add_flag('skipped')
+    assert card.flags == {'wrong': 2, 'skipped': 1}
+    card.flags = {}
+    assert card.to_record()['flags'] == {}
+
+
+def test_newer_schema_is_rejected():
+    assert Card.from_record(make_record(schema=CARD_SCHEMA_VERSION)).id == 1
+    assert Card.from_record(Card.from_record(make_record()).to_record()).right == 2
+    with pytest.raises(ValueError):
+        Card.from_record(make_record(schema=CARD_SCHEMA_VERSION + 1))
+
+
+def test_stored_records_carry_the_schema_version(tmp_path):
+    backend = JsonBackend(Card.from_record, card_path=str(tmp_path / 'card_data.json'),
+                          user_path=str(tmp_path / 'user_data.json'))
+    backend.save_cards([Card.from_record(make_record()).to_record()])
+    with open(tmp_path / 'card_data.json') as file:
+        assert json.load(file)[0]['schema'] == CARD_SCHEMA_VERSION
+    assert backend.load_cards()[0].right == 2
@@ -0,0 +1,108 @@
+import json
+import multiprocessing
+import os
+import threading
+import pytest
+from app.filelock import ConflictError
+from app.oplog import OpLogStore
+
+
+def make_record(card_id, author_id='jan'):
+    return {'id': card_id, 'topic': 'Python', 'question': f'Q{card_id}', 'answer': f'A{card_id}',
+            'author_id': author_id, 'hint': None, 'timestamp': '2024-06-09 12:34:17', 'flags': {},
+            'next_review_date': None}
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / 'card_data.json'
+    path.write_text(json.dumps([make_record(1), make_record(2)]))
+    return OpLogStore(str(path), fsync_batch=2, compact_threshold=0)
+
+
+def test_append_and_replay(store):
+    store.append({'op': 'flag', 'id': 1, 'flag': 'right', 'delta': 1})
+    store.append({'op': 'flag', 'id': 1, 'flag': 'right', 'delta': 1})
+    store.append({'op': 'edit', 'id': 2, 'fields': {'question': 'Edited'}})
+    store.append({'op': 'add', 'card': make_record(3)})
+    store.append({'op': 'delete', 'id': 3})
+    records = store.load()
+    assert [record['id'] for record in records] == [1, 2]
+    assert records[0]['flags'] == {'right': 2}
+    assert records[1]['question'] == 'Edited'
+    # The snapshot itself is untouched
+    with open(store.snapshot_path) as file:
+        assert json.load(file)[0]['flags'] == {}
+
+
+def test_torn_tail_is_ignored(store):
+    store.append({'op': 'flag', 'id': 1, 'flag': 'wrong', 'delta': 1})
+    with open(store.log_path, 'a') as file:
+        file.write('{"op": "flag", "id": 1, "fl')
+    assert store.load()[0]['flags'] == {'wrong': 1}
+
+
+def test_compaction_writes_fresh_snapshot(store):
+    store.append({'op': 'flag', 'id': 2, 'flag': 'hint_used', 'delta': 1})
+    store.compact()
+    assert store.log_size() == 0
+    with open(store.snapshot_path) as file:
+        assert json.load(file)[1]['flags'] == {'hint_used': 1}
+    store.append({'op': 'delete', 'id': 1})
+    assert [record['id'] for record in store.load()] == [2]
+
+
+def _answer_many(snapshot_path, count):
+    store = OpLogStore(snapshot_path, compact_threshold=0)
+    for i in range(count):
+        store.append({'op': 'flag', 'id': 1, 'flag': 'right', 'delta': 1})
+        if i % 25 == 0:
+            store.compact()
+
+
+def test_concurrent_workers_do_not_lose_answers(store):
+    workers = [multiprocessing.get_context('fork').Process(target=_answer_many, args=(store.snapshot_path, 100))
+               for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert store.load()[0]['flags'] == {'right': 400}
+    assert store.version() == 400
+
+
+def test_optimistic_write_conflict_and_retry(store):
+    version = store.version()
+    store.append({'op': 'flag', 'id': 1, 'flag': 'wrong', 'delta': 1})
+    with pytest.raises(ConflictError):
+        store.write_snapshot(store.load(), expected_version=version)
+
+    def add_hint(records):
+        # Simulate another worker writing between our read and our write, once
+        if store.version() == version + 1:
+            store.append({'op': 'flag', 'id': 2, 'flag': 'right', 'delta': 1})
+        flags = records[0]['flags']
+        flags['hint_used'] = flags.get('hint_used', 0) + 1
+
+    store.update(add_hint)
+    records = store.load()
+    assert records[0]['flags'] == {'wrong': 1, 'hint_used': 1}
+    assert records[1]['flags'] == {'right': 1}
+
+
+def test_quiet_worker_syncs_after_the_interval(tmp_path, monkeypatch):
+    synced = threading.Event()
+    real_fsync = os.fsync
+
+    def fsync(fd):
+        real_fsync(fd)
+        synced.set()
+
+    monkeypatch.setattr(os, 'fsync', fsync)
+    store = OpLogStore(str(tmp_path / 'card_data.json'), fsync_batch=100, fsync_interval=0.5, compact_threshold=0)
+    store.sync()
+    store.append({'op': 'flag', 'id': 1, 'flag': 'right', 'delta': 1})
+    assert store._pending == 1
+    # No further append arrives, the timer syncs the pending record
+    assert synced.wait(5)
+    assert store._pending == 0
@@ -0,0 +1,113 @@
+import json
+import os
+import pytest
+from app.models import CARD_SCHEMA_VERSION, Card
+from app.oplog import OpLogStore
+from app.repository import CardRepository
+
+
+def write_cards(path, records):
+    with open(path, 'w') as file:
+        json.dump(records, file)
+
+
+def make_record(card_id, author_id, topic='Python'):
+    return {'id': card_id, 'topic': topic, 'question': f'Q{card_id}', 'answer': f'A{card_id}',
+            'author_id': author_id, 'hint': None, 'timestamp': '2024-06-09 12:34:17', 'flags': {},
+            'next_review_date': None, 'schema': CARD_SCHEMA_VERSION}
+
+
+@pytest.fixture
+def card_file(tmp_path):
+    path = tmp_path / 'card_data.json'
+    write_cards(path, [make_record(1, 'jan'), make_record(2, 'ana', 'Go'), make_record(3, 'jan', 'Go'),
+                       make_record(4, 'bob')])
+    return str(path)
+
+
+def test_indexes(card_file):
+    repository = CardRepository(OpLogStore(card_file), factory=Card.from_record)
+    assert [card.id for card in repository.get_by_author('jan')] == [1, 3]
+    assert [card.id for card in repository.get_by_author_topic('jan', 'Go')] == [3]
+    assert repository.get(2).author_id == 'ana'
+    assert repository.get(99) is None
+    assert repository.get_by_author('nobody') == []
+
+
+def test_reload_when_file_changes(card_file):
+    repository = CardRepository(OpLogStore(card_file), factory=Card.from_record)
+    assert len(repository.get_by_author('jan')) == 2
+    write_cards(card_file, [make_record(1, 'jan'), make_record(5, 'jan'), make_record(6, 'jan')])
+    # Force a different mtime even on file systems with coarse timestamps
+    stat = os.stat(card_file)
+    os.utime(card_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert [card.id for card in repository.get_by_author('jan')] == [1, 5, 6]
+
+
+def test_lru_eviction_respects_budget(card_file):
+    repository = CardRepository(OpLogStore(card_file), factory=Card.from_record, max_cards=2)
+    assert len(repository.get_by_author('jan')) == 2
+    assert repository.cached_cards <= 2
+    assert [card.id for card in repository.get_by_author('bob')] == [4]
+    assert [card.id for card in repository.get_by_author('ana')] == [2]
+    assert repository.cached_cards <= 2
+    # Evicted partitions are transparently reloaded
+    assert [card.id for card in repository.get_by_author('jan')] == [1, 3]
+
+
+def test_log_tail_is_applied_incrementally(card_file):
+    store = OpLogStore(card_file)
+    repository = CardRepository(store, factory=Card.from_record)
+    jan_cards = repository.get_by_author('jan')
+    store.append({'op': 'add', 'card': make_record(7, 'jan', 'Go')})
+    store.append({'op': 'flag', 'id': 1, 'flag': 'right', 'delta': 1})
+    store.append({'op': 'edit', 'id': 3, 'fields': {'topic': 'Rust'}})
+    store.append({'op': 'delete', 'id': 4})
+    assert [card.id for card in repository.get_by_author('jan')] == [1, 3, 7]
+    # The cached objects were updated in place rather than reloaded
+    assert repository.get(1) is jan_cards[0]
+    assert repository.get(1).flags == {'right': 1}
+    assert [card.id for card in repository.get_by_author_topic('jan', 'Go')] == [7]
+    assert [card.id for card in repository.get_by_author_topic('jan', 'Rust')] == [3]
+    assert repository.get(4) is None
+    assert repository.get_by_author('bob') == []
+
+
+def test_log_tail_survives_compaction_between_checks(card_file):
+    store = OpLogStore(card_file)
+    repository = CardRepository(store, factory=Card.from_record)
+    store.append({'op': 'flag', 'id': 1, 'flag': 'right', 'delta': 1})
+    assert repository.get(1).flags == {'right': 1}
+    store.append({'op': 'flag', 'id': 1, 'flag': 'right', 'delta': 1})
+    real_log_size = store.log_size
+
+    def log_size_then_compact():
+        # Another worker compacts and appends right after this worker looked at the log
+        size = real_log_size()
+        store.log_size = real_log_size
+        store.compact()
+        store.append({'op': 'add', 'card': make_record(8, 'jan', 'A much longer topic name than before')})
+        store.append({'op': 'flag', 'id': 3, 'flag': 'wrong', 'delta': 1})
+        return size
+
+    store.log_size = log_size_then_compact
+    assert repository.get(1).flags == {'right': 2}
+    assert repository.get(3).flags == {'wrong': 1}
+    assert [card.id for card in repository.get_by_author('jan')] == [1, 3, 8]
+
+
+def test_reload_brings_cached_partitions_up_to_date(card_file):
+    store = OpLogStore(card_file)
+    repository = CardRepository(store, factory=Card.from_record, max_cards=3)
+    assert [card.id for card in repository.get_by_author('jan')] == [1, 3]
+    real_read_consistent = store.read_consistent
+
+    def read_consistent_after_write():
+        # Another worker writes after the version check, before the reload reads the files
+        OpLogStore(card_file).append({'op': 'flag', 'id': 1, 'flag': 'right', 'delta': 1})
+        store.read_consistent = real_read_consistent
+        return real_read_consistent()
+
+    store.read_consistent = read_consistent_after_write
+    assert [card.id for card in repository.get_by_author('bob')] == [4]
+    assert repository.get(1).flags == {'right': 1}
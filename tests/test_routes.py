@@ -1,3 +1,5 @@
+import io
+import json
 import pytest
 from app import app
 from app.models import User, Card
@@ -45,6 +47,21 @@ def test_register(client):
     assert response.status_code == 200
 
 
+def test_register_taken_username_shows_form_error(client, new_user, monkeypatch):
+    # This worker's user cache has not seen the other registration yet
+    monkeypatch.setattr(User, 'get_by_username', staticmethod(lambda username: None))
+    response = client.post('/register', data=dict(
+        username='test_user',
+        email='other@example.com',
+        password='other',
+        password2='other'
+    ))
+    assert response.status_code == 200
+    assert b'Looks like that username is already being used.' in response.data
+    users, message = User.load_users()
+    assert users['test_user'].email == 'test@example.com'
+
+
 def test_login(client, new_user):
     response = client.get('/login')
     assert response.status_code == 200
@@ -80,6 +97,16 @@ def test_post_login_action(client, login):
     assert response.status_code == 200
 
 
+def test_topics_are_case_insensitive(client, login):
+    client.post('/cards/new', data=dict(topic='CaseTopic', question='CaseQ1', hint='H', answer='A'))
+    client.post('/cards/new', data=dict(topic='casetopic', question='CaseQ2', hint='H', answer='A'))
+    response = client.get('/start_by_topic')
+    assert response.data.count(b'CASETOPIC') == 1
+    assert b'2 card(s)' in response.data
+    response = client.get('/start_game_by_topic/CASETOPIC')
+    assert b'var totalCards = 2;' in response.data
+
+
 def test_start_by_topic(client, login):
     response = client.get('/start_by_topic')
     assert response.status_code == 200
@@ -120,6 +147,97 @@ def test_start_game_by_topic(client, login):
     assert response.status_code == 200
 
 
+def test_study_session_queue_is_frozen(client, login):
+    client.post('/cards/new', data=dict(topic='FrozenTopic', question='Q1', hint='H', answer='A'))
+    response = client.get('/start_game_by_topic/FrozenTopic')
+    assert response.status_code == 200
+    # A card added mid-game does not join the running queue
+    client.post('/cards/new', data=dict(topic='FrozenTopic', question='Q2', hint='H', answer='A'))
+    response = client.get('/start_game_by_topic/FrozenTopic?page=2')
+    assert b'Q1' in response.data and b'Q2' not in response.data
+    # Starting the game again picks up the new card
+    response = client.get('/start_game_by_topic/FrozenTopic')
+    assert b'var totalCards = 2;' in response.data
+
+
+def test_prefetch_study_cards(client, login):
+    for question in ('P1', 'P2', 'P3'):
+        client.post('/cards/new', data=dict(topic='PrefetchTopic', question=question, hint='H', answer='A'))
+    client.get('/start_game_by_topic/PrefetchTopic')
+    response = client.get('/api/study/cards?page=2&limit=5&topic=PrefetchTopic')
+    data = response.get_json()
+    assert data['total'] == 3
+    assert [card['page'] for card in data['cards']] == [2, 3]
+    assert {card['question'] for card in data['cards']} < {'P1', 'P2', 'P3'}
+    # Another topic's game is not running
+    assert client.get('/api/study/cards?topic=OtherTopic').status_code == 404
+
+
+def test_card_listings_are_paginated(client, login):
+    for number in range(3):
+        client.post('/cards/new', data=dict(topic='PagedTopic', question=f'PagedQ{number}', hint='H', answer='A'))
+    response = client.get('/cards/topic/PagedTopic?limit=2')
+    assert b'PagedQ0' in response.data and b'PagedQ1' in response.data and b'PagedQ2' not in response.data
+    assert b'Page 1 of 2' in response.data
+    next_url = response.data.split(b'href="/cards/topic/PagedTopic?')[1].split(b'"')[0].replace(b'&amp;', b'&')
+    response = client.get('/cards/topic/PagedTopic?' + next_url.decode())
+    assert b'PagedQ2' in response.data and b'PagedQ0' not in response.data
+    assert b'Page 2 of 2' in response.data
+
+    response = client.get('/cards?topic=PagedTopic&limit=2')
+    assert response.status_code == 200
+    assert b'PagedQ1' in response.data and b'PagedQ2' not in response.data
+    response = client.get('/all_cards?after=not-a-cursor')
+    assert response.status_code == 200
+
+
+def test_card_listings_reuse_rendered_fragments(client, login):
+    client.post('/cards/new', data=dict(topic='FragmentTopic', question='FragmentQ', hint='H', answer='A'))
+    client.get('/cards/topic/FragmentTopic')
+    stats = client.get('/api/fragment_cache').get_json()
+    response = client.get('/cards/topic/FragmentTopic')
+    assert b'FragmentQ' in response.data
+    assert client.get('/api/fragment_cache').get_json()['hits'] == stats['hits'] + 1
+
+    # A new card changes the listing, the other cards' markup is reused
+    client.post('/cards/new', data=dict(topic='FragmentTopic', question='FragmentQ2', hint='H', answer='A'))
+    response = client.get('/cards/topic/FragmentTopic')
+    assert b'FragmentQ2' in response.data
+    after = client.get('/api/fragment_cache').get_json()
+    assert after['hits'] == stats['hits'] + 2 and after['misses'] == stats['misses'] + 2
+
+
+def test_search_cards(client, login):
+    client.post('/cards/new', data=dict(topic='SearchTopic', question='What is a Zygomorphic flower?',
+                                        hint='symmetry', answer='Bilateral'))
+    response = client.get('/cards/search?q=zygo')
+    assert response.status_code == 200
+    assert b'Zygomorphic' in response.data
+    response = client.get('/cards/search?q=zygomorphic+trimerous')
+    assert b'No cards match' in response.data
+    assert client.get('/cards/search').status_code == 200
+
+
+def test_import_and_export_deck(client, login):
+    deck = b'question,answer,topic\nImported Q1,A1,ImportTopic\n,missing question,\nImported Q2,A2,\n'
+    response = client.post('/api/cards/import', data={'file': (io.BytesIO(deck), 'deck.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert response.get_json()['imported'] == 2
+    assert response.get_json()['errors'] == [{'line': 3, 'error': 'question is missing'}]
+    response = client.post('/api/cards/import?format=jsonl&topic=Raw', data=b'{"question": "Imported Q3", "answer": "A3"}\n')
+    assert response.get_json()['imported'] == 1
+    assert client.post('/api/cards/import', data=deck).status_code == 400
+
+    response = client.get('/cards/export?format=jsonl')
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'] == 'attachment; filename=deck.jsonl'
+    exported = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert {'topic': 'Raw', 'question': 'Imported Q3', 'answer': 'A3', 'hint': 'No hints available!'} in exported
+    assert len(exported) == len(Card.get_by_user_id('test_user'))
+    assert client.get('/cards/export?format=xml').status_code == 400
+
+
 def test_get_card_topic(client, login):
     response = client.get('/cards/topic/test_topic')
     assert response.status_code == 200
@@ -178,3 +296,46 @@ def test_delete_card(client, login):
 def test_scoreboard(client, login):
     response = client.get('/scoreboard')
     assert response.status_code == 200
+
+
+def test_listing_pages_answer_304_until_cards_change(client, login):
+    for url in ('/all_cards', '/cards/topic/Python', '/start_by_topic', '/scoreboard'):
+        response = client.get(url)
+        etag = response.headers['ETag']
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'] == 'private, no-cache'
+        response = client.get(url, headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.headers['ETag'] == etag
+
+    etag = client.get('/all_cards').headers['ETag']
+    assert client.get('/cards/topic/Java').headers['ETag'] != client.get('/cards/topic/Python').headers['ETag']
+    client.post('/cards/new', data=dict(topic='EtagTopic', question='EQ', hint='H', answer='A'))
+    response = client.get('/all_cards', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'EQ' in response.data
+
+    etag = response.headers['ETag']
+    card_id = max(card.id for card in Card.get_by_user_id('test_user'))
+    client.post('/api/reviews', json={'reviews': [{'card_id': card_id, 'flag': 'right'}]})
+    assert client.get('/all_cards', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_submit_reviews(client, login):
+    client.post('/cards/new', data=dict(topic='ReviewTopic', question='RQ', hint='H', answer='A'))
+    card_id = max(card.id for card in Card.load_cards())
+    foreign_id = next(card.id for card in Card.load_cards() if card.author_id != 'test_user')
+    response = client.post('/api/reviews', json={'reviews': [
+        {'card_id': card_id, 'flag': 'hint_used', 'timestamp': '2024-06-10T08:00:00Z', 'response_ms': 900},
+        {'card_id': card_id, 'flag': 'right', 'timestamp': '2024-06-10T08:00:05Z', 'response_ms': 4200},
+        {'card_id': foreign_id, 'flag': 'right'},
+    ]})
+    assert response.get_json() == {'applied': 2, 'rejected': 1}
+    card = Card.get_by_id(card_id)
+    assert card.flags == {'hint_used': 1, 'right': 1}
+    assert str(card.next_review_date).startswith('2024-06-1')
+
+    response = client.post('/api/reviews', json={'reviews': [{'card_id': card_id, 'flag': 'edit'}]})
+    assert response.status_code == 400
+    response = client.post('/api/reviews', json={'reviews': [{'flag': 'right'}]})
+    assert response.status_code == 400
@@ -0,0 +1,48 @@
+import datetime
+import random
+from app.models import Card
+from app.scheduler import DeckArrays, Scheduler
+
+
+def make_deck(count, seed=7):
+    rng = random.Random(seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cards = []
+    for card_id in range(count):
+        flags = {name: rng.randint(0, 12) for name in ('right', 'wrong', 'hints', 'hint_used') if rng.random() < 0.7}
+        review_date = rng.choice([None, now - datetime.timedelta(days=rng.randint(0, 3)),
+                                  now + datetime.timedelta(days=rng.randint(1, 3))])
+        cards.append(Card(id=card_id, topic='Python', question='Q', answer='A', author_id='jan', flags=flags,
+                          timestamp=f'2024-06-{rng.randint(10, 28)} 12:00:00', next_review_date=review_date))
+    return cards
+
+
+def test_vectorized_boxes_match_per_card():
+    scheduler = Scheduler(make_deck(500))
+    arrays = DeckArrays(scheduler.cards)
+    assert arrays.scores().tolist() == [scheduler.calculate_score(card) for card in scheduler.cards]
+    assert arrays.boxes(scheduler.box_threshold).tolist() == [scheduler.determine_box(card) for card in scheduler.cards]
+
+
+def test_pick_card_orders_due_cards_by_review_date():
+    cards = make_deck(200)
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    due = [card for card in cards if card.next_review_date and card.next_review_date.date() <= today]
+    assert Scheduler(cards).pick_card() == sorted(due, key=lambda card: card.next_review_date)
+
+
+def test_pick_from_least_scored_box_without_due_cards():
+    cards = [card for card in make_deck(200) if card.next_review_date is None]
+    scheduler = Scheduler(cards)
+    expected = sorted((card for card in cards if scheduler.determine_box(card) == scheduler.box_count - 1),
+                      key=lambda card: card.timestamp)
+    assert scheduler.pick_card() == expected
+
+
+def test_schedule_cards_uses_box_intervals():
+    scheduler = Scheduler(make_deck(50))
+    before = datetime.datetime.now(datetime.timezone.utc)
+    boxes = [scheduler.determine_box(card) for card in scheduler.cards]
+    for card, box in zip(scheduler.schedule_cards(), boxes):
+        days = (card.next_review_date - before).total_seconds() / 86400
+        assert scheduler.box_intervals[box] <= days < scheduler.box_intervals[box] + 0.01
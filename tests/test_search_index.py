@@ -0,0 +1,40 @@
+from app.models import Card
+from app.search_index import SearchIndex, tokenize
+
+
+def make_card(card_id, question, answer='', hint=None):
+    return Card(id=card_id, topic='Python', question=question, answer=answer, hint=hint, author_id='jan')
+
+
+def by_id(cards):
+    return [card.id for card in cards]
+
+
+def test_tokenize_case_folds():
+    assert tokenize('What does Straße mean?') == ['what', 'does', 'strasse', 'mean']
+    assert tokenize(None) == []
+
+
+def test_ranks_exact_question_matches_first():
+    index = SearchIndex([make_card(1, 'A list comprehension', answer='builds lists'),
+                         make_card(2, 'What is a generator?', answer='A lazy list', hint='yield'),
+                         make_card(3, 'Dict views')])
+    assert by_id(index.search('list')) == [1, 2]
+    assert by_id(index.search('LIS')) == [1, 2]
+    assert by_id(index.search('lazy list')) == [2]
+    assert by_id(index.search('yie')) == [2]
+    assert by_id(index.search('list', limit=1)) == [1]
+    assert index.search('tuple') == [] and index.search('?!') == []
+
+
+def test_updates_are_incremental():
+    card = make_card(1, 'Decorators')
+    index = SearchIndex([card, make_card(2, 'Closures')])
+    card.question = 'Context managers'
+    index.update(card)
+    assert index.search('decorators') == []
+    assert by_id(index.search('context')) == [1]
+    index.remove(card)
+    assert index.search('context') == []
+    index.add(make_card(3, 'Context variables'))
+    assert by_id(index.search('cont')) == [3]
@@ -0,0 +1,243 @@
+import datetime
+import pytest
+from app.engines.pipeline import reschedule_decks
+from app.models import CARD_SCHEMA_VERSION, Card
+from app.storage import JsonBackend, MmapBackend, ShardedJsonBackend, SqliteBackend
+from app.user_store import UsernameTakenError
+
+
+def make_record(card_id, author_id='jan', topic='Python'):
+    return {'id': card_id, 'topic': topic, 'question': f'Q{card_id}', 'answer': f'A{card_id}',
+            'author_id': author_id, 'hint': None, 'timestamp': '2024-06-09 12:34:17', 'flags': {},
+            'next_review_date': None, 'schema': CARD_SCHEMA_VERSION}
+
+
+@pytest.fixture(params=['json', 'mmap', 'sharded', 'sqlite'])
+def storage(request, tmp_path):
+    factory = Card.from_record
+    if request.param == 'json':
+        return JsonBackend(factory, card_path=str(tmp_path / 'card_data.json'), user_path=str(tmp_path / 'user_data.json'))
+    if request.param == 'mmap':
+        return MmapBackend(factory, card_path=str(tmp_path / 'card_data.bin'), user_path=str(tmp_path / 'user_data.json'))
+    if request.param == 'sharded':
+        return ShardedJsonBackend(factory, shard_dir=str(tmp_path / 'card_data'), user_path=str(tmp_path / 'user_data.json'))
+    return SqliteBackend(factory, path=str(tmp_path / 'flaskr.sqlite'))
+
+
+def test_card_round_trip(storage):
+    storage.save_cards([make_record(1), make_record(2, topic='Go'), make_record(3, author_id='ana')])
+    storage.add_card(make_record(4, topic='Go'))
+    assert [card.id for card in storage.cards_by_author('jan')] == [1, 2, 4]
+    assert [card.id for card in storage.cards_by_author_topic('jan', 'Go')] == [2, 4]
+    assert storage.card(3).author_id == 'ana'
+    assert storage.card(42) is None
+
+    storage.record_answer(1, 'right')
+    storage.record_answer(1, 'right')
+    storage.record_answer(1, 'hint_used')
+    storage.update_card(2, {'question': 'Edited', 'topic': 'Rust'})
+    storage.delete_card(3)
+    assert storage.card(1).flags == {'right': 2, 'hint_used': 1}
+    assert storage.card(2).question == 'Edited'
+    assert [card.id for card in storage.cards_by_author_topic('jan', 'Rust')] == [2]
+    assert sorted(card.id for card in storage.load_cards()) == [1, 2, 4]
+
+
+def test_writes_respect_owner(storage):
+    storage.save_cards([make_record(1), make_record(2, author_id='ana')])
+    storage.record_answer(1, 'right', author_id='ana')
+    storage.delete_card(1, author_id='ana')
+    assert storage.card(1, author_id='ana') is None
+    assert storage.card(1, author_id='jan').flags == {}
+
+
+def test_pick_for_review(storage):
+    storage.save_cards([make_record(1), make_record(2), make_record(3)])
+    storage.record_answer(2, 'right')
+    storage.record_answer(2, 'right')
+    # Card 2 scored out of the least-scored box
+    cards, total = storage.pick_for_review('jan')
+    assert [card.id for card in cards] == [1, 3] and total == 2
+    storage.update_card(3, {'next_review_date': '2024-06-10T08:00:00'})
+    storage.add_card(dict(make_record(4), next_review_date='2024-06-09T08:00:00'))
+    cards, total = storage.pick_for_review('jan', offset=1, limit=5)
+    assert [card.id for card in cards] == [3] and total == 2
+
+
+def test_author_version(storage):
+    storage.save_cards([make_record(1), make_record(2), make_record(3, author_id='ana')])
+    jan, ana = storage.author_version('jan'), storage.author_version('ana')
+    storage.record_answer(1, 'right')
+    assert storage.author_version('jan') != jan and storage.author_version('ana') == ana
+    jan = storage.author_version('jan')
+    storage.delete_card(3)
+    assert storage.author_version('jan') == jan and storage.author_version('ana') != ana
+    storage.set_review_dates('jan', {2: '2024-06-10T08:00:00+00:00'})
+    assert storage.author_version('jan') != jan
+
+
+def test_cards_page(storage):
+    storage.save_cards([make_record(4, topic='Go'), make_record(1), make_record(2, topic='Go'),
+                        make_record(3, author_id='ana'), make_record(5, topic='Rust')])
+    ids = [card.id for card in storage.cards_page('jan', limit=2)]
+    assert ids == [1, 2]
+    assert [card.id for card in storage.cards_page('jan', after=(2,))] == [4, 5]
+    page = storage.cards_page('jan', order='topic', limit=3)
+    assert [(card.topic, card.id) for card in page] == [('Go', 2), ('Go', 4), ('Python', 1)]
+    assert [card.id for card in storage.cards_page('jan', order='topic', before=('Python', 1), limit=1)] == [4]
+    assert [card.id for card in storage.cards_page('jan', order='topic', topic='Go', after=('Go', 2))] == [4]
+    assert [card.id for card in storage.cards_page('jan', order='topic', topic='Go', after=('C', 9))] == [2, 4]
+    assert storage.cards_page('jan', order='topic', topic='Go', before=('C', 9)) == []
+    # Writes after the index was built
+    storage.add_card(make_record(6, topic='Go'))
+    storage.update_card(5, {'topic': 'C'})
+    storage.delete_card(2)
+    assert [card.id for card in storage.cards_page('jan', order='topic')] == [5, 4, 6, 1]
+    with pytest.raises(ValueError):
+        storage.cards_page('jan', topic='Go')
+
+
+def test_search_cards(storage):
+    storage.save_cards([make_record(1), make_record(2), make_record(3, author_id='ana')])
+    assert [card.id for card in storage.search_cards('jan', 'q1')] == [1]
+    assert [card.id for card in storage.search_cards('jan', 'a1')] == [1]
+    assert storage.search_cards('jan', 'q3') == []
+    # Writes after the index was built
+    storage.update_card(1, {'question': 'What is a Metaclass?'})
+    storage.add_card(dict(make_record(4), hint='metaclasses create classes'))
+    storage.delete_card(2)
+    assert [card.id for card in storage.search_cards('jan', 'METACLASS')] == [1, 4]
+    assert [card.id for card in storage.search_cards('jan', 'meta', limit=1)] == [1]
+    assert storage.search_cards('jan', 'q2') == []
+    storage.rebuild_search_index()
+    assert [card.id for card in storage.search_cards('jan', 'metaclass')] == [1, 4]
+
+
+def test_add_cards(storage):
+    storage.save_cards([make_record(1), make_record(2, author_id='ana')])
+    # Build the derived indexes, then add more cards than one log tail updates in place
+    assert storage.topic_stats('jan')['Python']['cards'] == 1
+    assert [card.id for card in storage.search_cards('jan', 'q1')] == [1]
+    version = storage.author_version('jan')
+    records = [make_record(card_id, topic='Go' if card_id % 2 else 'Python') for card_id in range(3, 1503)]
+    storage.add_cards(records + [make_record(1503, author_id='ana')])
+    storage.add_cards([])
+    assert storage.author_version('jan') != version
+    assert len(storage.cards_by_author('jan')) == 1501
+    assert [card.id for card in storage.cards_page('jan', after=(1499,))] == [1500, 1501, 1502]
+    assert storage.topic_stats('jan')['Go']['cards'] == 750
+    assert [card.id for card in storage.search_cards('jan', 'q1502')] == [1502]
+    assert storage.card(1503).author_id == 'ana'
+
+
+def test_topic_counts_and_topic_picks(storage):
+    today = datetime.date(2024, 6, 10)
+    storage.save_cards([make_record(1), dict(make_record(2, topic='python'), next_review_date='2024-06-10T08:00:00+00:00'),
+                        make_record(3, topic='Go'), make_record(4, author_id='ana')])
+    assert storage.topic_counts('jan', today=today) == {'Go': {'cards': 1, 'due': 0}, 'Python': {'cards': 2, 'due': 1}}
+    assert [card.id for card in storage.pick_for_review('jan', today=today, topic='PYTHON')[0]] == [2]
+    # Writes after the index was built
+    storage.update_card(3, {'topic': 'Python'})
+    storage.set_review_dates('jan', {1: '2024-06-09T08:00:00+00:00'})
+    storage.delete_card(2)
+    assert storage.topic_counts('jan', today=today) == {'Python': {'cards': 2, 'due': 1}}
+    assert [card.id for card in storage.pick_for_review('jan', today=today, topic='python')[0]] == [1]
+    assert storage.pick_for_review('jan', today=today, topic='Rust') == ([], 0)
+
+
+def test_record_reviews(storage):
+    storage.save_cards([make_record(1), make_record(2), make_record(3, author_id='ana')])
+    storage.topic_stats('jan')
+    version = storage.version()
+    storage.record_reviews('jan', {(1, 'right'): 2, (1, 'hint_used'): 1, (3, 'right'): 1},
+                           {1: '2024-06-12T08:00:00+00:00'})
+    assert storage.card(1).flags == {'right': 2, 'hint_used': 1}
+    assert storage.card(1).next_review_date == '2024-06-12T08:00:00+00:00'
+    assert storage.card(3).flags == {}
+    assert storage.topic_stats('jan')['Python']['right'] == 2
+    assert storage.version() == version + 1
+
+
+def test_topic_stats(storage):
+    storage.save_cards([make_record(1), make_record(2, topic='Go'), make_record(3, author_id='ana')])
+    # Built before the writes, so they are applied incrementally
+    assert storage.topic_stats('jan')['Go']['cards'] == 1
+    storage.record_answer(1, 'right')
+    storage.record_answer(1, 'hint_used')
+    storage.record_answer(2, 'wrong')
+    storage.record_answer(2, 'show_answer')
+    storage.add_card(make_record(4, topic='Go'))
+    storage.update_card(1, {'topic': 'Go'})
+    storage.delete_card(2)
+    assert storage.topic_stats('jan') == {'Go': {'right': 1, 'wrong': 0, 'hints': 1, 'cards': 2}}
+    assert storage.topic_stats('ana') == {'Python': {'right': 0, 'wrong': 0, 'hints': 0, 'cards': 1}}
+    storage.rebuild_topic_stats()
+    assert storage.topic_stats('jan') == {'Go': {'right': 1, 'wrong': 0, 'hints': 1, 'cards': 2}}
+
+
+def test_allocate_card_ids(storage):
+    storage.save_cards([make_record(1), make_record(7, author_id='ana')])
+    assert list(storage.allocate_card_ids()) == [8]
+    assert list(storage.allocate_card_ids(3)) == [9, 10, 11]
+    storage.add_card(make_record(9))
+    storage.save_cards([make_record(30)])
+    assert list(storage.allocate_card_ids()) == [31]
+
+
+def test_user_round_trip(storage):
+    users = {'jan': {'email': 'jan@thi.de', 'password_hash': 'hash'}}
+    storage.save_users(users)
+    assert storage.load_users() == users
+
+
+def test_add_user_never_replaces_an_account(storage):
+    storage.add_user('jan', {'email': 'jan@thi.de', 'password_hash': 'hash'})
+    with pytest.raises(UsernameTakenError):
+        storage.add_user('jan', {'email': 'other@thi.de', 'password_hash': 'other'})
+    assert storage.get_user('jan') == {'email': 'jan@thi.de', 'password_hash': 'hash'}
+
+
+def test_sqlite_schema(tmp_path):
+    storage = SqliteBackend(Card.from_record, path=str(tmp_path / 'flaskr.sqlite'))
+    with storage.pool.connection() as connection:
+        indexes = {row['name'] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        journal_mode = connection.execute('PRAGMA journal_mode').fetchone()[0]
+    assert {'cards_author_topic', 'cards_author', 'cards_author_review', 'users_email'} <= indexes
+    assert journal_mode == 'wal'
+
+
+def test_shards_are_split_per_author(tmp_path):
+    storage = ShardedJsonBackend(Card.from_record, shard_dir=str(tmp_path / 'card_data'),
+                                 user_path=str(tmp_path / 'user_data.json'))
+    storage.save_cards([make_record(1), make_record(2, author_id='ana'), make_record(3, author_id='a/b')])
+    assert storage.authors() == ['a/b', 'ana', 'jan']
+    storage.record_answer(2, 'wrong')
+    # Only ana's shard received the write
+    assert storage.version('ana') == 2
+    assert storage.version('jan') == 1
+    assert (tmp_path / 'card_data' / 'ana.json.log').exists()
+    assert not (tmp_path / 'card_data' / 'jan.json.log').stat().st_size
+    assert storage.card(2).flags == {'wrong': 1}
+    assert storage.card(3).author_id == 'a/b'
+
+
+def test_open_shards_are_capped(tmp_path):
+    storage = ShardedJsonBackend(Card.from_record, shard_dir=str(tmp_path / 'card_data'),
+                                 user_path=str(tmp_path / 'user_data.json'), max_open_shards=2)
+    for card_id, author_id in enumerate(('jan', 'ana', 'bob', 'eve'), 1):
+        storage.add_card(make_record(card_id, author_id=author_id))
+    assert list(storage._shards) == ['bob', 'eve']
+    # Closed shards dropped their log handle and reopen on the next use
+    storage.record_answer(1, 'wrong')
+    assert storage.card(1, 'jan').flags == {'wrong': 1}
+    assert len(storage._shards) == 2
+
+
+def test_reschedule_decks(storage):
+    now = datetime.datetime(2024, 6, 10, 8, tzinfo=datetime.timezone.utc)
+    storage.save_cards([make_record(card_id, author_id='jan' if card_id % 2 else 'ana') for card_id in range(1, 8)])
+    result = reschedule_decks(storage, 'sm2', chunk_size=2, workers=0, now=now)
+    assert result['cards'] == 7 and result['chunks'] == 4
+    tomorrow = (now + datetime.timedelta(days=1)).isoformat()
+    dates = {card.id: card.next_review_date for card in storage.load_cards()}
+    assert len(dates) == 7 and set(dates.values()) == {tomorrow}
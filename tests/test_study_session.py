@@ -0,0 +1,45 @@
+from app.study_session import SessionStore
+
+
+def test_sessions_are_evicted_in_lru_order():
+    store = SessionStore(max_sessions=2)
+    first = store.start('jan', None, [1, 2])
+    second = store.start('jan', 'Python', [3])
+    assert store.get(first.id, 'jan') is first
+    store.start('ana', None, [4])
+    assert store.get(second.id, 'jan', 'Python') is None
+    assert store.get(first.id, 'jan') is first
+    assert len(store) == 2
+
+
+def test_sessions_belong_to_user_and_topic():
+    store = SessionStore()
+    session = store.start('jan', 'Python', [1, 2, 3])
+    assert store.get(session.id, 'ana', 'Python') is None
+    assert store.get(session.id, 'jan', None) is None
+    assert store.get(None, 'jan', 'Python') is None
+
+
+def test_idle_sessions_expire():
+    store = SessionStore(ttl=0)
+    session = store.start('jan', None, [1])
+    session.touched_at -= 1
+    assert store.get(session.id, 'jan') is None
+    assert len(store) == 0
+
+
+def test_cursor_is_clamped_and_deleted_cards_dropped():
+    session = SessionStore().start('jan', None, [5, 6, 7])
+    assert session.card_id_at(9) == 7 and session.cursor == 2
+    assert session.card_id_at(0) == 5
+    session.drop(6)
+    assert session.card_id_at(2) == 7 and len(session) == 2
+
+
+def test_window_skips_deleted_cards_without_moving_cursor():
+    session = SessionStore().start('jan', None, [5, 6, 7, 8])
+    session.card_id_at(1)
+    window = session.window(2, 2, lambda card_id: None if card_id == 6 else f'card {card_id}')
+    assert window == [(2, 'card 7'), (3, 'card 8')]
+    assert session.card_ids == [5, 7, 8] and session.cursor == 0
+    assert session.window(3, 5, str) == [(3, '8')]
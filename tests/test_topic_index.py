@@ -0,0 +1,57 @@
+import datetime
+from app.scheduler import Scheduler
+from app.topic_index import TopicIndex, merge_topic_counts, normalize_topic
+from tests.test_due_index import by_id, expected_pick
+from tests.test_scheduler import make_deck
+
+
+def make_topic_deck(count):
+    cards = make_deck(count)
+    for card in cards:
+        card.topic = ('Python', 'python ', 'Go')[card.id % 3]
+    return cards
+
+
+def test_normalize_topic():
+    assert normalize_topic('  Data   Science ') == normalize_topic('data science') == 'data science'
+
+
+def test_counts_merge_spellings():
+    cards = make_topic_deck(90)
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    counts = TopicIndex(cards).counts(today=today)
+    python_cards = [card for card in cards if card.topic != 'Go']
+    due = [card for card in python_cards if card.next_review_date is not None and card.next_review_date.date() <= today]
+    assert list(counts) == ['Go', 'Python']
+    assert counts['Python'] == {'cards': 60, 'due': len(due)}
+
+
+def test_pick_matches_scheduler_over_topic():
+    cards = make_topic_deck(300)
+    index = TopicIndex(cards)
+    python_cards = [card for card in cards if card.topic != 'Go']
+    picked, total = index.pick('PYTHON')
+    assert by_id(picked) == expected_pick(python_cards)
+    assert index.pick('Rust') == ([], 0)
+    assert sorted(index.card_ids('go')) == sorted(card.id for card in cards if card.topic == 'Go')
+
+
+def test_updates_are_incremental():
+    cards = make_topic_deck(30)
+    index = TopicIndex(cards)
+    card = cards[2]
+    card.topic = 'Rust'
+    index.update(card)
+    card.add_flag('right')
+    index.update(card)
+    assert index.counts()['Rust']['cards'] == 1
+    assert index.counts()['Go']['cards'] == 9
+    index.remove(card)
+    assert 'Rust' not in index.counts()
+    index.add(card)
+    assert by_id(index.pick('rust')[0]) == [card.id]
+
+
+def test_merge_topic_counts():
+    merged = merge_topic_counts({'python': {'cards': 1, 'due': 1}, 'Python': {'cards': 2, 'due': 0}, 'Go': {'cards': 1, 'due': 0}})
+    assert merged == {'Go': {'cards': 1, 'due': 0}, 'Python': {'cards': 3, 'due': 1}}
@@ -0,0 +1,58 @@
+import json
+import os
+import pytest
+from app.user_store import JsonUserStore, UsernameTakenError
+
+
+@pytest.fixture
+def user_file(tmp_path):
+    path = tmp_path / 'user_data.json'
+    path.write_text(json.dumps({'jan': {'email': 'jan@thi.de', 'password_hash': 'hash'}}))
+    return str(path)
+
+
+def test_lookups(user_file):
+    users = JsonUserStore(user_file)
+    assert users.get('jan')['email'] == 'jan@thi.de'
+    assert users.get('ana') is None
+    assert users.username_for_email('jan@thi.de') == 'jan'
+    assert users.username_for_email('ana@thi.de') is None
+
+
+def test_steady_state_does_not_touch_the_file(user_file, monkeypatch):
+    users = JsonUserStore(user_file, check_interval=60)
+    users.get('jan')
+
+    def fail(*args, **kwargs):
+        raise AssertionError('user file was accessed')
+
+    monkeypatch.setattr(os, 'stat', fail)
+    assert users.get('jan')['email'] == 'jan@thi.de'
+
+
+def test_writes_from_other_processes_are_picked_up(user_file):
+    users = JsonUserStore(user_file, check_interval=0)
+    other_worker = JsonUserStore(user_file, check_interval=0)
+    assert users.get('ana') is None
+    other_worker.save_one('ana', {'email': 'ana@thi.de', 'password_hash': 'hash'})
+    assert users.username_for_email('ana@thi.de') == 'ana'
+    assert set(users.load()) == {'jan', 'ana'}
+
+
+def test_missing_file(tmp_path):
+    users = JsonUserStore(str(tmp_path / 'user_data.json'))
+    assert users.get('jan') is None
+    with pytest.raises(FileNotFoundError):
+        users.load()
+    users.save_one('jan', {'email': 'jan@thi.de', 'password_hash': 'hash'})
+    assert users.get('jan') is not None
+
+
+def test_add_one_checks_the_file_not_the_cache(user_file):
+    users = JsonUserStore(user_file, check_interval=60)
+    other_worker = JsonUserStore(user_file, check_interval=60)
+    assert users.get('ana') is None
+    other_worker.add_one('ana', {'email': 'ana@thi.de', 'password_hash': 'hash'})
+    with pytest.raises(UsernameTakenError):
+        users.add_one('ana', {'email': 'eve@thi.de', 'password_hash': 'other'})
+    assert users.get('ana')['password_hash'] == 'hash'